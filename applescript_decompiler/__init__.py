@@ -1 +1,25 @@
 from applescript_decompiler.analyzer import OSAMinerDecryptAnalyzer, NaiveStringAnalyzer
+from applescript_decompiler.hooks import InstructionHooks, StopDecompile
+from applescript_decompiler.result import DecompileResult, HandlerReport
+from applescript_decompiler.passes import (
+    Pass,
+    Pipeline,
+    FoldStrings,
+    OSAMinerDecrypt,
+    EvaluateCalls,
+    PropagateConstants,
+)
+from applescript_decompiler.emulator import Emulator, NotEvaluable
+from applescript_decompiler.diff import StructuralHasher, diff_scripts, format_diff
+from applescript_decompiler.extract import Extracted, extract
+from applescript_decompiler.callgraph import CallGraph, call_graph
+
+
+# Imported lazily so `python -m applescript_decompiler.decompiler` does not
+# find the module already imported by the package
+def __getattr__(name):
+    if name == "decompile":
+        from applescript_decompiler.decompiler import decompile
+
+        return decompile
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,7 +1,8 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from enum import Enum, auto
 from typing import List, Optional, Union, Dict, Any
+import io
 import json
 
 import warnings
@@ -9,60 +10,212 @@ import warnings
 import jinmo_applescript_disassembler.engine.runtimeobjects as rto
 import jinmo_applescript_disassembler.engine.fasobjects.data_block as db
 
-from applescript_decompiler.utils import *
-
-EVENT_CODES = get_event_code_mapping()
-SDEFS = load_sdefs_from_package()
+from applescript_decompiler.terminology import (
+    CODE_INDEX,
+    DEFAULT_TARGET,
+    EVENT_CODES,
+    SDEFS,
+    STANDARD_ADDITIONS,
+)
 
 INDENT_STR = "    "  # 4 spaces
-DEFAULT_TARGET = "AppleScript Language"
-STANDARD_ADDITIONS = "StandardAdditions"
+
+
+# (printer class, analyzer class) -> {node class: (on analyzer?, node name, writes?)}
+_DISPATCH: Dict[tuple, Dict[type, tuple]] = {}
+# Bumped with each `invalidate_dispatch`; printers bound to an older
+# generation bind their methods again
+_generation = 0
+
+
+def _writes_itself(printer_class, name: str) -> bool:
+    # write_X is only used when no subclass overrides visit_X with its own
+    # string version, which would otherwise be bypassed
+    mro = printer_class.__mro__
+    owners = {}
+    for prefix in ("visit_", "write_"):
+        owners[prefix] = next(
+            (i for i, k in enumerate(mro) if prefix + name in k.__dict__), None
+        )
+    if owners["write_"] is None:
+        return False
+    return owners["visit_"] is None or owners["write_"] <= owners["visit_"]
 
 
 class AppleScriptPrinter:
     target = DEFAULT_TARGET
     command = "None"
     analyzer = None
+    # Node classes whose text is remembered, see `_memoize`; set below the
+    # node classes. Leaves are cheaper to render again than to look up
+    MEMOIZED = frozenset()
+    # Bound on the nodes remembered, the cache starts over when it is full
+    render_cache_size = 4096
 
     def __init__(self, analyzer=None):
         if analyzer is not None:
             self.analyzer = analyzer(printer=self)
+        self._rebind()
+
+    def _rebind(self):
+        self._generation = _generation
+        # node class -> bound visit method / write method (None: use visit)
+        self._methods = {}
+        self._writers = {}
+        # id(node) -> (node, indent, target, command, text)
+        self._rendered = {}
+        # ids of nodes visited once, the second visit caches the text
+        self._seen = set()
+
+    @staticmethod
+    def invalidate_dispatch():
+        """Call after adding or replacing visit_* methods on a printer or
+        analyzer class, including on printers already created"""
+        global _generation
+        _DISPATCH.clear()
+        _generation += 1
+
+    def _bind(self, node_class):
+        table = _DISPATCH.setdefault((self.__class__, self.analyzer.__class__), {})
+        if node_class not in table:
+            name = node_class.__name__
+            on_analyzer = self.analyzer is not None and hasattr(
+                self.analyzer, "visit_" + name
+            )
+            writes = not on_analyzer and _writes_itself(self.__class__, name)
+            table[node_class] = (on_analyzer, name, writes)
+        on_analyzer, name, writes = table[node_class]
+        if on_analyzer:
+            method = getattr(self.analyzer, "visit_" + name)
+        else:
+            method = getattr(self, "visit_" + name, self.generic_visit)
+        if node_class in self.MEMOIZED:
+            method = self._memoize(method)
+        self._methods[node_class] = method
+        self._writers[node_class] = getattr(self, "write_" + name) if writes else None
+        return method
 
     def visit(self, node, indent: int = 0) -> str:
         if node is None:
             return ""
-        method_name = "visit_" + node.__class__.__name__
-
-        if self.analyzer is not None:
-            if hasattr(self.analyzer, method_name):
-                return getattr(self.analyzer, method_name)(node, indent)
-
-        method = getattr(self, method_name, self.generic_visit)
-
+        if self._generation != _generation:
+            self._rebind()
+        method = self._methods.get(node.__class__)
+        if method is None:
+            method = self._bind(node.__class__)
         return method(node, indent)
 
+    def _memoize(self, method):
+        # Obfuscated scripts repeat the same subtrees over and over; visits
+        # only depend on the node and on the tell target and command around
+        # it, so their text can be reused. Only nodes visited before are
+        # cached, most are visited once. The entry holds on to the node so
+        # that its id cannot be reused while it is cached
+        rendered = self._rendered
+        seen = self._seen
+        size = self.render_cache_size
+
+        def visit(node, indent: int = 0) -> str:
+            key = id(node)
+            if key not in seen:
+                if len(seen) >= size:
+                    seen.clear()
+                seen.add(key)
+                return method(node, indent)
+            cached = rendered.get(key)
+            if (
+                cached is not None
+                and cached[0] is node
+                and cached[1] == indent
+                and cached[2] == self.target
+                and cached[3] == self.command
+            ):
+                return cached[4]
+            text = method(node, indent)
+            if len(rendered) >= size:
+                rendered.clear()
+            rendered[key] = (node, indent, self.target, self.command, text)
+            return text
+
+        visit.__wrapped__ = method
+        return visit
+
+    def prepare(self, node):
+        """The tree to print for `node`, after the analyzer's transform"""
+        transform = getattr(self.analyzer, "transform", None)
+        return node if transform is None else transform(node)
+
+    def _writer_for(self, node):
+        if node is None:
+            return None
+        if self._generation != _generation:
+            self._rebind()
+        if node.__class__ not in self._writers:
+            self._bind(node.__class__)
+        return self._writers[node.__class__]
+
+    def write(self, node, out, indent: int = 0):
+        """
+        Writes `node` to `out` (anything with a `write` method), every line
+        ending in a newline. Block statements write their bodies straight to
+        `out` with the indentation passed down; everything else, including
+        whatever an analyzer overrides, is written as its `visit` string.
+        """
+        writer = self._writer_for(node)
+        if writer is None:
+            out.write(self.visit(node, indent) + "\n")
+        else:
+            writer(node, out, indent)
+
+    def _capture(self, writer, node, indent: int) -> str:
+        # `visit` of a block statement: the same text without the last newline
+        out = io.StringIO()
+        writer(node, out, indent)
+        return out.getvalue()[:-1]
+
+    def _write_body(self, stmts, out, indent: int):
+        # A lone statement that renders to "" leaves no blank line
+        if len(stmts) == 1 and self._writer_for(stmts[0]) is None:
+            text = self.visit(stmts[0], indent)
+            if text:
+                out.write(text + "\n")
+            return
+        for stmt in stmts:
+            self.write(stmt, out, indent)
+
+    def _write_lines(self, stmts, out, indent: int):
+        # Unlike `_write_body`, an empty block still leaves a blank line
+        if not stmts:
+            out.write("\n")
+        for stmt in stmts:
+            self.write(stmt, out, indent)
+
     def generic_visit(self, node, indent: int = 0) -> str:
         # Fallback: useful while you’re still adding node types
         return f"<{node.__class__.__name__}>"
 
     def visit_Script(self, node: Script, indent: int = 0) -> str:
-        parts: List[str] = []
+        return self._capture(self.write_Script, node, indent)
+
+    def write_Script(self, node: Script, out, indent: int = 0):
+        wrote = False
 
         for prop in node.properties:
-            parts.append(self.visit(prop, indent))
+            self.write(prop, out, indent)
+            wrote = True
 
         for handler in node.handlers:
-            if parts:
-                parts.append("")  # blank line
-            parts.append(self.visit(handler, indent))
+            if wrote:
+                out.write("\n")  # blank line
+            self.write(handler, out, indent)
+            wrote = True
 
         # any top-level body (script run section)
         for stmt in node.body:
-            if parts:
-                parts.append("")
-            parts.append(self.visit(stmt, indent))
-
-        return "\n".join(parts)
+            if wrote:
+                out.write("\n")
+            self.write(stmt, out, indent)
+            wrote = True
 
     def _i(self, indent: int) -> str:
         return INDENT_STR * indent
@@ -74,34 +227,22 @@ class AppleScriptPrinter:
         value_src = self.visit(node.initial_value, 0)
         return f"{self._i(indent)}property {node.name} : {value_src}"
 
+    def _handler_name(self, node: Handler) -> str:
+        return handler_name(node.name)
+
     def visit_Handler(self, node: Handler, indent: int = 0) -> str:
+        return self._capture(self.write_Handler, node, indent)
+
+    def write_Handler(self, node: Handler, out, indent: int = 0):
         params = ""
         if node.parameters:
             params = "(" + ", ".join(node.parameters) + ")"
 
-        _node_name = node.name
-
-        if isinstance(_node_name, rto.Object):
-            val = _node_name.value
-            if isinstance(val, rto.EventIdentifier):
-                _name = val.identifier[1].to_bytes(4, "big").decode("ascii")
-                _node_name = EVENT_CODES[DEFAULT_TARGET].get(_name[:4], _name)
-            else:
-                _node_name = val.identifier[0].to_bytes(4, "big").decode(
-                    "ascii"
-                ) + val.identifier[1].to_bytes(4, "big").decode("ascii")
-
-        header = f"{self._i(indent)}on {_node_name}{params}"
-
-        body_lines = [self.visit(stmt, indent + 1) for stmt in node.body]
-        body = "\n".join(body_lines) if body_lines else ""
+        _node_name = self._handler_name(node)
 
-        footer = f"{self._i(indent)}end {_node_name}"
-
-        if body:
-            return f"{header}\n{body}\n{footer}"
-        else:
-            return f"{header}\n{footer}"
+        out.write(f"{self._i(indent)}on {_node_name}{params}\n")
+        self._write_body(node.body, out, indent + 1)
+        out.write(f"{self._i(indent)}end {_node_name}\n")
 
     def visit_HandlerCall(self, node: HandlerCall, indent: int = 0) -> str:
         args = [self.visit(a, 0) for a in node.arguments]
@@ -127,24 +268,20 @@ class AppleScriptPrinter:
         return f"{self._i(indent)}{kind} {names}"
 
     def visit_IfStatement(self, node: IfStatement, indent: int = 0) -> str:
-        cond_src = self.visit(node.condition, 0)
-        header = f"{self._i(indent)}if {cond_src} then"
+        return self._capture(self.write_IfStatement, node, indent)
 
-        then_lines = [self.visit(stmt, indent + 1) for stmt in node.then_block]
-        then_block = "\n".join(then_lines)
+    def write_IfStatement(self, node: IfStatement, out, indent: int = 0):
+        cond_src = self.visit(node.condition, 0)
+        out.write(f"{self._i(indent)}if {cond_src} then\n")
+        self._write_lines(node.then_block, out, indent + 1)
 
         if node.else_block:
-            else_lines = [self.visit(stmt, indent + 1) for stmt in node.else_block]
-            else_block = "\n".join(else_lines)
-            footer = f"{self._i(indent)}end if"
-            return (
-                f"{header}\n{then_block}\n{self._i(indent)}else\n{else_block}\n{footer}"
-            )
-        else:
-            footer = f"{self._i(indent)}end if"
-            return f"{header}\n{then_block}\n{footer}"
+            out.write(f"{self._i(indent)}else\n")
+            self._write_lines(node.else_block, out, indent + 1)
 
-    def visit_RepeatStatement(self, node: RepeatStatement, indent: int = 0) -> str:
+        out.write(f"{self._i(indent)}end if\n")
+
+    def _repeat_header(self, node: RepeatStatement, indent: int) -> str:
         k = node.kind
         if k is RepeatKind.FOREVER:
             header = f"{self._i(indent)}repeat"
@@ -174,50 +311,47 @@ class AppleScriptPrinter:
             header = f"{self._i(indent)}repeat with {_var} in {_in}"
         else:
             header = f"{self._i(indent)}repeat"
+        return header
 
-        body_lines = [self.visit(stmt, indent + 1) for stmt in node.body]
-        body = "\n".join(body_lines)
-        footer = f"{self._i(indent)}end repeat"
-        if body:
-            return f"{header}\n{body}\n{footer}"
-        else:
-            return f"{header}\n{footer}"
+    def visit_RepeatStatement(self, node: RepeatStatement, indent: int = 0) -> str:
+        return self._capture(self.write_RepeatStatement, node, indent)
+
+    def write_RepeatStatement(self, node: RepeatStatement, out, indent: int = 0):
+        out.write(self._repeat_header(node, indent) + "\n")
+        self._write_body(node.body, out, indent + 1)
+        out.write(f"{self._i(indent)}end repeat\n")
 
     def visit_TryStatement(self, node: TryStatement, indent: int = 0) -> str:
-        header = f"{self._i(indent)}try"
-        try_lines = [self.visit(stmt, indent + 1) for stmt in node.try_block]
-        try_block = "\n".join(try_lines)
+        return self._capture(self.write_TryStatement, node, indent)
+
+    def write_TryStatement(self, node: TryStatement, out, indent: int = 0):
+        out.write(f"{self._i(indent)}try\n")
+        self._write_lines(node.try_block, out, indent + 1)
 
         if node.on_error_block is not None:
             # note: we only stored one var; you can extend to hold number var too
             if node.on_error_var:
-                on_line = f"{self._i(indent)}on error {node.on_error_var}"
+                out.write(f"{self._i(indent)}on error {node.on_error_var}\n")
             else:
-                on_line = f"{self._i(indent)}on error"
-            err_lines = [self.visit(stmt, indent + 1) for stmt in node.on_error_block]
-            err_block = "\n".join(err_lines)
-            footer = f"{self._i(indent)}end try"
-            return f"{header}\n{try_block}\n{on_line}\n{err_block}\n{footer}"
-        else:
-            footer = f"{self._i(indent)}end try"
-            return f"{header}\n{try_block}\n{footer}"
+                out.write(f"{self._i(indent)}on error\n")
+            self._write_lines(node.on_error_block, out, indent + 1)
+
+        out.write(f"{self._i(indent)}end try\n")
 
     def visit_TellBlock(self, node: TellBlock, indent: int = 0) -> str:
+        return self._capture(self.write_TellBlock, node, indent)
+
+    def write_TellBlock(self, node: TellBlock, out, indent: int = 0):
         target_src = self.visit(node.target, 0)
 
         prev_target = self.target
         self.target = target_src
 
-        header = f"{self._i(indent)}tell {target_src}"
-        body_lines = [self.visit(stmt, indent + 1) for stmt in node.body]
-        body = "\n".join(body_lines)
-        footer = f"{self._i(indent)}end tell"
+        out.write(f"{self._i(indent)}tell {target_src}\n")
+        self._write_body(node.body, out, indent + 1)
+        out.write(f"{self._i(indent)}end tell\n")
 
         self.target = prev_target
-        if body:
-            return f"{header}\n{body}\n{footer}"
-        else:
-            return f"{header}\n{footer}"
 
     def visit_ReturnStatement(self, node: ReturnStatement, indent: int = 0) -> str:
         if node.value is None:
@@ -238,26 +372,7 @@ class AppleScriptPrinter:
         return json.dumps(node.value)
 
     def visit_Keyword(self, node: Keyword, indent: int = 0) -> str:
-        # naive quoting; you may want to escape quotes
-
-        if self.command != "None" and node.value in SDEFS[self.target][self.command]:
-            params = SDEFS[self.target][node.command_name]["name"]
-            if node.value in params:
-                return params[node.value]["name"]
-
-        if node.value in SDEFS[STANDARD_ADDITIONS]:
-            return f"{SDEFS[STANDARD_ADDITIONS][node.value]['name']}"
-
-        if node.value in EVENT_CODES[self.target]:
-            return f"{EVENT_CODES[self.target][node.value]}"
-        if node.value in EVENT_CODES[DEFAULT_TARGET]:
-            return f"{EVENT_CODES[DEFAULT_TARGET][node.value]}"
-        if (
-            node.value[:4] in ["core", "misc"]
-            and node.value[4:] in EVENT_CODES[DEFAULT_TARGET]
-        ):
-            return f"{EVENT_CODES[DEFAULT_TARGET][node.value[4:]]}"
-        return f"{node.value}"
+        return CODE_INDEX.keyword(self.target, node.value, self.command)
 
     def visit_NumberLiteral(self, node: NumberLiteral, indent: int = 0) -> str:
         return str(node.value)
@@ -300,7 +415,29 @@ class AppleScriptPrinter:
 
     # ---- Binary / Unary ops ------------------------------------------
 
+    def _chain(self, node: BinaryOp) -> list:
+        """Operands of the run of `node.op` starting at `node`, left to right"""
+        method = self._methods.get(BinaryOp) or self._bind(BinaryOp)
+        method = getattr(method, "__wrapped__", method)
+        # Only go down where `visit` would come straight back here
+        ours = getattr(method, "__func__", None) is AppleScriptPrinter.visit_BinaryOp
+        operands = []
+        todo = [node]
+        while todo:
+            n = todo.pop()
+            if n is node or (ours and n.__class__ is BinaryOp and n.op is node.op):
+                todo.append(n.right)
+                todo.append(n.left)
+            else:
+                operands.append(n)
+        return operands
+
     def visit_BinaryOp(self, node: BinaryOp, indent: int = 0) -> str:
+        if node.op not in NESTED_BINARY_OPS:
+            # `a & b & c` is printed the same however it nests, and obfuscated
+            # strings make chains thousands of terms deep: render in one loop
+            op = self._binop_to_src(node.op)
+            return f" {op} ".join([str(self.visit(e, 0)) for e in self._chain(node)])
         left = self.visit(node.left, 0)
         right = self.visit(node.right, 0)
         op = self._binop_to_src(node.op)
@@ -324,31 +461,9 @@ class AppleScriptPrinter:
             if left == "__it__":
                 return f" every {right}"
             return f"(every {right} of {left})"
-        return f"{left} {op} {right}"
 
     def _binop_to_src(self, op: BinaryOpKind) -> str:
-        mapping = {
-            BinaryOpKind.ADD: "+",
-            BinaryOpKind.SUB: "-",
-            BinaryOpKind.MUL: "*",
-            BinaryOpKind.DIV: "/",
-            BinaryOpKind.MOD: "mod",
-            BinaryOpKind.POW: "^",
-            BinaryOpKind.CONCAT: "&",
-            BinaryOpKind.EQ: "is",
-            BinaryOpKind.NE: "is not",
-            BinaryOpKind.LT: "<",
-            BinaryOpKind.LE: "≤",
-            BinaryOpKind.GT: ">",
-            BinaryOpKind.GE: "≥",
-            BinaryOpKind.CONTAINS: "contains",
-            BinaryOpKind.COERCE: "as",  # handled specially
-            BinaryOpKind.GET_PROPERTY: "'s",  # handled specially
-            BinaryOpKind.GET_INDEXED: "_",    # handled specially
-            BinaryOpKind.AND: "and",
-            BinaryOpKind.OR: "or",
-        }
-        return mapping.get(op, "unknown")
+        return BINARY_OP_SOURCE.get(op, "unknown")
 
     def visit_UnaryOp(self, node: UnaryOp, indent: int = 0) -> str:
         operand = self.visit(node.operand, 0)
@@ -364,27 +479,24 @@ class AppleScriptPrinter:
         prev_command = self.command
         prev_target = self.target
 
+        told = None
         if node.target is not None:
-            self.target = self.visit(node.target, 0)
-
-        _command_name = node.command_name
-        if node.command_name in SDEFS[self.target]:
-            self.command = _command_name
-            _command_name = f"{SDEFS[self.target][node.command_name]['name']}"
-        elif node.command_name in SDEFS[STANDARD_ADDITIONS]:
-            self.command = _command_name
-            self.target = STANDARD_ADDITIONS
-            _command_name = f"{SDEFS[STANDARD_ADDITIONS][node.command_name]['name']}"
-        elif node.command_name[4:] in EVENT_CODES[DEFAULT_TARGET]:
-            _command_name = f"{EVENT_CODES[DEFAULT_TARGET][node.command_name[4:]]}"
+            told = self.target = self.visit(node.target, 0)
+
+        _command_name, command, target = CODE_INDEX.command(
+            self.target, node.command_name
+        )
+        if command is not None:
+            self.command = command
+            self.target = target
 
         args_src = [self.visit(arg, 0) for arg in node.arguments]
         if args_src and args_src[0] == "__it__":
             args_src = args_src[1:]
         args_str = " ".join([e if isinstance(e, str) else e.decode() for e in args_src])
         target_prefix = ""
-        if node.target is not None:
-            target_prefix = f"tell application \"{self.visit(node.target, 0)}\" "
+        if told is not None:
+            target_prefix = f'tell application "{told}" '
 
         self.command = prev_command
         self.target = prev_target
@@ -392,19 +504,24 @@ class AppleScriptPrinter:
         return f"{self._i(indent)}({target_prefix}{_command_name} {args_str})"
 
 
-@dataclass
+@dataclass(slots=True)
 class Node:
     def to_source(self, analyzer=None, indent: int = 0) -> str:
         printer = AppleScriptPrinter(analyzer=analyzer)
-        return printer.visit(self, indent=indent)
+        return printer.visit(printer.prepare(self), indent=indent)
+
+    def write_source(self, out, analyzer=None, indent: int = 0):
+        """Like `to_source`, but writes to `out` as it goes, with a final newline"""
+        printer = AppleScriptPrinter(analyzer=analyzer)
+        printer.write(printer.prepare(self), out, indent=indent)
 
 
-@dataclass
+@dataclass(slots=True)
 class Expression(Node):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Script(Node):
     # Properties are in the "<maybe binding>" sections
     properties: List[PropertyDecl] = field(default_factory=list)
@@ -413,22 +530,22 @@ class Script(Node):
     body: List[Statement] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class Keyword(Node):
     value: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Statement(Node):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Comment(Statement):
     comment: str
 
 
-@dataclass
+@dataclass(slots=True)
 class PropertyDecl(Statement):
     # e.g. `property foo : 42`
     name: str
@@ -436,7 +553,7 @@ class PropertyDecl(Statement):
 
 
 # functions
-@dataclass
+@dataclass(slots=True)
 class Handler(Node):
     # e.g. `on sayHello(name, greeting)`
     name: str
@@ -444,33 +561,33 @@ class Handler(Node):
     body: List[Statement] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class HandlerCall(Expression):
     handler_name: str
     arguments: List[Expression]
     target: Optional[Expression] = None  # `my` or some script object
 
 
-@dataclass
+@dataclass(slots=True)
 class SetStatement(Statement):
     # `set x to expr`
     target: LValue
     value: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class VariableDeclaration(Statement):
     # `local x, y` or `global myVar`
     names: List[str]
     is_global: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class LValue(Node):
     obj: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class IfStatement(Statement):
     condition: Expression
     else_pos: int
@@ -488,7 +605,7 @@ class RepeatKind(Enum):
     WITH_IN = auto()  # e.g. `repeat with i in X`
 
 
-@dataclass
+@dataclass(slots=True)
 class RepeatStatement(Statement):
     kind: RepeatKind
     end_repeat_pos: int
@@ -504,7 +621,7 @@ class RepeatStatement(Statement):
     body: List[Statement] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class TryStatement(Statement):
     try_block: List[Statement]
     on_error_var: Optional[str] = None  # `on error errMsg number errNum`
@@ -512,7 +629,7 @@ class TryStatement(Statement):
     end_try_pos: Optional[int] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class TellBlock(Statement):
     # `tell application "Finder"` ... `end tell`
     target: Expression
@@ -520,65 +637,65 @@ class TellBlock(Statement):
     is_done: Optional[bool] = False
 
 
-@dataclass
+@dataclass(slots=True)
 class ReturnStatement(Statement):
     value: Optional[Expression] = None  # `return` or `return expr`
 
 
-@dataclass
+@dataclass(slots=True)
 class ExitRepeat(Statement):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class ExprStatement(Statement):
     expr: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class StringLiteral(Expression):
     value: str
 
 
-@dataclass
+@dataclass(slots=True)
 class NumberLiteral(Expression):
     value: int  # AppleScript numbers are usually double? keep decimal?
 
 
-@dataclass
+@dataclass(slots=True)
 class BooleanLiteral(Expression):
     value: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class DateLiteral(Expression):
     # e.g. `date "Friday, January 1, 2021 12:00:00 am"`
     text: str  # keep original text? TODO: parse datetime if needed
 
 
-@dataclass
+@dataclass(slots=True)
 class MissingValueLiteral(Expression):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class VariableRef(Expression):
     name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class ListLiteral(Expression):
     # `{1, 2, "foo"}`
     elements: List[Expression]
 
 
-@dataclass
+@dataclass(slots=True)
 class RecordField(Node):
     label: str
     value: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class RecordLiteral(Expression):
     # `{foo: 1, bar: "hi"}`
     fields: List[RecordField]
@@ -613,6 +730,39 @@ class BinaryOpKind(Enum):
     OR = auto()
 
 
+# Not printed as `left op right`
+NESTED_BINARY_OPS = frozenset(
+    {
+        BinaryOpKind.COERCE,
+        BinaryOpKind.THRU,
+        BinaryOpKind.GET_INDEXED,
+        BinaryOpKind.GET_PROPERTY,
+        BinaryOpKind.EVERY,
+    }
+)
+
+BINARY_OP_SOURCE = {
+    BinaryOpKind.ADD: "+",
+    BinaryOpKind.SUB: "-",
+    BinaryOpKind.MUL: "*",
+    BinaryOpKind.DIV: "/",
+    BinaryOpKind.MOD: "mod",
+    BinaryOpKind.POW: "^",
+    BinaryOpKind.CONCAT: "&",
+    BinaryOpKind.EQ: "is",
+    BinaryOpKind.NE: "is not",
+    BinaryOpKind.LT: "<",
+    BinaryOpKind.LE: "≤",
+    BinaryOpKind.GT: ">",
+    BinaryOpKind.GE: "≥",
+    BinaryOpKind.CONTAINS: "contains",
+    BinaryOpKind.COERCE: "as",  # handled specially
+    BinaryOpKind.GET_PROPERTY: "'s",  # handled specially
+    BinaryOpKind.GET_INDEXED: "_",  # handled specially
+    BinaryOpKind.AND: "and",
+    BinaryOpKind.OR: "or",
+}
+
 BINARY_OP_MAPPING = {
     "Subtract": BinaryOpKind.SUB,
     "Add": BinaryOpKind.ADD,
@@ -634,22 +784,66 @@ BINARY_OP_MAPPING = {
 }
 
 
-@dataclass
+# Chains of BinaryOp can be far deeper than the recursion limit, so their
+# repr and == are the dataclass ones done with an explicit stack
+def _chain_repr(root: BinaryOp) -> str:
+    out = []
+    # (is text?, text or value)
+    todo = [(False, root)]
+    while todo:
+        is_text, item = todo.pop()
+        if is_text:
+            out.append(item)
+        elif isinstance(item, BinaryOp):
+            todo.append((True, ")"))
+            names = [f.name for f in fields(item) if f.repr]
+            for i in reversed(range(len(names))):
+                todo.append((False, getattr(item, names[i])))
+                todo.append((True, f"{', ' if i else ''}{names[i]}="))
+            todo.append((True, item.__class__.__qualname__ + "("))
+        else:
+            out.append(repr(item))
+    return "".join(out)
+
+
+def _chain_eq(a: BinaryOp, b) -> bool:
+    if b.__class__ is not a.__class__:
+        return NotImplemented
+    todo = [(a, b)]
+    while todo:
+        a, b = todo.pop()
+        for f in fields(a):
+            if not f.compare:
+                continue
+            x, y = getattr(a, f.name), getattr(b, f.name)
+            if x is y:
+                continue
+            if isinstance(x, BinaryOp) and x.__class__ is y.__class__:
+                todo.append((x, y))
+            elif not x == y:
+                return False
+    return True
+
+
+@dataclass(slots=True, repr=False, eq=False)
 class BinaryOp(Expression):
     op: BinaryOpKind
     left: Expression
     right: Optional[Expression] = None
 
+    __repr__ = _chain_repr
+    __eq__ = _chain_eq
+
 
 # Kinda messy but And/Or needs to be specially handled
 # because of their short-circuit evaluation behavior
-@dataclass
+@dataclass(slots=True, repr=False, eq=False)
 class AndOp(BinaryOp):
     op: BinaryOpKind = field(default=BinaryOpKind.AND, init=False)
     right_end_pos: Optional[int] = None
 
 
-@dataclass
+@dataclass(slots=True, repr=False, eq=False)
 class OrOp(BinaryOp):
     op: BinaryOpKind = field(default=BinaryOpKind.OR, init=False)
     right_end_pos: Optional[int] = None
@@ -664,13 +858,13 @@ class UnaryOpKind(Enum):
 UNARY_OP_MAPPING = {"Negate": UnaryOpKind.NEG, "Not": UnaryOpKind.NOT}
 
 
-@dataclass
+@dataclass(slots=True)
 class UnaryOp(Expression):
     op: UnaryOpKind
     operand: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class CommandCall(Expression):
     # e.g. `display dialog "Hi" buttons {"OK"} default button 1`
     command_name: str
@@ -678,11 +872,53 @@ class CommandCall(Expression):
     arguments: List[str] = field(default_factory=list)
 
 
+# Expressions worth remembering the text of
+AppleScriptPrinter.MEMOIZED = frozenset(
+    (
+        Keyword,
+        ListLiteral,
+        RecordLiteral,
+        BinaryOp,
+        UnaryOp,
+        CommandCall,
+    )
+)
+
+
+def handler_name(name) -> str:
+    """
+    The name a handler is printed with, from its name in the root table:
+    event handlers are named by an event identifier, e.g. `run` for
+    aevt/oapp
+    """
+    if isinstance(name, rto.Object):
+        val = name.value
+        if isinstance(val, rto.EventIdentifier):
+            _name = val.identifier[1].to_bytes(4, "big").decode("ascii")
+            name = EVENT_CODES[DEFAULT_TARGET].get(_name[:4], _name)
+        else:
+            name = val.identifier[0].to_bytes(4, "big").decode(
+                "ascii"
+            ) + val.identifier[1].to_bytes(4, "big").decode("ascii")
+    elif isinstance(name, bytes):
+        name = name.decode()
+    return name
+
+
 def number_to_code(num):
     num_bytes = (num.bit_length() + 7) // 8
     return num.to_bytes(num_bytes, "big").decode("ascii")
 
 
+def alias_application(lit: db.Descriptor) -> str:
+    """The name of the application an alias descriptor points to"""
+    if lit.content[7] == 2:
+        # https://mac-alias.readthedocs.io/en/latest/alias_fmt.html
+        # TODO: Handle version 3?
+        return lit.content[51:].split(b".app")[0].decode(errors="ignore")
+    return lit.content.split(b".app/")[0].split(b":")[-1].decode()
+
+
 def convert_literal(lit, target=None):
     if isinstance(lit, list):
         lit = lit[1]
@@ -697,11 +933,4 @@ def convert_literal(lit, target=None):
     elif isinstance(lit, rto.String):
         return StringLiteral(value=lit.value.decode("utf-16-be"))
     elif isinstance(lit, db.Descriptor):
-
-        if lit.content[7] == 2:
-            # https://mac-alias.readthedocs.io/en/latest/alias_fmt.html
-            # TODO: Handle version 3?
-            app_name = lit.content[51:].split(b".app")[0].decode(errors="ignore")
-        else:
-            app_name = lit.content.split(b".app/")[0].split(b":")[-1].decode()
-        return VariableRef(name=app_name)
+        return VariableRef(name=alias_application(lit))
@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import argparse
+
+from applescript_decompiler.utils import (
+    get_event_code_mapping,
+    load_sdefs_from_package,
+    parse_sdef_terms,
+)
+from applescript_decompiler.terminology import (
+    _EVENT_CODE_ALIASES,
+    INDEX_DIR,
+    INDEX_VERSION,
+    sdef_entry,
+)
+
+# Builds data/terminology/, which `applescript_decompiler.terminology` loads
+# instead of the event code table and the .sdef files. Run it after changing
+# either:
+#
+#     python -m applescript_decompiler.build_terminology
+#
+# `--check` fails when the shipped files are out of date.
+
+
+def build_index() -> dict:
+    """
+    {name: {"version": ..., "event_codes": {code: name},
+            "sdef": {command code: {"name": ..., "parameters": {code: name}}}}}
+
+    keyed by suite name for the event code table and by application name
+    for .sdef files, which are the same for most applications. Classes,
+    properties and enumerators of an .sdef fill in event codes the table
+    does not have.
+    """
+    index = {}
+    event_codes = get_event_code_mapping()
+    # An alias, resolved when loading
+    event_codes.pop("StandardAdditions", None)
+    for name, codes in event_codes.items():
+        index.setdefault(name, {"version": INDEX_VERSION})["event_codes"] = codes
+    for name, terms in load_sdefs_from_package(parse=parse_sdef_terms).items():
+        entry = sdef_entry(terms)
+        index.setdefault(name, {"version": INDEX_VERSION})["sdef"] = entry["sdef"]
+        suite = index.setdefault(
+            _EVENT_CODE_ALIASES.get(name, name), {"version": INDEX_VERSION}
+        )
+        suite["event_codes"] = {**entry["event_codes"], **suite.get("event_codes", {})}
+    return index
+
+
+def _dump(entry: dict) -> str:
+    return json.dumps(entry, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def write_index(index: dict, directory=INDEX_DIR):
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            os.remove(os.path.join(directory, name))
+    for name, entry in index.items():
+        with open(os.path.join(directory, name + ".json"), "w", encoding="utf-8") as f:
+            f.write(_dump(entry) + "\n")
+
+
+def read_index(directory=INDEX_DIR) -> dict:
+    index = {}
+    if not os.path.isdir(directory):
+        return index
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                index[name[: -len(".json")]] = json.load(f)
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m applescript_decompiler.build_terminology",
+        description="Builds the terminology files from the event code table and the bundled .sdef files",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with 1 if the files are missing or out of date instead of writing them",
+    )
+    parser.add_argument(
+        "-o", "--output", default=INDEX_DIR, help="Directory to write them to"
+    )
+    args = parser.parse_args(argv)
+
+    index = build_index()
+    if args.check:
+        if read_index(args.output) != index:
+            sys.exit(
+                f"{args.output} is out of date, run python -m applescript_decompiler.build_terminology"
+            )
+        return
+    write_index(index, args.output)
+    print(f"-- wrote {len(index)} files to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
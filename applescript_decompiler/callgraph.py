@@ -0,0 +1,212 @@
+import json
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Set
+
+import jinmo_applescript_disassembler.engine.runtimeobjects as rto
+from jinmo_applescript_disassembler.engine.fasparser import Loader
+from jinmo_applescript_disassembler.engine.budget import Budget
+
+from applescript_decompiler.ast import handler_name
+from applescript_decompiler.extract import (
+    CODE_OFFSET,
+    LITERAL_OFFSET,
+    ROOT_OFFSET,
+    event_code,
+)
+from applescript_decompiler.opcodes import opcode_bytes, scan
+
+# Which handler calls which, read off the bytecode in one pass without
+# decompiling: PositionalMessageSend names the handler it calls, and a
+# handler pushed as a value (PushGlobal) may be called through a variable.
+# Event handlers (`run`, `open`, `idle`...) are what the system calls, so
+# everything else is only reachable through them.
+
+NAME_OFFSET = 0
+
+# The ops that can name a handler
+_CALLS = opcode_bytes(
+    "PositionalMessageSend", "PushGlobal", "PushGlobalExtended", "MessageSend"
+)
+_MESSAGE_SEND = opcode_bytes("MessageSend")
+
+
+@dataclass
+class CallGraph:
+    # Offset in the root table -> handler name, as printed
+    names: Dict[int, str] = field(default_factory=dict)
+    # Offset -> offsets of the handlers it calls, in the order first called
+    calls: Dict[int, List[int]] = field(default_factory=dict)
+    # Offset -> handlers it calls that are not in this script, e.g. ones of
+    # a script loaded with `load script`
+    external: Dict[int, List[str]] = field(default_factory=dict)
+    # Event handlers, and script blocks, whose handlers are not looked into
+    entries: List[int] = field(default_factory=list)
+    # Offsets that could not be read
+    errors: Dict[int, str] = field(default_factory=dict)
+
+    def reachable(self) -> Set[int]:
+        """
+        Offsets of the handlers reachable from the entries. A script
+        without entries is a library: all of it is reachable, as are
+        handlers that could not be read.
+        """
+        if not self.entries:
+            return set(self.names) | set(self.errors)
+        seen = set(self.entries) | set(self.errors)
+        todo = list(seen)
+        while todo:
+            for callee in self.calls.get(todo.pop(), ()):
+                if callee not in seen:
+                    seen.add(callee)
+                    todo.append(callee)
+        return seen
+
+    def to_dict(self) -> dict:
+        reachable = self.reachable()
+        return {
+            "handlers": [
+                {
+                    "offset": offset,
+                    "name": name,
+                    "entry": offset in self.entries,
+                    "reachable": offset in reachable,
+                    "calls": [self.names[c] for c in self.calls.get(offset, ())],
+                    "external": self.external.get(offset, []),
+                }
+                for offset, name in self.names.items()
+            ],
+            "errors": {str(offset): e for offset, e in self.errors.items()},
+        }
+
+    def dot(self) -> Iterator[str]:
+        """The graph in Graphviz's format: entries boxed, dead code grey"""
+        reachable = self.reachable()
+        yield "digraph calls {"
+        for offset, name in self.names.items():
+            attributes = [f"label={json.dumps(name)}"]
+            if offset in self.entries:
+                attributes.append("shape=box")
+            if offset not in reachable:
+                attributes.append("color=grey fontcolor=grey")
+            yield f"    h{offset} [{' '.join(attributes)}];"
+        for offset, callees in self.calls.items():
+            for callee in callees:
+                yield f"    h{offset} -> h{callee};"
+        yield "}"
+
+
+def call_graph(root) -> CallGraph:
+    """The call graph of a loaded script's root table (`Loader.load(...)[-1]`)"""
+    graph = CallGraph()
+    if type(root) is not list:
+        return graph
+    # Handler names are not case sensitive
+    by_name = {}
+    # Event handlers by their event code, which MessageSend can also send
+    by_event = {}
+    # Offset -> (literals, code) of its handlers, several for a script block
+    bodies = {}
+    for offset in range(2, len(root)):
+        function = root[offset]
+        if type(function) is not list or not function:
+            continue
+        try:
+            name = function[NAME_OFFSET + 1]
+            if function[0] == 15:
+                graph.names[offset] = f"script {handler_name(name)}"
+                graph.entries.append(offset)
+                bodies[offset] = list(_functions(function[ROOT_OFFSET]))
+                continue
+            if len(function) < 7:
+                continue
+            graph.names[offset] = handler_name(name)
+            bodies[offset] = [
+                (function[LITERAL_OFFSET + 1], function[CODE_OFFSET + 1].value)
+            ]
+        except Exception as e:
+            graph.errors[offset] = str(e)
+            continue
+        if isinstance(name, rto.Object):
+            graph.entries.append(offset)
+            code = event_code(name)
+            if code is not None:
+                by_event[code] = offset
+        else:
+            by_name.setdefault(graph.names[offset].lower(), offset)
+
+    for offset, functions in bodies.items():
+        calls = {}
+        external = {}
+        try:
+            for literals, code in functions:
+                _calls(code, literals, by_name, by_event, calls, external)
+        except Exception as e:
+            graph.errors[offset] = str(e)
+        graph.calls[offset] = list(calls)
+        if external:
+            graph.external[offset] = list(external)
+    return graph
+
+
+def _functions(root) -> Iterator[tuple]:
+    # (literals, code) of every handler of a script block, at any depth
+    todo = [root]
+    while todo:
+        root = todo.pop()
+        if type(root) is not list:
+            continue
+        for function in root[2:]:
+            if type(function) is not list or not function:
+                continue
+            if function[0] == 15:
+                todo.append(function[ROOT_OFFSET])
+            elif len(function) >= 7:
+                yield function[LITERAL_OFFSET + 1], function[CODE_OFFSET + 1].value
+
+
+def _calls(code, literals, by_name, by_event, calls: dict, external: dict):
+    # Dicts as ordered sets
+    for insn in scan(code, _CALLS):
+        index = insn.operands[0]
+        if not 0 <= index < len(literals):
+            continue
+        literal = literals[index]
+        if insn.byte in _MESSAGE_SEND:
+            callee = by_event.get(event_code(literal))
+        elif isinstance(literal, bytes):
+            name = literal.decode(errors="replace")
+            callee = by_name.get(name.lower())
+            if callee is None and insn.op == "PositionalMessageSend":
+                external[name] = None
+        else:
+            continue
+        if callee is not None:
+            calls[callee] = None
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="applescript_decompile callgraph",
+        description="Prints which handlers of a .scpt file call which, as JSON",
+    )
+    parser.add_argument("scpt", help="Path to a compiled AppleScript .scpt file")
+    parser.add_argument(
+        "--dot",
+        action="store_true",
+        help="Print the graph for Graphviz's dot instead",
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.scpt, "rb") as f:
+        root = Loader(budget=Budget()).load(f)[ROOT_OFFSET]
+    graph = call_graph(root)
+    if args.dot:
+        for line in graph.dot():
+            print(line)
+    else:
+        print(json.dumps(graph.to_dict(), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    cli()
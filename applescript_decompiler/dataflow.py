@@ -0,0 +1,447 @@
+import re
+from collections import deque
+from dataclasses import replace
+from typing import Dict, List
+
+from jinmo_applescript_disassembler.engine.budget import Budget, BudgetExceeded
+
+from applescript_decompiler.ast import *
+from applescript_decompiler.emulator import (
+    NotEvaluable,
+    _Frame,
+    _key,
+    to_literal,
+)
+from applescript_decompiler.passes import _child_nodes, _field_names, transform
+
+# Constant propagation within a handler.
+#
+# The handler's blocks are flattened into a control flow graph with one node
+# per assignment, evaluated expression and loop variable, and a worklist
+# finds which variables hold a known constant before each node. Facts only
+# ever go from known to unknown, so a node is visited again at most once per
+# variable it loses: linear in practice.
+#
+# Locals ([var_N]) only change where the handler assigns them. Anything else
+# (globals, properties, [parent] variables) may be changed by any handler or
+# command called, so those are forgotten at every call. So are lists: they
+# are passed by reference, and the callee may change a local's list.
+
+# [var_3], [var_0 ('s')]: the same local, by slot
+_SLOT = re.compile(r"\[var_(\d+)")
+
+# Commands that cannot change a variable
+_PURE_COMMANDS = frozenset(("sysontoc", "sysocton"))
+
+# Lists longer than this are not copied to every place they are used
+MAX_INLINE_ITEMS = 256
+
+# Per folded expression
+_FOLD_INSTRUCTIONS = 10_000
+_FOLD_MEMORY = 1_000_000
+
+
+def variable_key(name: str):
+    """Locals by slot number, anything else by name"""
+    match = _SLOT.match(name)
+    return int(match.group(1)) if match is not None else name
+
+
+class _Folder(_Frame):
+    # Evaluates an expression from known variables, calling nothing
+
+    def __init__(self, env):
+        self.env = env
+        self.budget = Budget(instructions=_FOLD_INSTRUCTIONS, bytes=_FOLD_MEMORY)
+        self.slots = {}
+        self.result = None
+
+    def lookup(self, node):
+        try:
+            return self.env[variable_key(node.name)][1]
+        except KeyError:
+            raise NotEvaluable(f"{node.name} is not known") from None
+
+    def call(self, node):
+        raise NotEvaluable("calls are not folded")
+
+
+def fold(expr: Expression, env) -> object:
+    """
+    The value of `expr` given `env` (variable key -> (value key, value)),
+    NotEvaluable if it is not a constant
+    """
+    try:
+        return _Folder(env).expr(expr)
+    except BudgetExceeded as e:
+        raise NotEvaluable(str(e)) from None
+
+
+def _has_call(expr) -> bool:
+    todo = [expr]
+    while todo:
+        node = todo.pop()
+        cls = node.__class__
+        if cls is HandlerCall or (
+            cls is CommandCall and node.command_name not in _PURE_COMMANDS
+        ):
+            return True
+        todo.extend(_child_nodes(node))
+    return False
+
+
+def _inline_size(value) -> int:
+    if value.__class__ is not list:
+        return 1
+    size = 0
+    todo = [value]
+    while todo and size <= MAX_INLINE_ITEMS:
+        items = todo.pop()
+        size += len(items)
+        todo.extend(v for v in items if v.__class__ is list)
+    return size
+
+
+# Node kinds
+_SET = 0  # an assignment
+_EVAL = 1  # an expression evaluated for its value or effects
+_FORGET = 2  # a loop variable set to each value in turn
+_RESET = 3  # nothing is known past this, e.g. entering `on error`
+_JOIN = 4  # only joins paths: loop heads, `exit repeat`
+
+
+class _Graph:
+    def __init__(self):
+        self.kinds = []
+        self.items = []
+        # The statement each node belongs to, and the field it evaluates
+        self.statements = []
+        self.fields = []
+        self.succ = []
+
+    def node(self, kind, item, preds, statement, field=None) -> int:
+        n = len(self.kinds)
+        self.kinds.append(kind)
+        self.items.append(item)
+        self.statements.append(statement)
+        self.fields.append(field)
+        self.succ.append([])
+        for p in preds:
+            self.succ[p].append(n)
+        return n
+
+    def build(self, statements):
+        # Blocks nest as deep as the script does, e.g. long `else if`
+        # chains: generators on an explicit stack instead of recursion.
+        # A block yields (statements, preds, breaks) for a nested block and
+        # is sent back the nodes that fall out of the end of it
+        stack = [self._block(statements, [], None)]
+        value = None
+        while stack:
+            try:
+                request = stack[-1].send(value)
+            except StopIteration as e:
+                stack.pop()
+                value = e.value
+                continue
+            stack.append(self._block(*request))
+            value = None
+
+    def _block(self, statements, preds, breaks):
+        # `breaks` collects the `exit repeat`s of the innermost loop
+        node = self.node
+        for s in statements or ():
+            cls = s.__class__
+            if cls is SetStatement:
+                preds = [node(_SET, s, preds, s, "value")]
+            elif cls is ExprStatement:
+                preds = [node(_EVAL, s.expr, preds, s, "expr")]
+            elif cls is ReturnStatement:
+                if s.value is not None:
+                    node(_EVAL, s.value, preds, s, "value")
+                preds = []
+            elif cls is ExitRepeat:
+                n = node(_JOIN, None, preds, s)
+                if breaks is not None:
+                    breaks.append(n)
+                preds = []
+            elif cls is IfStatement:
+                condition = node(_EVAL, s.condition, preds, s, "condition")
+                then_end = yield (s.then_block, [condition], breaks)
+                else_end = yield (s.else_block, [condition], breaks)
+                preds = then_end + else_end
+            elif cls is RepeatStatement:
+                preds = yield from self._repeat(s, preds)
+            elif cls is TellBlock:
+                preds = [node(_EVAL, s.target, preds, s)]
+                preds = yield (s.body, preds, breaks)
+            elif cls is TryStatement:
+                start = node(_JOIN, None, preds, s)
+                first = len(self.kinds)
+                try_end = yield (s.try_block, [start], breaks)
+                # Any statement of the try block may be the one that fails
+                failed = node(_RESET, None, [start, *range(first, len(self.kinds))], s)
+                error_end = yield (s.on_error_block, [failed], breaks)
+                preds = try_end + error_end
+            elif isinstance(s, Expression):
+                # Left on the stack, or `error`
+                preds = [node(_EVAL, s, preds, s)]
+            else:
+                preds = [node(_RESET, None, preds, s)]
+        return preds
+
+    def _repeat(self, s: RepeatStatement, preds):
+        node = self.node
+        # Evaluated once, before the first time round
+        for field in ("times", "from_expr", "to_expr", "by_expr", "in_expr"):
+            expr = getattr(s, field)
+            if expr is not None:
+                preds = [node(_EVAL, expr, preds, s, field)]
+        head = node(_JOIN, None, preds, s)
+        leave = [head]
+        if s.condition is not None:
+            leave = [node(_EVAL, s.condition, [head], s, "condition")]
+        entry = leave
+        if s.counter_var is not None:
+            entry = [node(_FORGET, s.counter_var, entry, s)]
+        breaks = []
+        body_end = yield (s.body, entry, breaks)
+        for p in body_end:
+            self.succ[p].append(head)
+        if s.kind is RepeatKind.FOREVER:
+            leave = []
+        return leave + breaks
+
+
+def _join(envs):
+    # Only what every path agrees on
+    first = envs[0]
+    if len(envs) == 1:
+        return first
+    joined = {}
+    for name, value in first.items():
+        if all(env.get(name, _MISSING)[0] == value[0] for env in envs[1:]):
+            joined[name] = value
+    return joined
+
+
+_MISSING = (None, None)
+
+
+def _after_call(env):
+    # Only locals holding text, numbers or booleans are left as they were
+    if any(
+        name.__class__ is not int or v[1].__class__ is list for name, v in env.items()
+    ):
+        env = {
+            name: v
+            for name, v in env.items()
+            if name.__class__ is int and v[1].__class__ is not list
+        }
+    return env
+
+
+def _transfer(kind, item, env):
+    if kind == _SET:
+        if _has_call(item.value):
+            env = _after_call(env)
+        target = item.target.obj
+        if target.__class__ is VariableRef:
+            name = variable_key(target.name)
+            env = dict(env)
+            try:
+                value = fold(item.value, env)
+            except NotEvaluable:
+                env.pop(name, None)
+            else:
+                env[name] = (_key(value), value)
+            return env
+        # `set item 1 of x`, `set end of x`: lists are shared between the
+        # variables they were assigned to, forget them all
+        if _has_call(target):
+            env = _after_call(env)
+        return {name: v for name, v in env.items() if v[1].__class__ is not list}
+    if kind == _EVAL:
+        if item is not None and _has_call(item):
+            env = _after_call(env)
+        return env
+    if kind == _FORGET:
+        name = variable_key(item.name) if item.__class__ is VariableRef else None
+        if name in env:
+            env = dict(env)
+            del env[name]
+        return env
+    if kind == _RESET:
+        return {}
+    return env
+
+
+class Facts:
+    """What constant propagation found for one handler"""
+
+    def __init__(self, handler: Handler, graph: _Graph, before: List[dict], first=None):
+        self.handler = handler
+        self._graph = graph
+        # Per node, variable key -> (value key, value) on the way in
+        self._before = before
+        # id(statement) -> its first node
+        if first is None:
+            first = {}
+            for n, statement in enumerate(graph.statements):
+                first.setdefault(id(statement), n)
+        self._first = first
+
+    def before(self, statement) -> Dict[object, object]:
+        """Variable key (see `variable_key`) -> value, known before `statement`"""
+        n = self._first.get(id(statement))
+        if n is None or self._before[n] is None:
+            return {}
+        return {name: v[1] for name, v in self._before[n].items()}
+
+    def value(self, expr: Expression, statement):
+        """`expr`'s value where `statement` starts, NotEvaluable if not constant"""
+        n = self._first.get(id(statement))
+        if n is None or self._before[n] is None:
+            raise NotEvaluable("unreachable")
+        return fold(expr, self._before[n])
+
+    def rewritten(self) -> "Facts":
+        """
+        The facts of the handler with known variables replaced by their
+        values: the same, about the new statements. Each statement changed
+        gets a `-- propagated: x` comment before it, naming the variables
+        """
+        graph = self._graph
+        # id(statement) -> ({field: new expression}, {variable name: None})
+        changes = {}
+        for n, field in enumerate(graph.fields):
+            env = self._before[n]
+            if field is None or not env:
+                continue
+            statement = graph.statements[n]
+            expr = getattr(statement, field)
+            names = {}
+            new = _substitute(expr, env, names)
+            # Without names, lists were put back into call arguments: the
+            # same expression, rebuilt
+            if names:
+                fields, found = changes.setdefault(id(statement), ({}, {}))
+                fields[field] = new
+                found.update(names)
+        if not changes:
+            return self
+
+        # id(statement) -> the statement that replaces it
+        renamed = {}
+
+        def rewrite(node, original):
+            found = changes.get(id(original))
+            if found is not None:
+                node = replace(node, **found[0])
+            node = _commented(node, original, changes)
+            if node is not original:
+                renamed[id(original)] = node
+            return node
+
+        handler = transform(self.handler, rewrite)
+        first = {}
+        for old, n in self._first.items():
+            new = renamed.get(old)
+            first[old if new is None else id(new)] = n
+        return Facts(handler, graph, self._before, first)
+
+
+def _substitute(expr, env, names):
+    # `names` gets the names of the variables replaced, as keys
+    replaced = {}
+
+    def rewrite(node, original):
+        cls = node.__class__
+        if cls is HandlerCall or cls is CommandCall:
+            return _keep_references(node, original, replaced)
+        if cls is not VariableRef:
+            return node
+        known = env.get(variable_key(node.name))
+        if known is None or _inline_size(known[1]) > MAX_INLINE_ITEMS:
+            return node
+        replaced[id(original)] = node.name
+        return to_literal(known[1])
+
+    new = transform(expr, rewrite)
+    names.update(dict.fromkeys(replaced.values()))
+    return new
+
+
+def _keep_references(node, original, replaced):
+    # A list passed by a variable is the variable's own list, which the
+    # callee may change: `my addItem(x)` must not print as `my addItem({1})`
+    arguments = node.arguments
+    restored = []
+    for old, new in zip(original.arguments, arguments):
+        if new.__class__ is ListLiteral and old.__class__ is VariableRef:
+            replaced.pop(id(old), None)
+            new = old
+        restored.append(new)
+    if all(a is b for a, b in zip(restored, arguments)):
+        return node
+    return replace(node, arguments=restored)
+
+
+def _commented(node, original, changes):
+    # A comment before each statement of `node`'s blocks that was changed
+    for name in _field_names(original.__class__):
+        before = getattr(original, name)
+        if before.__class__ is not list or not any(
+            id(item) in changes for item in before
+        ):
+            continue
+        items = []
+        for item, item_before in zip(getattr(node, name), before):
+            found = changes.get(id(item_before))
+            if found is not None:
+                text = "propagated: " + ", ".join(found[1])
+                items.append(Comment(comment=text))
+            items.append(item)
+        node = replace(node, **{name: items})
+    return node
+
+
+def analyze(handler: Handler) -> Facts:
+    graph = _Graph()
+    graph.build(handler.body)
+    count = len(graph.kinds)
+    preds = [[] for _ in range(count)]
+    for n, succ in enumerate(graph.succ):
+        for s in succ:
+            preds[s].append(n)
+
+    before = [None] * count
+    after = [None] * count
+    queued = [False] * count
+    work = deque()
+    if count:
+        work.append(0)
+        queued[0] = True
+    while work:
+        n = work.popleft()
+        queued[n] = False
+        envs = [after[p] for p in preds[n] if after[p] is not None]
+        if n == 0:
+            # Nothing is known when the handler starts
+            envs.append({})
+        env = _join(envs)
+        before[n] = env
+        out = _transfer(graph.kinds[n], graph.items[n], env)
+        if out == after[n]:
+            continue
+        after[n] = out
+        for s in graph.succ[n]:
+            if not queued[s]:
+                queued[s] = True
+                work.append(s)
+    return Facts(handler, graph, before)
+
+
+def propagate(handler: Handler) -> Handler:
+    """`handler` with the variables known to be constant replaced by them"""
+    return analyze(handler).rewritten().handler
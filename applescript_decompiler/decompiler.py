@@ -1,12 +1,39 @@
-import struct
+import io
+import os
 import sys
 import argparse
+from dataclasses import replace
 
-from jinmo_applescript_disassembler.engine.util import opcodes, comments
 from jinmo_applescript_disassembler.engine.fasparser import Loader
+from jinmo_applescript_disassembler.engine.budget import (
+    CLI_LIMITS,
+    Budget,
+    BudgetExceeded,
+    cli_budget,
+)
 
 from applescript_decompiler.ast import *
+from applescript_decompiler import verifier
+from applescript_decompiler.opcodes import decode
 from applescript_decompiler.utils import load_object
+from applescript_decompiler.hooks import StopDecompile
+from applescript_decompiler.passes import PASSES, Interner, Pipeline
+from applescript_decompiler.diff import cli as diff_cli
+from applescript_decompiler.extract import cli as extract_cli
+from applescript_decompiler.callgraph import call_graph, cli as callgraph_cli
+from applescript_decompiler.diagnostics import Bounded, bounded_repr
+from applescript_decompiler.terminology import add_sdef_dir
+from applescript_decompiler.result import DecompileResult, HandlerReport
+from applescript_decompiler.trace import (
+    Tracer,
+    CommentSink,
+    WarningSink,
+    DebugSink,
+    INSTRUCTION,
+    BLOCK_OPENED,
+    BLOCK_CLOSED,
+    WARNING,
+)
 
 # Some hardcoded offset in apple script binary
 # root -> (<function index> -> (name, ..., literal, code))
@@ -19,62 +46,221 @@ LITERAL_OFFSET = 5
 CODE_OFFSET = 6
 
 
-def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=False):
+def _sink(tracer, cls, *kinds):
+    # Script blocks recurse with the same tracer, so reuse sinks already attached
+    for sink in tracer.wants(kinds[0]):
+        if isinstance(sink, cls):
+            return sink
+    return tracer.attach(cls(), *kinds)
+
+
+def decompile(
+    source,
+    *,
+    analyzer=None,
+    force=False,
+    add_comments=False,
+    debug=False,
+    tracer=None,
+    hooks=None,
+    render=True,
+    verify=True,
+    budget=None,
+    stream=None,
+    passes=(),
+    sdef_dirs=(),
+    reachable_only=False,
+    intern=False,
+) -> DecompileResult:
+    """
+    Decompiles `source`, a path to a .scpt file, its contents as bytes or an
+    open binary file, and returns a DecompileResult instead of printing.
+
+    Without `force` decompiling stops at the first handler that fails; the
+    error is on that handler's report either way. Blown budgets and hooks
+    that stop early are recorded on the result (`exceeded`, `stopped`).
+
+    `passes` (Pass classes or instances, see `applescript_decompiler.passes`)
+    rewrite the tree before it is rendered; `result.script` stays as
+    decompiled.
+
+    `stream` is called with each HandlerReport as soon as it is finished.
+    The result then keeps neither the handlers nor the rendered text, so
+    memory stays flat however large the script is.
+
+    `sdef_dirs` are directories of more .sdef files to name commands and
+    keywords with, see `terminology.add_sdef_dir`. They stay added for the
+    rest of the process.
+
+    With `reachable_only`, handlers that the run and other event handlers
+    never call (see `callgraph`) are skipped, with a note in their report.
+
+    With `verify`, the bytecode of a handler that fails to decompile is
+    checked by `verifier.verify`, and a VerifyError saying what is wrong
+    with it replaces the error the decompiler ran into. Handlers that
+    decompile are not checked.
+
+    With `intern`, identical expressions anywhere in the file become one
+    shared instance (see `passes.Interner`). That saves memory on large
+    obfuscated scripts, at some cost in time.
+    """
+    for directory in sdef_dirs:
+        add_sdef_dir(directory)
+    if tracer is None:
+        tracer = Tracer()
+    if budget is None:
+        budget = Budget()
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    warning_sink = _sink(tracer, WarningSink, WARNING)
+    try:
+        f = Loader(tracer=tracer, budget=budget).load(source)
+    except BudgetExceeded as e:
+        return DecompileResult(
+            load_warnings=warning_sink.take(), analyzer=analyzer, exceeded=e
+        )
+    load_warnings = warning_sink.take()
+
+    result = decompile_loaded(
+        f,
+        add_comments=add_comments,
+        force=force,
+        analyzer=analyzer,
+        debug=debug,
+        tracer=tracer,
+        hooks=hooks,
+        render=render,
+        verify=verify,
+        budget=budget,
+        stream=stream,
+        passes=passes,
+        reachable_only=reachable_only,
+        intern=intern,
+    )
+    result.load_warnings = load_warnings
+    return result
+
+
+def decompile_loaded(
+    f,
+    add_comments=False,
+    force=False,
+    analyzer=None,
+    debug=False,
+    tracer=None,
+    hooks=None,
+    render=True,
+    verify=True,
+    budget=None,
+    stream=None,
+    passes=(),
+    reachable_only=False,
+    intern=False,
+) -> DecompileResult:
+    """
+    Same as `decompile`, for an object already returned by `Loader.load`.
+    When streaming, each handler's entry in `f` is dropped once reported.
+    """
     root = f[ROOT_OFFSET]
+    if not isinstance(passes, Pipeline):
+        passes = Pipeline(passes)
+
+    if tracer is None:
+        tracer = Tracer()
+    if budget is None:
+        budget = Budget()
+    comment_sink = None
+    if add_comments:
+        comment_sink = _sink(tracer, CommentSink, INSTRUCTION)
+    if debug:
+        _sink(tracer, DebugSink, INSTRUCTION)
+    # Also attached by the caller of a nested script block
+    debug_sink = next(
+        (s for s in tracer.wants(INSTRUCTION) if isinstance(s, DebugSink)), None
+    )
+    warning_sink = _sink(tracer, WarningSink, WARNING)
+    if hooks is not None:
+        hooks.attach(tracer)
+
+    # Handler being decompiled, kept so a blown budget can still return it
+    progress = {"handler": None}
+
+    def start_report(offset) -> HandlerReport:
+        report = HandlerReport(offset=offset)
+        if debug_sink is not None:
+            # Headers go before the handler's instructions, not after all of them
+            report.traced = True
+            debug_sink.note(report.header())
+        return report
+
+    def note(report, line):
+        report.notes.append(line)
+        if report.traced:
+            debug_sink.note(line)
 
     # assert code['kind'] == 'untypedPointerBlock'  # I think it doesn't matter
-    def decompile(function_offset, add_comments=False):  # function number
+    def decompile_function(function_offset, report):  # function number
         state = {"pos": 0}
+        progress["handler"] = None
         function = root[function_offset]
 
-        print("-- === data offset %d ===" % function_offset)
-
         if type(function) is not list:
-            print("-- <not a function>")
+            note(report, "-- <not a function>")
             return
 
         # In one sample, when it kinda looks like a script block?
         if function[0] == 15:
             if force:
-                print(
-                    f"-- {function[NAME_OFFSET + 1]} looks like a script block (?). Recursing."
+                note(
+                    report,
+                    f"-- {Bounded(function[NAME_OFFSET + 1])} looks like a script block (?). Recursing.",
                 )
-                return run_decompiler(function, add_comments, force)
+                report.nested = decompile_loaded(
+                    function,
+                    add_comments,
+                    force,
+                    tracer=tracer,
+                    render=render,
+                    verify=verify,
+                    budget=budget,
+                    passes=passes,
+                    intern=intern,
+                )
+                return
             else:
-                print(
-                    f"-- {function[NAME_OFFSET + 1]} looks interesting. Try `--force`"
+                note(
+                    report,
+                    f"-- {Bounded(function[NAME_OFFSET + 1])} looks interesting. Try `--force`",
                 )
 
         if len(function) < 7:
-            print("-- <maybe binding?>", function)
+            note(report, f"-- <maybe binding?> {bounded_repr(function)}")
             return
 
         literals = function[LITERAL_OFFSET + 1]
         name = function[NAME_OFFSET + 1]
         args = function[ARGS_OFFSET + 1]
 
-        print("-- Function name :", name)
-        print("-- Function arguments: ", end=" ")
+        note(report, f"-- Function name : {Bounded(name)}")
 
         _args = []
         if isinstance(args, list) and len(args) >= 3 and isinstance(args[2], list):
-            print(args[2][1:])
             _args = args[2][1:]
+            note(report, f"-- Function arguments:  {bounded_repr(_args)}")
         else:
-            print("-- <empty or unknown>")
+            note(report, "-- Function arguments:  -- <empty or unknown>")
 
         handler = Handler(
             name=name.decode() if isinstance(name, bytes) else name,
             parameters=[e.decode() if isinstance(e, bytes) else str(e) for e in _args],
             body=[],
         )
+        progress["handler"] = handler
 
         code = bytearray(function[CODE_OFFSET + 1].value)
 
-        def word():
-            r = struct.unpack(">H", code[state["pos"] : state["pos"] + 2])[0]
-            state["pos"] += 2
-            return r - 0x10000 if r & 0x8000 else r
+        instructions = decode(code)
 
         def literal(x):
             if x >= len(literals):
@@ -86,34 +272,54 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                 _x = _args[x]
                 return "[var_%d (%r)]" % (
                     x,
-                    _x.decode() if isinstance(_x, bytes) else str(_x),
+                    _x.decode() if isinstance(_x, bytes) else str(Bounded(_x)),
                 )
             return "[var_%d]" % x
 
         # Runtime stack
         _stack = []
 
+        def push(expr):
+            if interner is not None:
+                expr = interner.intern(expr)
+            _stack.append(expr)
+
         # Stack that keeps track of the current block we are writing on.
         # Maintain as stack to represent things that are "block-ish" like
         # handlers, if/else, try, repeat, etc
         block_stack = [handler]
 
+        # Looked up once per handler; the loop only tests these lists
+        trace_instructions = tracer.wants(INSTRUCTION)
+        trace_opened = tracer.wants(BLOCK_OPENED)
+        trace_closed = tracer.wants(BLOCK_CLOSED)
+
+        def open_block(block, pos):
+            block_stack.append(block)
+            if trace_opened:
+                tracer.emit(BLOCK_OPENED, pos=pos, block=block)
+
+        def close_block(pos):
+            block = block_stack.pop()
+            if trace_closed:
+                tracer.emit(BLOCK_CLOSED, pos=pos, block=block)
+            return block
+
         _var = None
         _prev_op = None
 
-        while state["pos"] < len(code):
-            _curr_pos = state["pos"]
-            _comment = " " + "%05x" % state["pos"] + " "
-            c = code[state["pos"]]
-            state["pos"] += 1
-            op = opcodes[c]
+        for insn in instructions:
+            _curr_pos = insn.pos
+            state["pos"] = insn.next_pos
+            op = insn.op
+            operands = insn.operands
 
-            _comment += op + " "
+            # (format, *args) describing the operands, only formatted by sinks
+            _detail = ("",)
             _statements = []
-
-            if debug: 
-                print(_stack)
-                print(_comment, end = ' ')
+            # What `-d` prints before the instruction, as the stack is
+            # changed in place
+            _stack_before = list(_stack) if trace_instructions else None
 
             # AndOp/OrOp special cases since they have some control flow
             # but are actuall expressions
@@ -122,12 +328,12 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
             ):
                 if _curr_pos == block_stack[-1].right_end_pos:
                     block_stack[-1].right = _stack.pop()
-                    _op = block_stack.pop()
-                    _stack.append(BinaryOp(op=_op.op, left=_op.left, right=_op.right))
+                    _op = close_block(_curr_pos)
+                    push(BinaryOp(op=_op.op, left=_op.left, right=_op.right))
 
             if op == "Jump":
-                _address = _curr_pos + 1 + word()
-                _comment += hex(_address) + " "
+                _address = insn.target
+                _detail = ("%#x ", _address)
                 # Assume repeat blocks follow proper jump
                 # Use Jump address to infer `else` block for `if-then-else`
                 curr_index = len(block_stack) - 1
@@ -153,47 +359,39 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                         else:
                             _statements.append(ExprStatement(expr=_stack.pop()))
             elif op in ["PushLiteral", "PushLiteralExtended"]:
-                v = word() if "Extended" in op else (c & 0xF)
-                _comment += (
-                    str(v)
-                    + " # "
-                    + str(convert_literal(literal(v)))
-                    + " "
-                    + str(literal(v))
-                )
+                v = operands[0]
                 _lit = convert_literal(literal(v))
-                _stack.append(_lit)
+                _detail = ("%d # %s %s", v, Bounded(_lit), Bounded(literal(v)))
+                push(_lit)
             elif op in ["Push0", "Push1", "Push2", "Push3"]:
-                _stack.append(NumberLiteral(value=int(op[-1])))
+                push(NumberLiteral(value=int(op[-1])))
             elif op == "PushMinus1":
-                _stack.append(NumberLiteral(value=int(-1)))
+                push(NumberLiteral(value=int(-1)))
             elif op in ["PushTrue", "PushFalse"]:
-                _stack.append(BooleanLiteral(value=op == "PushTrue"))
+                push(BooleanLiteral(value=op == "PushTrue"))
             elif op in ["PushIt", "PushMe", "PushUndefined"]:
                 if "Me" in op:
-                    _stack.append(VariableRef("my"))
+                    push(VariableRef("my"))
                 elif "It" in op:
-                    _stack.append(VariableRef("__it__"))
+                    push(VariableRef("__it__"))
             elif op in ["PushVariable", "PushVariableExtended"]:
-                v = variable(
-                    word() if "Extended" in op else (c & 0xF), "Extended" not in op
-                )
-                _comment += v + " "
-                _stack.append(VariableRef(v))
+                v = variable(operands[0], "Extended" not in op)
+                _detail = ("%s ", v)
+                push(VariableRef(v))
             elif op in ["PushGlobal", "PushGlobalExtended"]:
-                v = literal(word() if "Extended" in op else (c & 0xF))
+                v = literal(operands[0])
                 if isinstance(v, bytes):
-                    _stack.append(VariableRef(name=v.decode()))
+                    push(VariableRef(name=v.decode()))
                 else:
-                    _stack.append(convert_literal(v))
-                _comment += str(v) + " "
+                    push(convert_literal(v))
+                _detail = ("%s ", Bounded(v))
             elif op in ["PopGlobal", "PopGlobalExtended"]:
-                v = word() if "Extended" in op else (c & 0xF)
-                _comment += str(literal(v))
+                v = operands[0]
+                _detail = ("%s", Bounded(literal(v)))
                 _var = VariableRef(literal(v).decode())
             elif op in ["PopVariable", "PopVariableExtended"]:
-                v = variable(word() if "Extended" in op else (c & 0xF))
-                _comment += str(v) + " "
+                v = variable(operands[0])
+                _detail = ("%s ", v)
                 _var = VariableRef(v)
             elif op == "Dup" and _stack:
                 curr_index = len(block_stack) - 1
@@ -216,18 +414,18 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
             elif op in BINARY_OP_MAPPING:
                 r = _stack.pop()
                 l = _stack.pop()
-                _stack.append(BinaryOp(op=BINARY_OP_MAPPING[op], left=l, right=r))
+                push(BinaryOp(op=BINARY_OP_MAPPING[op], left=l, right=r))
             elif op in UNARY_OP_MAPPING:
                 exp = _stack.pop()
-                _stack.append(UnaryOp(op=UNARY_OP_MAPPING[op], operand=exp))
+                push(UnaryOp(op=UNARY_OP_MAPPING[op], operand=exp))
             elif op == "Exit":
                 # Maybe check current block is repeat?
                 # Should only be during repeat
                 _statements.append(ExitRepeat())
             elif op == "Tell":
-                _comment += str(word()) + " "
+                _detail = ("%d ", operands[0])
                 _target = _stack.pop()
-                block_stack.append(TellBlock(target=_target, body=[]))
+                open_block(TellBlock(target=_target, body=[]), _curr_pos)
             elif op == "EndTell":
                 # Look for the containing TellBlock
                 curr_index = -1
@@ -254,22 +452,19 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                         _statements.append(ExprStatement(expr=_curr))
 
             elif op in ("MakeObjectAlias", "MakeComp"):
-                t = c - 23
-                sub_operation = comments.get(t, "<Unknown>")
-                _comment += sub_operation
+                sub_operation = insn.spec.sub_operation
+                _detail = ("%s", sub_operation)
                 if sub_operation == "GetPositionEnd":
                     operand = _stack.pop()
-                    _stack.append(UnaryOp(op=UnaryOpKind.END_OF, operand=operand))
+                    push(UnaryOp(op=UnaryOpKind.END_OF, operand=operand))
                 elif sub_operation == "GetProperty":
                     l = _stack.pop()
                     r = _stack.pop()
-                    _stack.append(
-                        BinaryOp(op=BinaryOpKind.GET_PROPERTY, left=l, right=r)
-                    )
+                    push(BinaryOp(op=BinaryOpKind.GET_PROPERTY, left=l, right=r))
                 elif sub_operation == "GetEvery":
                     r = _stack.pop()
                     l = _stack.pop()
-                    _stack.append(BinaryOp(op=BinaryOpKind.EVERY, left=l, right=r))
+                    push(BinaryOp(op=BinaryOpKind.EVERY, left=l, right=r))
                 elif "GetIndexed" in sub_operation:
                     # Treat GetIndexed similar to GetProperty?
                     # content X of Y
@@ -281,9 +476,7 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                     target = _stack.pop()
 
                     l = BinaryOp(op=BinaryOpKind.GET_INDEXED, left=r, right=l)
-                    _stack.append(
-                        BinaryOp(op=BinaryOpKind.GET_PROPERTY, left=l, right=target)
-                    )
+                    push(BinaryOp(op=BinaryOpKind.GET_PROPERTY, left=l, right=target))
                 elif "GetKeyFrom" in sub_operation:
                     # Also not sure if this is correct
                     l = _stack.pop()
@@ -291,12 +484,11 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                     if l.value == "kfrmID  ":
                         _type = _stack.pop()
                         _stack.pop()
-                        l.value += _type.value
-                    _stack.append(
-                        BinaryOp(op=BinaryOpKind.GET_PROPERTY, left=l, right=r)
-                    )
+                        # A new node: the popped one may be shared
+                        l = replace(l, value=l.value + _type.value)
+                    push(BinaryOp(op=BinaryOpKind.GET_PROPERTY, left=l, right=r))
                 elif "GetRange" in sub_operation:
-                    _comment += str(_stack)
+                    _detail = ("%s%s", sub_operation, Bounded(list(_stack)))
                     _to = _stack.pop()
                     _from = _stack.pop()
                     _prop = _stack.pop()
@@ -308,45 +500,47 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                     _range_of = BinaryOp(
                         op=BinaryOpKind.GET_PROPERTY, left=_range, right=_var
                     )
-                    _stack.append(
+                    push(
                         BinaryOp(
                             op=BinaryOpKind.GET_PROPERTY, left=_prop, right=_range_of
                         )
                     )
                 else:
-                    print(f"-- Warning {op}:{sub_operation} is not implemented")
-                    _comment += " (not implemented)"
+                    tracer.warn(
+                        f"-- Warning {op}:{sub_operation} is not implemented",
+                        pos=_curr_pos,
+                    )
+                    _detail = ("%s (not implemented)", sub_operation)
                     _stack.pop()
             elif op == "SetData":
                 _var = _stack.pop()
             elif op == "GetData":
                 pass
             elif op in ["And", "Or"]:
-                _next = _curr_pos + 1 + word()
-                _comment += hex(_next) + " "
+                _next = insn.target
+                _detail = ("%#x ", _next)
                 _left = _stack.pop()
 
                 if op == "And":
-                    block_stack.append(AndOp(left=_left, right_end_pos=_next))
+                    open_block(AndOp(left=_left, right_end_pos=_next), _curr_pos)
                 else:
-                    block_stack.append(OrOp(left=_left, right_end_pos=_next))
+                    open_block(OrOp(left=_left, right_end_pos=_next), _curr_pos)
 
             elif op == "TestIf":
-                _else_pos = _curr_pos + 1 + word()
-                _comment += hex(_else_pos)
+                _else_pos = insn.target
+                _detail = ("%#x", _else_pos)
                 _cond = _stack.pop()
                 _block = IfStatement(
                     condition=_cond, else_pos=_else_pos, then_block=[], else_block=[]
                 )
-                block_stack.append(_block)
+                open_block(_block, _curr_pos)
             elif op == "MessageSend":
-                v = word()
+                v = operands[0]
                 event_code = number_to_code(
                     literal(v).value.identifier[0]
                 ) + number_to_code(literal(v).value.identifier[1])
-                _comment += str(v) + " (" + event_code  + ") # " + str(literal(v))
+                _detail = ("%d (%s) # %s", v, event_code, Bounded(literal(v)))
 
-               
                 args_count = _stack.pop().value
                 if args_count == 0:
                     args = []
@@ -354,14 +548,14 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                     args = _stack[-args_count:]
                     _stack = _stack[:-args_count]
 
-                _stack.append(
+                push(
                     CommandCall(
                         command_name=event_code, arguments=[_stack.pop()] + args
                     )
                 )
             elif op == "PositionalMessageSend":
-                v = word()
-                _comment += str(v) + " # " + str(literal(v))
+                v = operands[0]
+                _detail = ("%d # %s", v, Bounded(literal(v)))
                 args_count = _stack.pop().value
 
                 if args_count == 0:
@@ -377,7 +571,7 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                 else:
                     _target = None
 
-                _stack.append(
+                push(
                     HandlerCall(
                         handler_name=literal(v).decode(), arguments=args, target=_target
                     )
@@ -396,17 +590,18 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                 else:
                     _statements.append(ExprStatement(expr=_curr))
             elif op == "LinkRepeat":
-                v = word() + _curr_pos + 1
-                _comment += hex(v) + " "
-                block_stack.append(
+                v = insn.target
+                _detail = ("%#x ", v)
+                open_block(
                     RepeatStatement(
                         kind=RepeatKind.FOREVER, end_repeat_pos=v  # By default
-                    )
+                    ),
+                    _curr_pos,
                 )
             elif op == "RepeatNTimes":
                 _stack.pop()  # remove PushOne
                 N = _stack.pop()
-                _comment += str(N)
+                _detail = ("%s", Bounded(N))
                 _block = block_stack[-1]
                 _block.kind = RepeatKind.TIMES
                 _block.times = N
@@ -421,8 +616,8 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                 _block.kind = RepeatKind.UNTIL
                 _block.condition = cond
             elif op == "RepeatInCollection":
-                v = variable(word())
-                _comment += v
+                v = variable(operands[0])
+                _detail = ("%s", v)
                 _stack.pop()  # Push1
                 _stack.pop()  # Result of len(_arr)
                 _arr = _stack.pop()
@@ -431,8 +626,8 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                 _block.counter_var = VariableRef(v)
                 _block.in_expr = _arr
             elif op == "RepeatInRange":
-                v = variable(word())
-                _comment += v
+                v = variable(operands[0])
+                _detail = ("%s", v)
 
                 _by = _stack.pop()
                 _to = _stack.pop()
@@ -463,7 +658,7 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                 else:
                     _list = ListLiteral(elements=_stack[-vector_length:])
                     _stack = _stack[:-vector_length]
-                _stack.append(_list)
+                push(_list)
             elif op == "MakeRecord":
                 record_length = _stack.pop().value
                 if record_length == 0:
@@ -476,14 +671,14 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                     ]
                     _rec = RecordLiteral(fields=result)
                 _stack = _stack[:-record_length]
-                _stack.append(_rec)
+                push(_rec)
                 pass
             elif op == "ErrorHandler":
-                _comment += " " + hex(_curr_pos + 1 + word())
-                block_stack.append(TryStatement(try_block=[], on_error_block=[]))
+                _detail = (" %#x", insn.target)
+                open_block(TryStatement(try_block=[], on_error_block=[]), _curr_pos)
             elif op == "EndErrorHandler":
-                v = _curr_pos + 1 + word()
-                _comment += " " + hex(v)
+                v = insn.target
+                _detail = (" %#x", v)
 
                 curr_index = len(block_stack) - 1
                 while curr_index > 0 and not isinstance(
@@ -511,14 +706,14 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
 
                 block_stack[curr_index].end_try_pos = v
             elif op == "HandleError":
-                _comment += " " + variable(word()) + " " + variable(word())
+                _detail = (" %s %s", variable(operands[0]), variable(operands[1]))
             elif op == "PushParentVariable":
-                v = "[parent]" + variable(word())
-                _comment += " " + str(word()) + " " + v + " "
-                _stack.append(VariableRef(v))
+                v = "[parent]" + variable(operands[0])
+                _detail = (" %d %s ", operands[1], v)
+                push(VariableRef(v))
             elif op == "PopParentVariable":
-                v = "[parent]" + variable(word())
-                _comment += " " + str(word()) + " " + v + " "
+                v = "[parent]" + variable(operands[0])
+                _detail = (" %d %s ", operands[1], v)
                 _var = VariableRef(v)
             elif op == "Error":
                 args_count = _stack.pop()
@@ -555,14 +750,28 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
             # elif op == 'EndDefineActor':
             #     pass
             else:
-                _comment += "<disassembler not implemented> " + op
+                _detail = ("<disassembler not implemented> %s", op)
 
             _block = block_stack[-1]
 
-            if _comment is not None and add_comments:
-                _statements = [Comment(comment=_comment)] + _statements
-                
-            if debug: print(' '.join(_comment.split(' ')[2:]))
+            if trace_instructions:
+                tracer.emit(
+                    INSTRUCTION,
+                    pos=_curr_pos,
+                    op=op,
+                    detail=_detail,
+                    operands=_detail[1:],
+                    raw_operands=operands,
+                    literals=literals,
+                    insn=insn,
+                    stack=_stack,
+                    stack_before=_stack_before,
+                    handler=handler.name,
+                )
+                if comment_sink is not None:
+                    _statements = comment_sink.take() + _statements
+
+            budget.charge_instruction(insn.spec.pushes + len(_statements))
 
             _prev_op = op
             while True:
@@ -587,7 +796,7 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                                 and _block.target.value == "misccura"
                             ):
                                 _statements.append(_block)
-                            block_stack.pop()
+                            close_block(_curr_pos)
                             continue
                     elif isinstance(_block, TryStatement):
                         if _statements:
@@ -601,7 +810,7 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                             _block.end_try_pos is not None
                             and _curr_pos >= _block.end_try_pos
                         ):
-                            _statements.append(block_stack.pop())
+                            _statements.append(close_block(_curr_pos))
                             continue
                     elif isinstance(_block, RepeatStatement):
                         if _statements and (_curr_pos <= _block.end_repeat_pos):
@@ -612,7 +821,7 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                             _block.end_repeat_pos is not None
                             and _curr_pos >= _block.end_repeat_pos
                         ):
-                            _statements.append(block_stack.pop())
+                            _statements.append(close_block(_curr_pos))
                             continue
                     elif isinstance(_block, IfStatement):
                         # We need to keep track the end of the if block, from address in TestIf
@@ -627,7 +836,7 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                             if _curr_pos == _block.end_if_pos and _stack:
                                 _block.else_block.append(_stack.pop())
                             if _curr_pos == _block.end_if_pos:
-                                _statements.append(block_stack.pop())
+                                _statements.append(close_block(_curr_pos))
                                 continue
                     elif isinstance(_block, Handler):
                         if _statements:
@@ -638,30 +847,163 @@ def run_decompiler(f, add_comments=False, force=False, analyzer=None, debug=Fals
                 # If we are at the end of the decompilation, we should
                 # attach all handlers back to the root handler
                 if state["pos"] >= len(code) and len(block_stack) > 1:
-                    _statements.append(block_stack.pop())
+                    _statements.append(close_block(_curr_pos))
                 else:
                     break
 
-            # if _comment is not None and add_comments:
-            #     block_stack[0].body.append(Comment(comment=_comment))
-
         return block_stack[0]
 
-    handlers = []
+    result = DecompileResult(
+        analyzer=analyzer, passes=passes, streamed=stream is not None, force=force
+    )
+    handlers = result.handlers
+    # Identical expressions anywhere in the file end up as one instance
+    interner = Interner() if intern else None
+    unreachable = {}
+    if reachable_only:
+        graph = call_graph(root)
+        reachable = graph.reachable()
+        unreachable = {
+            offset: name
+            for offset, name in graph.names.items()
+            if offset not in reachable
+        }
     for cur_function_offset in range(2, len(root)):
+        report = start_report(cur_function_offset)
+        result.reports.append(report)
         try:
-            ret = decompile(cur_function_offset, add_comments=add_comments)
-            if ret is not None:
-                handlers.append(ret)
+            if cur_function_offset in unreachable:
+                note(
+                    report,
+                    f"-- {unreachable[cur_function_offset]} is never called, skipped",
+                )
+            else:
+                report.handler = decompile_function(cur_function_offset, report)
+        except StopDecompile as e:
+            result.stopped = e
+        except BudgetExceeded as e:
+            # Keep what we have so far, including the half-done handler
+            result.exceeded = e
+            report.handler = progress["handler"]
         except Exception as e:
-            print("-- Failed to decompile")
-            if not force:
-                raise e
-    print("-----")
-    print(Script(handlers=handlers).to_source(analyzer=analyzer))
+            report.error = _verified(root[cur_function_offset], e) if verify else e
+        report.warnings = warning_sink.take()
+
+        if report.nested is not None:
+            result.stopped = result.stopped or report.nested.stopped
+            result.exceeded = result.exceeded or report.nested.exceeded
+        if stream is None:
+            if report.handler is not None:
+                handlers.append(report.handler)
+        else:
+            stream(report)
+            # The consumer is done with it: release the AST along with the
+            # handler's code and literals
+            report.handler = None
+            root[cur_function_offset] = None
+            progress["handler"] = None
+            if interner is not None:
+                interner.clear()
+        if result.stopped or result.exceeded or (report.error and not force):
+            break
+
+    # Detection-only runs (hooks without output) can skip rendering entirely
+    if render and not result.aborted and stream is None:
+        result.text = result.render()
+    if result.exceeded is not None:
+        result.exceeded.partial = handlers
+    return result
+
+
+def _verified(function, error: Exception) -> Exception:
+    # A VerifyError for a handler's malformed bytecode, or `error` when the
+    # verifier finds nothing wrong. Only run once decompiling has failed
+    try:
+        code = function[CODE_OFFSET + 1].value
+        literals = function[LITERAL_OFFSET + 1]
+    except Exception:
+        return error
+    try:
+        verifier.verify(bytearray(code), literals)
+    except verifier.VerifyError as e:
+        e.__cause__ = error
+        return e
+    except Exception:
+        pass
+    return error
+
+
+def print_result(result: DecompileResult):
+    if result.streamed:
+        # The handlers have been printed by `stream_printer` already
+        lines = result.load_warnings
+    else:
+        lines = result.lines()
+    for line in lines:
+        print(line)
+
+
+def stream_printer(analyzer=None, passes=()):
+    """A `stream` callback printing each handler as soon as it is decompiled"""
+    printer = AppleScriptPrinter(analyzer=analyzer)
+    passes = Pipeline(passes)
+
+    def emit(report: HandlerReport):
+        for line in report.lines():
+            print(line)
+        if report.handler is not None:
+            handler = passes.run(report.handler)
+            printer.write(printer.prepare(handler), sys.stdout)
+            print()
+        sys.stdout.flush()
+
+    return emit
+
+
+def write_variants(result: DecompileResult, variants, path, output_dir=None):
+    """
+    Prints one labeled section per variant, or with `output_dir` writes
+    each to <scpt name>.<label>.applescript there
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for label, variant in result.variants(variants):
+        if output_dir is None:
+            print(f"-- ==== {label} ====")
+            print_result(variant)
+            continue
+        out_path = os.path.join(output_dir, f"{stem}.{label}.applescript")
+        with open(out_path, "w") as out:
+            out.write(f"-- {path}\n--\n")
+            for line in variant.lines():
+                out.write(line + "\n")
+        print(f"-- {label}: {out_path}")
+
+
+def raise_for_result(result: DecompileResult, force=False):
+    """Raises what `run_decompiler` used to raise for this result"""
+    if result.stopped is not None:
+        raise result.stopped
+    if not force and result.errors:
+        raise result.errors[0].error
+    if result.exceeded is not None:
+        raise result.exceeded
+
+
+def run_decompiler(f, add_comments=False, force=False, analyzer=None, **kwargs):
+    """Decompiles a loaded script and prints it like the command line does"""
+    result = decompile_loaded(f, add_comments, force, analyzer, **kwargs)
+    print_result(result)
+    raise_for_result(result, force)
 
 
 def cli():
+    if sys.argv[1:2] == ["diff"]:
+        return diff_cli(sys.argv[2:])
+    if sys.argv[1:2] == ["extract"]:
+        return extract_cli(sys.argv[2:])
+    if sys.argv[1:2] == ["callgraph"]:
+        return callgraph_cli(sys.argv[2:])
+
     args = parse_args()
 
     path = args.scpt
@@ -677,16 +1019,69 @@ def cli():
     if args.analyzer:
         analyzer = load_object(analyzer_mapping.get(args.analyzer, args.analyzer))
 
-    print(f'-- {path}')
-    print('--')
-    f = Loader()
-    f = f.load(path)
-    run_decompiler(f, add_comments=args.comments, force=args.force, analyzer=analyzer, debug=args.debug)
+    # label -> analyzer class, None for plain output
+    variants = {}
+    for spec in args.variants:
+        label, _, name = spec.rpartition("=")
+        if name == "raw":
+            variants[label or name] = None
+        else:
+            dotted = analyzer_mapping.get(name, name)
+            variants[label or dotted.rpartition(".")[2]] = load_object(dotted)
+    if variants and (analyzer or args.stream):
+        sys.exit("--variant cannot be combined with --analyzer or --stream")
+
+    passes = [PASSES.get(name) or load_object(name) for name in args.passes]
+
+    for directory in args.sdef_dirs:
+        if not os.path.isdir(directory):
+            sys.exit(f"--sdef-dir {directory}: not a directory")
+
+    budget = cli_budget(
+        args.no_limits,
+        objects=args.max_objects,
+        bytes=args.max_bytes,
+        depth=args.max_depth,
+        instructions=args.max_instructions,
+        nodes=args.max_nodes,
+        seconds=args.timeout,
+    )
+
+    # Files written by --output-dir carry their own header
+    if not (variants and args.output_dir):
+        print(f'-- {path}')
+        print('--')
+    result = decompile(
+        path,
+        analyzer=analyzer,
+        force=args.force,
+        add_comments=args.comments,
+        debug=args.debug,
+        budget=budget,
+        stream=stream_printer(analyzer, passes) if args.stream else None,
+        # Variants are rendered below, from the same tree
+        render=not variants,
+        passes=passes,
+        sdef_dirs=args.sdef_dirs,
+        reachable_only=args.reachable_only,
+        intern=args.intern,
+    )
+    if variants:
+        write_variants(result, variants, path, args.output_dir)
+    else:
+        print_result(result)
+    if result.exceeded is not None:
+        # Whatever was decompiled before this has already been printed
+        print(f"-- Stopped: {result.exceeded}")
+        sys.exit(2)
+    raise_for_result(result, args.force)
 
 
 def parse_args():
     parser = argparse.ArgumentParser(
-        prog="applescript_decompile", description="AppleScript .scpt decompiler"
+        prog="applescript_decompile",
+        description="AppleScript .scpt decompiler",
+        epilog="Run `applescript_decompile diff OLD NEW` to see which handlers changed between two files, `applescript_decompile extract FILE...` for their strings and commands as JSON, and `applescript_decompile callgraph FILE [--dot]` for which handlers call which",
     )
 
     parser.add_argument("scpt", help="Path to a compiled AppleScript .scpt file")
@@ -708,12 +1103,116 @@ def parse_args():
         action="store_true",
         help="Prints out the disassembled code while decompiling",
     )
+    parser.add_argument(
+        "-s",
+        "--stream",
+        action="store_true",
+        help="Print each handler as soon as it is decompiled instead of at the end",
+    )
     parser.add_argument(
         "--analyzer",
         default=None,
         help="It can be OSAMinerDecryptAnalyzer or NaiveStringAnalyzer or a full dotted path to analyzer class like applescript_decompiler.OSAMinerDecryptAnalyzer, applescript_decompiler.NaiveStringAnalyzer, or  local.MyAnalyzer (for a file in local.py)",
     )
 
+    parser.add_argument(
+        "--pass",
+        dest="passes",
+        action="append",
+        default=[],
+        metavar="PASS",
+        help=f"Rewrite the decompiled tree before printing, can be repeated. One of {', '.join(PASSES)} or a dotted path to a Pass class",
+    )
+
+    parser.add_argument(
+        "--sdef-dir",
+        dest="sdef_dirs",
+        action="append",
+        default=[],
+        metavar="DIR",
+        help="Also name commands and keywords from the .sdef files in DIR, can be repeated. Parsed files are cached in ~/.cache/applescript_decompiler",
+    )
+
+    parser.add_argument(
+        "--reachable-only",
+        action="store_true",
+        help="Skip the handlers that neither the run handler nor any other event handler calls. See `applescript_decompile callgraph`",
+    )
+
+    parser.add_argument(
+        "--intern",
+        action="store_true",
+        help="Share identical expressions across the file: less memory on large obfuscated scripts, slower",
+    )
+
+    parser.add_argument(
+        "--variant",
+        dest="variants",
+        action="append",
+        default=[],
+        metavar="[LABEL=]ANALYZER",
+        help="Decompile once and print the script once per variant, can be repeated. ANALYZER is raw or anything --analyzer takes",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        default=None,
+        metavar="DIR",
+        help="With --variant, write each variant to DIR/<scpt name>.<label>.applescript instead of printing it",
+    )
+
+    budgets = parser.add_argument_group(
+        "budgets",
+        "Stop early on hostile samples and print what was decompiled so far. Defaults in parentheses",
+    )
+    budgets.add_argument(
+        "--max-objects",
+        type=int,
+        metavar="N",
+        default=None,
+        help=f"Objects the loader may create ({CLI_LIMITS['objects']})",
+    )
+    budgets.add_argument(
+        "--max-bytes",
+        type=int,
+        metavar="N",
+        default=None,
+        help=f"Bytes the loader may read ({CLI_LIMITS['bytes']})",
+    )
+    budgets.add_argument(
+        "--max-depth",
+        type=int,
+        metavar="N",
+        default=None,
+        help=f"Nesting depth of loaded objects ({CLI_LIMITS['depth']})",
+    )
+    budgets.add_argument(
+        "--max-instructions",
+        type=int,
+        metavar="N",
+        default=None,
+        help=f"Instructions the decompiler may decode ({CLI_LIMITS['instructions']})",
+    )
+    budgets.add_argument(
+        "--max-nodes",
+        type=int,
+        metavar="N",
+        default=None,
+        help=f"AST nodes the decompiler may create ({CLI_LIMITS['nodes']})",
+    )
+    budgets.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help=f"Wall time in seconds ({CLI_LIMITS['seconds']})",
+    )
+    budgets.add_argument(
+        "--no-limits",
+        action="store_true",
+        help="No defaults: only the limits given above apply",
+    )
+
     try:
         return parser.parse_args()
     except Exception:
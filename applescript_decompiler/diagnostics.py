@@ -0,0 +1,217 @@
+from dataclasses import fields, is_dataclass
+from enum import Enum
+from itertools import islice
+from string import Formatter
+
+from jinmo_applescript_disassembler.engine import runtimeobjects as rto
+from jinmo_applescript_disassembler.engine.fasobjects.data_block import Descriptor
+
+# Bounded text for runtime objects and ASTs in notes, comments and warnings.
+#
+# The loader's objects print themselves with recursive reprs: a list literal
+# is a chain of Pairs, bindings are linked through `next`, and value blocks
+# nest. On hostile samples those reprs are huge, slow and can hit the
+# recursion limit. `BoundedRepr` prints the same text with an explicit stack,
+# and cuts it short at a depth, a number of items and a length.
+
+
+# Reprs of the loader's objects that have other objects inside, keyed by the
+# exact class: subclasses such as EmptyPair print differently
+_TEMPLATES = {
+    rto.Object: "<Value type=object value={value!r}>",
+    rto.String: "<Value type=string value={value!r}>",
+    rto.Binding: "<Binding a={a!r} b={b!r} c={c!r} next={next!r}>",
+    rto.Reference: "<Reference to={to}>",
+    rto.Pair: "<Value type=pair first={first!r} second={second!r}>",
+    rto.Statement: (
+        "<Statement type_info={type_info!r} bytecode_start={bytecode_start!r}"
+        " bytecode_end={bytecode_end!r} children={children!r}>"
+    ),
+    rto.UnicodeText: "<UnicodeText text={text!r} style={style!r}>",
+    Descriptor: "<Descriptor type={type!r} content={content!r}>",
+}
+
+# class -> [(literal text, attribute or None, use str?)]
+_PARSED = {
+    cls: [
+        (text, name, conversion is None)
+        for text, name, _, conversion in Formatter().parse(template)
+    ]
+    for cls, template in _TEMPLATES.items()
+}
+
+_ATOMS = (str, bytes, int, float, bool, type(None), Enum, type)
+
+
+class _Exit:
+    # Marks the end of an object's children on the stack
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+
+class BoundedRepr:
+    """
+    `repr` that stops at `max_depth` nesting levels, `max_items` items per
+    list, tuple or dict, `max_string` characters per string and `max_length`
+    characters in all. An object met again prints as `<shared ...>`, or as
+    `<cycle ...>` when it contains itself. Under the limits the text is the
+    same as `repr`.
+    """
+
+    max_depth = 12
+    max_items = 64
+    max_string = 2048
+    max_length = 4096
+
+    def __init__(self, **limits):
+        for name, value in limits.items():
+            if not hasattr(self, name):
+                raise TypeError(f"unknown limit {name!r}")
+            setattr(self, name, value)
+
+    def repr(self, obj) -> str:
+        return self._render(obj, False)
+
+    def str(self, obj) -> str:
+        """Like `str`, for %s: strings print as they are"""
+        return self._render(obj, True)
+
+    def _render(self, obj, as_str) -> str:
+        out = []
+        length = 0
+        # Objects printed so far that have others inside, and those being printed
+        seen = set()
+        open_ = set()
+        # text, _Exit, or (object, depth, use str?)
+        todo = [(obj, 0, as_str)]
+        while todo:
+            item = todo.pop()
+            if item.__class__ is str:
+                text = item
+            elif item.__class__ is _Exit:
+                open_.discard(id(item.obj))
+                continue
+            else:
+                value, depth, as_str = item
+                text = self._expand(value, depth, as_str, todo, seen, open_)
+                if text is None:
+                    continue
+            out.append(text)
+            length += len(text)
+            if length > self.max_length:
+                return "".join(out)[: self.max_length] + "..."
+        return "".join(out)
+
+    def _expand(self, value, depth, as_str, todo, seen, open_):
+        # The text of `value`, or None once its parts are queued on `todo`
+        cls = value.__class__
+        if isinstance(value, (str, bytes)):
+            if len(value) > self.max_string:
+                return self._atom(value[: self.max_string], as_str) + "..."
+            return self._atom(value, as_str)
+        if isinstance(value, _ATOMS):
+            return self._atom(value, as_str)
+
+        if cls in (list, tuple, dict):
+            parts = self._container(value)
+        elif cls in _PARSED:
+            parts = []
+            for text, name, use_str in _PARSED[cls]:
+                if text:
+                    parts.append(text)
+                if name is not None:
+                    parts.append((getattr(value, name, None), use_str))
+        elif is_dataclass(value) and cls.__repr__ is not object.__repr__:
+            names = [f.name for f in fields(value) if f.repr]
+            parts = [cls.__qualname__ + "("]
+            for i, name in enumerate(names):
+                parts.append(f"{', ' if i else ''}{name}=")
+                parts.append((getattr(value, name), False))
+            parts.append(")")
+        else:
+            # Nothing inside that could blow up, as far as we know
+            return self._atom(value, as_str)
+
+        composite = any(
+            p.__class__ is tuple and not isinstance(p[0], _ATOMS) for p in parts
+        )
+        if composite:
+            if id(value) in open_:
+                return f"<cycle {cls.__name__}>"
+            if id(value) in seen:
+                return f"<shared {cls.__name__}>"
+            if depth >= self.max_depth:
+                return self._elided(value)
+            seen.add(id(value))
+            open_.add(id(value))
+            todo.append(_Exit(value))
+
+        for part in reversed(parts):
+            if part.__class__ is str:
+                todo.append(part)
+            else:
+                todo.append((part[0], depth + 1, part[1]))
+        return None
+
+    def _container(self, value):
+        cls = value.__class__
+        items = list(
+            islice(value.items() if cls is dict else value, self.max_items + 1)
+        )
+        more = len(items) > self.max_items
+        items = items[: self.max_items]
+        parts = ["{" if cls is dict else "[" if cls is list else "("]
+        for i, item in enumerate(items):
+            if i:
+                parts.append(", ")
+            if cls is dict:
+                parts.extend([(item[0], False), ": ", (item[1], False)])
+            else:
+                parts.append((item, False))
+        if more:
+            parts.append(", ...")
+        if cls is tuple and len(items) == 1 and not more:
+            parts.append(",")
+        parts.append("}" if cls is dict else "]" if cls is list else ")")
+        return parts
+
+    def _atom(self, value, as_str):
+        return str(value) if as_str and value.__class__ is str else repr(value)
+
+    def _elided(self, value):
+        cls = value.__class__
+        if cls is list:
+            return "[...]"
+        if cls is tuple:
+            return "(...)"
+        if cls is dict:
+            return "{...}"
+        return f"<{cls.__name__} ...>"
+
+
+_default = BoundedRepr()
+
+
+def bounded_repr(obj) -> str:
+    """`BoundedRepr().repr(obj)` with the default limits"""
+    return _default.repr(obj)
+
+
+class Bounded:
+    """
+    `obj` for %-formatting: prints through `BoundedRepr`, and only when it
+    is printed. Instruction details keep these until a sink wants the text.
+    """
+
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return _default.str(self.obj)
+
+    def __repr__(self):
+        return _default.repr(self.obj)
@@ -0,0 +1,391 @@
+import re
+import sys
+import argparse
+import difflib
+from dataclasses import dataclass, field
+from hashlib import blake2b
+from typing import Dict, Iterator, List, Optional
+
+from applescript_decompiler.ast import *
+from applescript_decompiler.passes import (
+    PASSES,
+    _FIELDS,
+    _child_nodes,
+    _field_names,
+    walk,
+)
+from applescript_decompiler.utils import load_object
+
+# Structural hashes of decompiled trees, and a diff of two scripts that only
+# looks inside what the hashes say has changed.
+
+# Bytecode offsets and decompiler bookkeeping. Offsets move whenever
+# anything before them changes, so they say nothing about the code itself
+IGNORED_FIELDS = frozenset(
+    {
+        "else_pos",
+        "end_if_pos",
+        "end_repeat_pos",
+        "end_try_pos",
+        "right_end_pos",
+        "is_done",
+    }
+)
+
+# Fields holding statements, which the diff descends into
+BLOCK_FIELDS = frozenset(
+    {"handlers", "body", "then_block", "else_block", "try_block", "on_error_block"}
+)
+
+# [var_3], [var_0 ('x')]: locals are numbered by slot
+_VAR_NUMBER = re.compile(r"\[var_(\d+)")
+
+
+def local_order(handler: Handler) -> Dict[str, int]:
+    """Slot of each local of `handler` -> in which order it first appears"""
+    order = {}
+    for node in walk(handler):
+        if node.__class__ is VariableRef:
+            match = _VAR_NUMBER.match(node.name)
+            if match is not None:
+                order.setdefault(match.group(1), len(order))
+    return order
+
+
+class StructuralHasher:
+    """
+    Merkle hashes of nodes. A node's digest covers its class, its fields and
+    its children's digests, so two subtrees have the same digest when they
+    print the same, up to bytecode offsets and the numbering of locals.
+    Locals are renumbered in the order they first appear in their handler,
+    so `[var_0] - [var_1]` and `[var_1] - [var_0]` only hash the same in
+    handlers where that order is swapped too.
+
+    Digests depend on the handler a node is in: hashing a Handler enters it,
+    and the nodes hashed after that are taken to be part of it, until the
+    next Handler is hashed (or `enter`ed). Digests are cached bottom up, per
+    node and handler: shared subtrees are hashed once, and hashing a tree
+    again after a change only hashes what is new.
+    """
+
+    def __init__(self):
+        # id(handler) -> (handler, local_order, cache); None outside handlers
+        self._scopes = {None: (None, {}, {})}
+        self._order = {}
+        # id(node) -> (node, digest); the node keeps its id from being reused
+        self.cache = self._scopes[None][2]
+
+    def enter(self, handler: Handler):
+        """Hashes what follows as part of `handler`"""
+        scope = self._scopes.get(id(handler))
+        if scope is None:
+            scope = (handler, local_order(handler), {})
+            self._scopes[id(handler)] = scope
+        self._order = scope[1]
+        self.cache = scope[2]
+
+    def __call__(self, root: Node) -> str:
+        if root.__class__ is Handler:
+            self.enter(root)
+        elif root.__class__ is Script:
+            # Each handler in its own scope, then the script around them
+            digests = [(h, self(h)) for h in root.handlers]
+            scope = self._scopes[None]
+            self._order, self.cache = scope[1], scope[2]
+            for handler, digest in digests:
+                self.cache.setdefault(id(handler), (handler, digest))
+        cache = self.cache
+        # Chains are deeper than the recursion limit
+        # (node, children already queued?)
+        todo = [(root, False)]
+        while todo:
+            node, expanded = todo.pop()
+            if id(node) in cache:
+                continue
+            if not expanded:
+                todo.append((node, True))
+                todo.extend(
+                    (c, False) for c in _child_nodes(node) if id(c) not in cache
+                )
+                continue
+            cache[id(node)] = (node, self._digest(node, IGNORED_FIELDS))
+        return cache[id(root)][1]
+
+    def header(self, node: Node, skip=BLOCK_FIELDS) -> str:
+        """The digest of `node` leaving out the statements it holds"""
+        if node.__class__ is Handler:
+            self.enter(node)
+        for child in _child_nodes(node):
+            self(child)
+        return self._digest(node, IGNORED_FIELDS | skip)
+
+    def _digest(self, node, skip) -> str:
+        # The children are hashed already
+        cache = self.cache
+        cls = node.__class__
+        parts = [cls.__name__]
+        for name in _FIELDS.get(cls) or _field_names(cls):
+            if name in skip:
+                continue
+            value = getattr(node, name)
+            if isinstance(value, Node):
+                token = "#" + cache[id(value)][1]
+            elif value.__class__ is list:
+                tokens = [
+                    "#" + cache[id(v)][1] if isinstance(v, Node) else repr(v)
+                    for v in value
+                ]
+                token = "[" + ",".join(tokens) + "]"
+            elif cls is VariableRef and name == "name":
+                match = _VAR_NUMBER.match(value)
+                if match is not None:
+                    number = self._order.get(match.group(1), "?")
+                    value = f"[var_{number}{value[match.end():]}"
+                token = repr(value)
+            else:
+                # repr keeps 1, 1.0 and True apart
+                token = repr(value)
+            parts.append(name)
+            parts.append(token)
+        text = " ".join(parts)
+        return blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+@dataclass
+class Hunk:
+    """Statements at `path` that differ, old and new"""
+
+    path: str
+    old: List[Statement] = field(default_factory=list)
+    new: List[Statement] = field(default_factory=list)
+    # Tell target the statements are printed under
+    old_target: str = DEFAULT_TARGET
+    new_target: str = DEFAULT_TARGET
+    indent: int = 0
+
+
+@dataclass
+class HandlerChange:
+    # "added", "removed", "renamed" or "changed"
+    kind: str
+    old: Optional[Handler] = None
+    new: Optional[Handler] = None
+    hunks: List[Hunk] = field(default_factory=list)
+
+
+@dataclass
+class ScriptDiff:
+    changes: List[HandlerChange] = field(default_factory=list)
+    unchanged: int = 0
+
+    def __bool__(self):
+        return bool(self.changes)
+
+
+def diff_scripts(old: Script, new: Script) -> ScriptDiff:
+    """
+    Handlers are matched by name, then by what they contain, so renamed
+    handlers are found. Only blocks whose digests differ are looked into;
+    unchanged handlers cost one digest comparison.
+    """
+    return _Differ().diff(old, new)
+
+
+class _Differ:
+    def __init__(self):
+        self.old_hash = StructuralHasher()
+        self.new_hash = StructuralHasher()
+        self.old_printer = AppleScriptPrinter()
+        self.new_printer = AppleScriptPrinter()
+        # Targets of the tell blocks around, old and new
+        self._targets = []
+
+    def diff(self, old: Script, new: Script) -> ScriptDiff:
+        result = ScriptDiff()
+        old_left = self._by_name(old.handlers)
+        new_left = self._by_name(new.handlers)
+
+        for name in list(old_left):
+            if name not in new_left:
+                continue
+            a, b = old_left.pop(name), new_left.pop(name)
+            if self.old_hash(a) == self.new_hash(b):
+                result.unchanged += 1
+                continue
+            change = HandlerChange("changed", a, b)
+            self._diff_node(a, b, name, 1, change.hunks)
+            result.changes.append(change)
+
+        # What is left was added, removed or renamed
+        renamed = {}
+        for b in new_left.values():
+            renamed.setdefault(self.new_hash.header(b, {"name"}), []).append(b)
+        for a in old_left.values():
+            matches = renamed.get(self.old_hash.header(a, {"name"}))
+            if matches:
+                result.changes.append(HandlerChange("renamed", a, matches.pop(0)))
+            else:
+                result.changes.append(HandlerChange("removed", a))
+        for matches in renamed.values():
+            for b in matches:
+                result.changes.append(HandlerChange("added", new=b))
+        return result
+
+    def _by_name(self, handlers) -> Dict[str, Handler]:
+        # By the name they print with, event handlers are named by Objects.
+        # Handlers with the same name are told apart by their position
+        named = {}
+        for handler in handlers:
+            name = base = self.old_printer._handler_name(handler)
+            n = 1
+            while name in named:
+                n += 1
+                name = f"{base}#{n}"
+            named[name] = handler
+        return named
+
+    def _diff_node(self, a, b, path, indent, hunks):
+        # a and b differ; if only the statements they hold do, go into those
+        if a.__class__ is not b.__class__ or (
+            self.old_hash.header(a) != self.new_hash.header(b)
+        ):
+            hunks.append(self._hunk(path, [a], [b], indent - 1))
+            return
+        if isinstance(a, TellBlock):
+            self._enter_tell(a, b)
+        for name in _field_names(a.__class__):
+            if name in BLOCK_FIELDS:
+                self._diff_block(
+                    getattr(a, name) or [],
+                    getattr(b, name) or [],
+                    f"{path} > {name}",
+                    indent,
+                    hunks,
+                )
+        if isinstance(a, TellBlock):
+            self._leave_tell()
+
+    def _diff_block(self, old, new, path, indent, hunks):
+        a = [self.old_hash(s) for s in old]
+        b = [self.new_hash(s) for s in new]
+        matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            if tag == "replace" and i2 - i1 == j2 - j1:
+                # The same number of statements: pair them up
+                for i, (x, y) in enumerate(zip(old[i1:i2], new[j1:j2])):
+                    self._diff_node(x, y, f"{path}[{i1 + i}]", indent + 1, hunks)
+                continue
+            hunks.append(self._hunk(f"{path}[{i1}]", old[i1:i2], new[j1:j2], indent))
+
+    def _hunk(self, path, old, new, indent) -> Hunk:
+        return Hunk(
+            path,
+            old,
+            new,
+            self.old_printer.target,
+            self.new_printer.target,
+            indent,
+        )
+
+    # Keywords print differently depending on the application told
+    def _enter_tell(self, a: TellBlock, b: TellBlock):
+        self._targets.append((self.old_printer.target, self.new_printer.target))
+        self.old_printer.target = self.old_printer.visit(a.target, 0)
+        self.new_printer.target = self.new_printer.visit(b.target, 0)
+
+    def _leave_tell(self):
+        self.old_printer.target, self.new_printer.target = self._targets.pop()
+
+
+def format_diff(diff: ScriptDiff, old_label="a", new_label="b") -> Iterator[str]:
+    printer = AppleScriptPrinter()
+
+    def _render(node, target, indent):
+        printer.target = target
+        return printer.visit(node, indent).rstrip("\n").split("\n")
+
+    name = printer._handler_name
+
+    yield f"--- {old_label}"
+    yield f"+++ {new_label}"
+    yield f"-- {diff.unchanged} handler(s) unchanged"
+    for change in diff.changes:
+        if change.kind == "renamed":
+            yield f"-- renamed: {name(change.old)} -> {name(change.new)}"
+        elif change.kind == "removed":
+            yield f"-- removed: {name(change.old)}"
+            for line in _render(change.old, DEFAULT_TARGET, 0):
+                yield "-" + line
+        elif change.kind == "added":
+            yield f"-- added: {name(change.new)}"
+            for line in _render(change.new, DEFAULT_TARGET, 0):
+                yield "+" + line
+        else:
+            yield f"-- changed: {name(change.old)}"
+            for hunk in change.hunks:
+                yield f"@@ {hunk.path}"
+                for stmt in hunk.old:
+                    for line in _render(stmt, hunk.old_target, hunk.indent):
+                        yield "-" + line
+                for stmt in hunk.new:
+                    for line in _render(stmt, hunk.new_target, hunk.indent):
+                        yield "+" + line
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="applescript_decompile diff",
+        description="Shows which handlers changed between two .scpt files",
+    )
+    parser.add_argument("old", help="Path to the older .scpt file")
+    parser.add_argument("new", help="Path to the newer .scpt file")
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Keep going past handlers that fail to decompile",
+    )
+    parser.add_argument(
+        "--pass",
+        dest="passes",
+        action="append",
+        default=[],
+        metavar="PASS",
+        help=f"Rewrite both trees before comparing, can be repeated. One of {', '.join(PASSES)} or a dotted path to a Pass class",
+    )
+    parser.add_argument(
+        "--sdef-dir",
+        dest="sdef_dirs",
+        action="append",
+        default=[],
+        metavar="DIR",
+        help="Also name commands and keywords from the .sdef files in DIR, can be repeated",
+    )
+    args = parser.parse_args(argv)
+
+    # Imported here, the decompiler's command line imports this module
+    from applescript_decompiler.decompiler import decompile
+
+    passes = [PASSES.get(name) or load_object(name) for name in args.passes]
+    scripts = []
+    for path in (args.old, args.new):
+        result = decompile(
+            path,
+            force=args.force,
+            render=False,
+            passes=passes,
+            sdef_dirs=args.sdef_dirs,
+        )
+        for report in result.errors:
+            print(f"-- {path}: data offset {report.offset} failed: {report.error}")
+        if result.exceeded is not None:
+            print(f"-- {path}: stopped: {result.exceeded}")
+        scripts.append(result.rewritten())
+
+    diff = diff_scripts(*scripts)
+    for line in format_diff(diff, args.old, args.new):
+        print(line)
+    # Like diff(1)
+    sys.exit(1 if diff else 0)
@@ -0,0 +1,633 @@
+import math
+import re
+from typing import Dict, Iterable, List
+
+from jinmo_applescript_disassembler.engine.budget import Budget, BudgetExceeded
+
+from applescript_decompiler.ast import *
+
+# Evaluates pure handlers on constant arguments, so that calls like d("...")
+# can be replaced by what they return.
+#
+# Handlers are run from their decompiled tree, which is the decompiler's
+# model of the opcodes with loops and conditions already recovered. Only
+# arithmetic, comparisons, text and lists are implemented, plus the two
+# Standard Additions commands that convert characters. Everything else
+# (application commands, globals, properties, tell and try blocks, script
+# objects) makes the call fail with NotEvaluable, never run. Every call is
+# charged against a Budget: `instructions` counts evaluated nodes, `bytes`
+# the characters and items of the text and lists built.
+
+
+class NotEvaluable(Exception):
+    """The handler does something outside the pure subset, or fails"""
+
+
+class _Return(Exception):
+    def __init__(self, value):
+        self.value = value
+
+
+class _Exit(Exception):
+    pass
+
+
+# [var_3], [var_0 ('s')]: locals by slot, parameters are the first slots
+_SLOT = re.compile(r"\[var_(\d+)")
+
+_TEXT_TYPES = frozenset(("TEXT", "ctxt", "utxt", "itxt"))
+_NUMBER_TYPES = frozenset(("doub", "nmbr", "real"))
+
+_ASCII_CHARACTER = "sysontoc"
+_ASCII_NUMBER = "sysocton"
+
+
+def to_value(node: Node):
+    """The value of a literal, NotEvaluable for anything else"""
+    cls = node.__class__
+    if cls is StringLiteral or cls is NumberLiteral or cls is BooleanLiteral:
+        return node.value
+    if cls is ListLiteral:
+        return [to_value(e) for e in node.elements]
+    raise NotEvaluable(f"{cls.__name__} is not a constant")
+
+
+def to_literal(value) -> Expression:
+    """The literal for a value `to_value` could return"""
+    cls = value.__class__
+    if cls is str:
+        return StringLiteral(value=value)
+    if cls is bool:
+        return BooleanLiteral(value=value)
+    if cls is list:
+        return ListLiteral(elements=[to_literal(v) for v in value])
+    return NumberLiteral(value=value)
+
+
+def _key(value):
+    # Hashable and exact: 1, 1.0 and True are different arguments
+    cls = value.__class__
+    if cls is list:
+        return (list, tuple(_key(v) for v in value))
+    if cls is float:
+        return (float, repr(value))
+    return (cls, value)
+
+
+def _text(value) -> str:
+    cls = value.__class__
+    if cls is str:
+        return value
+    if cls is bool:
+        return "true" if value else "false"
+    if cls is int:
+        return str(value)
+    if cls is float:
+        return repr(value)
+    if cls is list:
+        # With the default text item delimiters, ""
+        return "".join(_text(v) for v in value)
+    raise NotEvaluable(f"cannot make {cls.__name__} into text")
+
+
+def _number(value):
+    cls = value.__class__
+    if cls is int or cls is float:
+        return value
+    if cls is str:
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    if cls is list and len(value) == 1:
+        return _number(value[0])
+    raise NotEvaluable(f"cannot make {value!r} into a number")
+
+
+def _integer(value) -> int:
+    number = _number(value)
+    if number.__class__ is float:
+        if not math.isfinite(number):
+            raise NotEvaluable(f"cannot make {number!r} into an integer")
+        return round(number)
+    return number
+
+
+def _items(value) -> list:
+    # What `repeat with x in`, `items of` and `item n of` see
+    cls = value.__class__
+    if cls is list:
+        return value
+    if cls is str:
+        return list(value)
+    return [value]
+
+
+def _fold(value):
+    # Comparisons ignore case, like AppleScript's default `ignoring case`
+    return value.casefold() if value.__class__ is str else value
+
+
+class Emulator:
+    """
+    Runs `handlers` on constant arguments. Results are kept per handler and
+    arguments, failures included, so each distinct call is evaluated once.
+    Each call from outside gets `instructions` and `memory` of its own;
+    handlers called from it share those and nest at most `depth` deep.
+    """
+
+    def __init__(
+        self,
+        handlers: Iterable[Handler] = (),
+        instructions: int = 100_000,
+        memory: int = 1_000_000,
+        depth: int = 16,
+    ):
+        # AppleScript handler names ignore case
+        self.handlers: Dict[str, Handler] = {}
+        for handler in handlers:
+            if handler.name.__class__ is str:
+                self.handlers[handler.name.casefold()] = handler
+        self.instructions = instructions
+        self.memory = memory
+        self.depth = depth
+        # (handler name, argument keys) -> (value,) or the NotEvaluable
+        self.results = {}
+        self.budget = None
+        self.calls = 0
+
+    def call(self, name: str, arguments: List):
+        """
+        What handler `name` returns for `arguments` (values, see
+        `to_value`). Raises NotEvaluable, or BudgetExceeded the first time.
+        """
+        key = (name.casefold(), tuple(_key(a) for a in arguments))
+        found = self.results.get(key)
+        if found is None:
+            outermost = self.budget is None
+            if outermost:
+                self.budget = Budget(instructions=self.instructions, bytes=self.memory)
+            try:
+                found = (self._run(key[0], arguments),)
+            except NotEvaluable as e:
+                found = e
+            except RecursionError:
+                # Expressions nested deeper than Python's stack, other than
+                # operator chains: a limit like the budget, recorded the same
+                if not outermost:
+                    raise
+                found = NotEvaluable("nested too deeply")
+            except BudgetExceeded as e:
+                # Only for the call that was given the budget: a nested call
+                # may well fit in a budget of its own
+                if outermost:
+                    self.results[key] = NotEvaluable(str(e))
+                raise
+            finally:
+                if outermost:
+                    self.budget = None
+            self.results[key] = found
+        if found.__class__ is tuple:
+            return found[0]
+        raise found
+
+    def _run(self, name, arguments):
+        handler = self.handlers.get(name)
+        if handler is None:
+            raise NotEvaluable(f"no handler {name}")
+        if len(arguments) != len(handler.parameters):
+            raise NotEvaluable(f"{name} takes {len(handler.parameters)} arguments")
+        if self.calls >= self.depth:
+            raise BudgetExceeded("depth", self.depth)
+        self.calls += 1
+        frame = _Frame(self, dict(enumerate(arguments)))
+        try:
+            frame.block(handler.body)
+        except _Return as e:
+            return e.value
+        except _Exit:
+            raise NotEvaluable("exit repeat outside a repeat")
+        finally:
+            self.calls -= 1
+        # Without a return, a handler returns the result of its last statement
+        if frame.result is None:
+            raise NotEvaluable(f"{name} returns nothing")
+        return frame.result[0]
+
+
+class _Frame:
+    # One handler call: its locals and the last result
+
+    def __init__(self, emulator: Emulator, slots: Dict[int, object]):
+        self.emulator = emulator
+        self.budget = emulator.budget
+        self.slots = slots
+        self.result = None
+
+    def lookup(self, node: VariableRef):
+        match = _SLOT.match(node.name)
+        if match is None:
+            raise NotEvaluable(f"{node.name} is not a local variable")
+        try:
+            return self.slots[int(match.group(1))]
+        except KeyError:
+            raise NotEvaluable(f"{node.name} is not defined") from None
+
+    def call(self, node: HandlerCall):
+        if node.target is not None and not (
+            node.target.__class__ is VariableRef and node.target.name == "my"
+        ):
+            raise NotEvaluable("calls to other scripts are not supported")
+        arguments = [self.expr(a) for a in node.arguments]
+        return self.emulator.call(node.handler_name, arguments)
+
+    # ---- statements
+
+    def block(self, statements):
+        for statement in statements or ():
+            self.statement(statement)
+
+    def statement(self, node):
+        self.budget.charge_instruction()
+        cls = node.__class__
+        if cls is SetStatement:
+            value = self.expr(node.value)
+            self.slots[self._slot(node.target.obj)] = value
+            self.result = (value,)
+        elif cls is ExprStatement:
+            self.result = (self.expr(node.expr),)
+        elif cls is ReturnStatement:
+            if node.value is None:
+                raise NotEvaluable("return without a value")
+            raise _Return(self.expr(node.value))
+        elif cls is IfStatement:
+            if self._boolean(self.expr(node.condition)):
+                self.block(node.then_block)
+            else:
+                self.block(node.else_block)
+        elif cls is RepeatStatement:
+            self.repeat(node)
+        elif cls is ExitRepeat:
+            raise _Exit()
+        elif isinstance(node, Expression):
+            # Left on the stack at the end of an else block
+            self.result = (self.expr(node),)
+        else:
+            raise NotEvaluable(f"{cls.__name__} is not supported")
+
+    def repeat(self, node: RepeatStatement):
+        kind = node.kind
+        if kind is RepeatKind.FOREVER:
+            loop = iter(int, 1)
+        elif kind is RepeatKind.TIMES:
+            loop = range(_integer(self.expr(node.times)))
+        elif kind is RepeatKind.WHILE or kind is RepeatKind.UNTIL:
+            loop = self._while(node.condition, kind is RepeatKind.WHILE)
+        elif kind is RepeatKind.WITH_COUNTER:
+            loop = self._counter(node)
+        elif kind is RepeatKind.WITH_IN:
+            # The list is read once; the variable is a reference to each item,
+            # which reads the same as the item
+            slot = self._slot(node.counter_var)
+            loop = self._assign(slot, list(_items(self.expr(node.in_expr))))
+        else:
+            raise NotEvaluable(f"repeat {kind} is not supported")
+        try:
+            for _ in loop:
+                self.budget.charge_instruction()
+                self.block(node.body)
+        except _Exit:
+            pass
+
+    def _while(self, condition, expected):
+        while self._boolean(self.expr(condition)) is expected:
+            yield
+
+    def _counter(self, node):
+        start = _number(self.expr(node.from_expr))
+        stop = _number(self.expr(node.to_expr))
+        step = 1 if node.by_expr is None else _number(self.expr(node.by_expr))
+        if step == 0:
+            raise NotEvaluable("repeat by 0")
+        values = []
+        value = start
+        # Bounds are read once, assigning to the variable does not change them
+        while (value <= stop) if step > 0 else (value >= stop):
+            values.append(value)
+            value += step
+            self.budget.charge_instruction()
+        return self._assign(self._slot(node.counter_var), values)
+
+    def _assign(self, slot, values):
+        for value in values:
+            self.slots[slot] = value
+            yield
+
+    def _slot(self, node) -> int:
+        if node.__class__ is VariableRef:
+            match = _SLOT.match(node.name)
+            if match is not None:
+                return int(match.group(1))
+        raise NotEvaluable("only local variables can be assigned")
+
+    def _boolean(self, value) -> bool:
+        if value.__class__ is bool:
+            return value
+        if value.__class__ is str and value.casefold() in ("true", "false"):
+            return value.casefold() == "true"
+        raise NotEvaluable(f"{value!r} is not a boolean")
+
+    # ---- expressions
+
+    def expr(self, node):
+        self.budget.charge_instruction()
+        cls = node.__class__
+        if cls is StringLiteral or cls is NumberLiteral or cls is BooleanLiteral:
+            return node.value
+        if cls is VariableRef:
+            return self.lookup(node)
+        if cls is ListLiteral:
+            values = [self.expr(e) for e in node.elements]
+            self.budget.charge_bytes(len(values))
+            return values
+        if cls is BinaryOp:
+            return self.binary(node)
+        if cls is UnaryOp:
+            value = self.expr(node.operand)
+            if node.op is UnaryOpKind.NEG:
+                return -_number(value)
+            if node.op is UnaryOpKind.NOT:
+                return not self._boolean(value)
+        elif cls is CommandCall:
+            return self.command(node)
+        elif cls is HandlerCall:
+            return self.call(node)
+        raise NotEvaluable(f"{cls.__name__} is not supported")
+
+    def command(self, node: CommandCall):
+        if node.target is not None or len(node.arguments) != 1:
+            raise NotEvaluable(f"{node.command_name} is not supported")
+        value = self.expr(node.arguments[0])
+        if node.command_name == _ASCII_CHARACTER:
+            code = _integer(value)
+            if not 0 <= code < 256:
+                raise NotEvaluable(f"ASCII character {code}")
+            return bytes((code,)).decode("mac_roman")
+        if node.command_name == _ASCII_NUMBER:
+            value = _text(value)
+            if not value:
+                raise NotEvaluable("ASCII number of empty text")
+            try:
+                return value[0].encode("mac_roman")[0]
+            except UnicodeEncodeError:
+                raise NotEvaluable(f"ASCII number {value[0]!r}") from None
+        raise NotEvaluable(f"{node.command_name} is not supported")
+
+    def binary(self, node: BinaryOp):
+        op = node.op
+        if op is BinaryOpKind.GET_PROPERTY:
+            return self.get_property(node.left, node.right)
+        if op is BinaryOpKind.AND or op is BinaryOpKind.OR:
+            # Short-circuits
+            left = self._boolean(self.expr(node.left))
+            if left is (op is BinaryOpKind.OR):
+                return left
+            return self._boolean(self.expr(node.right))
+        if op is BinaryOpKind.COERCE:
+            if node.right.__class__ is not Keyword:
+                raise NotEvaluable("coercion to a computed class")
+            return self.coerce(self.expr(node.left), node.right.value)
+        if op not in _CHAINED:
+            raise NotEvaluable(f"{op} is not supported")
+
+        # a & b & c is ((a & b) & c), and obfuscated strings nest the other
+        # way too: walked with a stack on both sides, they are chains far
+        # deeper than the recursion limit. Operands are evaluated left to
+        # right, each link applied once both of its sides are
+        values = []
+        # Nodes to evaluate, and (link,) once both its sides are on `values`
+        todo = [node]
+        while todo:
+            item = todo.pop()
+            if item.__class__ is tuple:
+                (link,) = item
+                self.budget.charge_instruction()
+                right = values.pop()
+                values.append(self.apply(link.op, values.pop(), right))
+            elif item.__class__ is BinaryOp and item.op in _CHAINED:
+                todo.append((item,))
+                todo.append(item.right)
+                todo.append(item.left)
+            else:
+                values.append(self.expr(item))
+        return values[0]
+
+    def apply(self, op, left, right):
+        if op is BinaryOpKind.CONCAT:
+            return self.concat(left, right)
+        if op is BinaryOpKind.EQ or op is BinaryOpKind.NE:
+            equal = _fold(left) == _fold(right) and (
+                left.__class__ is right.__class__
+                or (left.__class__ in (int, float) and right.__class__ in (int, float))
+            )
+            return equal is (op is BinaryOpKind.EQ)
+        if op is BinaryOpKind.CONTAINS:
+            if left.__class__ is str:
+                return _fold(_text(right)) in _fold(left)
+            if left.__class__ is list:
+                items = right if right.__class__ is list else [right]
+                n = len(items)
+                return any(left[i : i + n] == items for i in range(len(left) - n + 1))
+            raise NotEvaluable(f"{left!r} contains")
+        if op in _COMPARISONS:
+            if left.__class__ is str:
+                left, right = _fold(left), _fold(_text(right))
+            else:
+                left, right = _number(left), _number(right)
+            return _COMPARISONS[op](left, right)
+
+        left, right = _number(left), _number(right)
+        try:
+            if op is BinaryOpKind.ADD:
+                return left + right
+            if op is BinaryOpKind.SUB:
+                return left - right
+            if op is BinaryOpKind.MUL:
+                return left * right
+            if op is BinaryOpKind.DIV:
+                return left / right
+            if op is BinaryOpKind.MOD:
+                # The sign of the dividend
+                if left.__class__ is int and right.__class__ is int:
+                    remainder = abs(left) % abs(right)
+                    return remainder if left >= 0 else -remainder
+                return math.fmod(left, right)
+            if op is BinaryOpKind.POW:
+                return float(left) ** right
+        except (ZeroDivisionError, OverflowError, ValueError) as e:
+            raise NotEvaluable(str(e)) from None
+        raise NotEvaluable(f"{op} is not supported")
+
+    def concat(self, left, right):
+        if left.__class__ is str:
+            value = left + _text(right)
+        elif left.__class__ is list:
+            value = left + (right if right.__class__ is list else [right])
+        else:
+            # 1 & 2 is {1, 2}
+            value = [left] + (right if right.__class__ is list else [right])
+        self.budget.charge_bytes(len(value))
+        return value
+
+    def coerce(self, value, to: str):
+        if to in _TEXT_TYPES:
+            return _text(value)
+        if to == "long":
+            return _integer(value)
+        if to in _NUMBER_TYPES:
+            return _number(value)
+        if to == "list":
+            return value if value.__class__ is list else [value]
+        if to == "bool":
+            return self._boolean(value)
+        raise NotEvaluable(f"coercion to {to!r}")
+
+    def get_property(self, left, right):
+        # `character id X` is decompiled as (characters (id of it)) of X
+        if (
+            left.__class__ is BinaryOp
+            and left.op is BinaryOpKind.GET_INDEXED
+            and left.left.__class__ is Keyword
+        ):
+            index = left.right
+            if (
+                index.__class__ is BinaryOp
+                and index.op is BinaryOpKind.GET_PROPERTY
+                and index.left.__class__ is Keyword
+                and index.left.value == "ID  "
+            ):
+                if left.left.value not in ("cha ", "ctxt"):
+                    raise NotEvaluable(f"{left.left.value!r} id")
+                return self._character_id(self.expr(right))
+            return self._item(left.left.value, self.expr(index), self.expr(right))
+        if left.__class__ is not Keyword:
+            raise NotEvaluable("property of a computed name")
+        kind = left.value
+        # items 2 thru 4 of x
+        if (
+            right.__class__ is BinaryOp
+            and right.op is BinaryOpKind.GET_PROPERTY
+            and right.left.__class__ is BinaryOp
+            and right.left.op is BinaryOpKind.THRU
+        ):
+            start = _integer(self.expr(right.left.left))
+            stop = _integer(self.expr(right.left.right))
+            return self._range(kind, start, stop, self.expr(right.right))
+        value = self.expr(right)
+        if kind == "leng":
+            if value.__class__ in (str, list):
+                return len(value)
+        elif kind == "pcnt":
+            return value
+        elif kind == "ID  ":
+            if value.__class__ is str:
+                codes = [ord(c) for c in value]
+                return codes[0] if len(codes) == 1 else codes
+        elif kind in ("cobj", "cha "):
+            if value.__class__ is str or (kind == "cobj" and value.__class__ is list):
+                return list(value)
+        elif kind == "ctxt":
+            if value.__class__ is str:
+                return value
+        elif kind == "rvse":
+            if value.__class__ is list:
+                return value[::-1]
+        elif kind == "rest":
+            if value.__class__ is list:
+                return value[1:]
+        elif kind == "cwor":
+            if value.__class__ is str:
+                return value.split()
+        elif kind == "cpar":
+            if value.__class__ is str:
+                return value.splitlines()
+        raise NotEvaluable(f"{kind!r} of {value.__class__.__name__}")
+
+    def _character_id(self, value) -> str:
+        codes = value if value.__class__ is list else [value]
+        try:
+            text = "".join(chr(_integer(c)) for c in codes)
+        except (ValueError, OverflowError):
+            raise NotEvaluable(f"character id {value!r}") from None
+        self.budget.charge_bytes(len(text))
+        return text
+
+    def _elements(self, kind, value):
+        if kind == "cobj":
+            return _items(value)
+        if value.__class__ is str:
+            if kind == "cha ":
+                return value
+            if kind == "cwor":
+                return value.split()
+            if kind == "cpar":
+                return value.splitlines()
+        raise NotEvaluable(f"{kind!r} of {value.__class__.__name__}")
+
+    def _index(self, elements, index) -> int:
+        # 1 is the first, -1 the last
+        i = index - 1 if index > 0 else len(elements) + index
+        if index == 0 or not 0 <= i < len(elements):
+            raise NotEvaluable(f"item {index} of {len(elements)}")
+        return i
+
+    def _item(self, kind, index, value):
+        elements = self._elements(kind, value)
+        return elements[self._index(elements, _integer(index))]
+
+    def _range(self, kind, start, stop, value):
+        if kind == "ctxt" and value.__class__ is str:
+            # text 2 thru 4 of s is text, characters 2 thru 4 a list
+            elements, kind = value, None
+        else:
+            elements = self._elements(kind, value)
+        i, j = sorted((self._index(elements, start), self._index(elements, stop)))
+        part = elements[i : j + 1]
+        return part if kind is None or part.__class__ is list else list(part)
+
+
+# Operators evaluated from their two values
+_CHAINED = frozenset(
+    (
+        BinaryOpKind.ADD,
+        BinaryOpKind.SUB,
+        BinaryOpKind.MUL,
+        BinaryOpKind.DIV,
+        BinaryOpKind.MOD,
+        BinaryOpKind.POW,
+        BinaryOpKind.CONCAT,
+        BinaryOpKind.EQ,
+        BinaryOpKind.NE,
+        BinaryOpKind.LT,
+        BinaryOpKind.LE,
+        BinaryOpKind.GT,
+        BinaryOpKind.GE,
+        BinaryOpKind.CONTAINS,
+    )
+)
+
+_COMPARISONS = {
+    BinaryOpKind.LT: lambda a, b: a < b,
+    BinaryOpKind.LE: lambda a, b: a <= b,
+    BinaryOpKind.GT: lambda a, b: a > b,
+    BinaryOpKind.GE: lambda a, b: a >= b,
+}
+
+
+def evaluate(handlers: Iterable[Handler], name: str, arguments: List):
+    """`Emulator(handlers).call(name, arguments)`, for a one-off call"""
+    return Emulator(handlers).call(name, arguments)
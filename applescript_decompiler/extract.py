@@ -0,0 +1,220 @@
+import io
+import sys
+import json
+import argparse
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import jinmo_applescript_disassembler.engine.runtimeobjects as rto
+import jinmo_applescript_disassembler.engine.fasobjects.data_block as db
+from jinmo_applescript_disassembler.engine.fasparser import Loader
+from jinmo_applescript_disassembler.engine.budget import (
+    CLI_LIMITS,
+    Budget,
+    BudgetExceeded,
+    cli_budget,
+)
+
+from applescript_decompiler.ast import alias_application, number_to_code
+from applescript_decompiler.opcodes import opcode_bytes, scan
+from applescript_decompiler.passes import decrypt_strings, find_shift, is_encrypted
+from applescript_decompiler.terminology import CODE_INDEX, DEFAULT_TARGET
+
+# Strings, applications and commands of a script, straight from the loaded
+# literal tables and bytecode: no stack is simulated and no tree is built,
+# so this is many times faster than decompiling, and keeps working on
+# handlers that do not decompile. What it cannot tell is which string goes
+# to which command.
+
+# Same layout as the decompiler's, see decompiler.py
+ROOT_OFFSET = -1
+LITERAL_OFFSET = 5
+CODE_OFFSET = 6
+
+_MESSAGE_SEND = opcode_bytes("MessageSend")
+
+
+@dataclass
+class Extracted:
+    # In the order first seen, without duplicates
+    strings: List[str] = field(default_factory=list)
+    # Key the encrypted strings were shifted by, see `passes.find_shift`
+    shift: Optional[int] = None
+    decrypted: List[str] = field(default_factory=list)
+    applications: List[str] = field(default_factory=list)
+    # Event code (e.g. "sysoexec") -> times sent
+    commands: Dict[str, int] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+    exceeded: Optional[BaseException] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "strings": self.strings,
+            "shift": self.shift,
+            "decrypted": self.decrypted,
+            "applications": self.applications,
+            "commands": [
+                {
+                    "code": code,
+                    "name": CODE_INDEX.command(DEFAULT_TARGET, code)[0],
+                    "count": count,
+                }
+                for code, count in self.commands.items()
+            ],
+            "errors": self.errors,
+            "exceeded": None if self.exceeded is None else str(self.exceeded),
+        }
+
+
+def extract(source, *, budget=None, decrypt=True) -> Extracted:
+    """
+    String literals, application targets and command codes of `source`
+    (like `decompile` takes), without decompiling. With `decrypt`, strings
+    that look OSAMiner-encrypted are also decrypted.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    result = Extracted()
+    try:
+        f = Loader(budget=budget or Budget()).load(source)
+    except BudgetExceeded as e:
+        result.exceeded = e
+        return result
+
+    strings = {}
+    applications = {}
+    commands = Counter()
+    roots = [f[ROOT_OFFSET]]
+    while roots:
+        root = roots.pop()
+        if type(root) is not list:
+            continue
+        for offset in range(2, len(root)):
+            function = root[offset]
+            try:
+                if type(function) is list and function and function[0] == 15:
+                    # A script block, see `decompile_loaded`
+                    roots.append(function[ROOT_OFFSET])
+                elif type(function) is list and len(function) >= 7:
+                    literals = function[LITERAL_OFFSET + 1]
+                    _literals(literals, strings, applications)
+                    _commands(function[CODE_OFFSET + 1].value, literals, commands)
+                else:
+                    # Property values
+                    _literals([function], strings, applications)
+            except Exception as e:
+                result.errors.append(f"data offset {offset}: {e}")
+
+    result.strings = list(strings)
+    result.applications = list(applications)
+    result.commands = dict(commands)
+    if decrypt:
+        encrypted = [s for s in result.strings if is_encrypted(s)]
+        result.shift = find_shift(encrypted) if encrypted else None
+        if result.shift is not None:
+            result.decrypted = list(decrypt_strings(encrypted, result.shift).values())
+    return result
+
+
+def _literals(values, strings: dict, applications: dict):
+    # Dicts as ordered sets. Loaded objects can be shared, or refer back to
+    # themselves in hostile files: each container is entered once
+    seen = set()
+    todo = list(reversed(values))
+    while todo:
+        value = todo.pop()
+        cls = value.__class__
+        if cls is rto.Object:
+            value = value.value
+            cls = value.__class__
+        if cls is list or cls is rto.Pair:
+            if id(value) in seen:
+                continue
+            seen.add(id(value))
+            if cls is rto.Pair:
+                todo.extend((value.second, value.first))
+            else:
+                todo.extend(reversed(value))
+        elif cls is rto.String:
+            strings[value.value.decode("utf-16-be", errors="replace")] = None
+        elif cls is db.Descriptor:
+            try:
+                applications[alias_application(value)] = None
+            except (IndexError, UnicodeDecodeError):
+                # Not an alias
+                pass
+
+
+def event_code(literal) -> Optional[str]:
+    """The event code (e.g. "sysoexec") a MessageSend's literal names, or None"""
+    if literal.__class__ is not rto.Object:
+        return None
+    value = literal.value
+    if value.__class__ is not rto.EventIdentifier:
+        return None
+    try:
+        return number_to_code(value.identifier[0]) + number_to_code(value.identifier[1])
+    except ValueError:
+        return None
+
+
+def _commands(code, literals, commands: Counter):
+    # Only MessageSend's operand is needed; everything else is skipped over
+    for insn in scan(code, _MESSAGE_SEND):
+        index = insn.operands[0]
+        if 0 <= index < len(literals):
+            name = event_code(literals[index])
+            if name is not None:
+                commands[name] += 1
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="applescript_decompile extract",
+        description="Prints the strings, applications and commands of .scpt files as JSON, one line per file, without decompiling them",
+    )
+    parser.add_argument("scpt", nargs="+", help="Paths to compiled .scpt files")
+    parser.add_argument(
+        "--no-decrypt",
+        dest="decrypt",
+        action="store_false",
+        help="Do not look for OSAMiner-encrypted strings",
+    )
+    parser.add_argument(
+        "--max-bytes",
+        type=int,
+        metavar="N",
+        default=None,
+        help=f"Bytes the loader may read, per file ({CLI_LIMITS['bytes']})",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        metavar="SECONDS",
+        default=None,
+        help=f"Time each file may take, in seconds ({CLI_LIMITS['seconds']})",
+    )
+    parser.add_argument(
+        "--no-limits",
+        action="store_true",
+        help="No defaults: only the limits given above apply",
+    )
+    args = parser.parse_args(argv)
+
+    failed = False
+    for path in args.scpt:
+        budget = cli_budget(args.no_limits, bytes=args.max_bytes, seconds=args.timeout)
+        try:
+            with open(path, "rb") as source:
+                found = extract(source, budget=budget, decrypt=args.decrypt)
+        except Exception as e:
+            failed = True
+            print(json.dumps({"path": path, "error": str(e)}))
+            continue
+        print(json.dumps({"path": path, **found.to_dict()}, ensure_ascii=False))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    cli()
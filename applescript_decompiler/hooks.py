@@ -0,0 +1,69 @@
+from applescript_decompiler.trace import INSTRUCTION, TraceEvent
+
+
+class StopDecompile(Exception):
+    """
+    Raised by an instruction hook that asks to stop. `decompile` and
+    `decompile_loaded` catch it into `result.stopped`, keeping the reports
+    finished so far; `run_decompiler` prints those and raises it again.
+    """
+
+    def __init__(self, result, event: TraceEvent):
+        super().__init__(result)
+        self.result = result
+        self.event = event
+
+
+class InstructionHooks:
+    """
+    Callbacks invoked after each instruction is decoded, before any AST is
+    printed.
+
+    Each callback gets the instruction (an `instruction` trace event) and
+    the symbolic stack after it. The event has `pos`, `op`, `handler`,
+    `raw_operands` (the instruction's decoded operand words, e.g. a literal
+    index), `literals` (the handler's literal table) and `operands` (what
+    `-d` prints for them, with `Bounded` values). Returning anything truthy
+    stops the decompile with `StopDecompile`.
+
+        hooks = InstructionHooks()
+
+        @hooks.register
+        def curl(insn, stack):
+            if insn.op != "MessageSend":
+                return False
+            literal = insn.literals[insn.raw_operands[0]]
+            if event_code(literal) != "sysoexec":  # do shell script
+                return False
+            return any(
+                isinstance(a, StringLiteral) and "curl" in a.value
+                for a in stack[-1].arguments
+            )
+
+        result = decompile(path, hooks=hooks, render=False)
+        if result.stopped is not None:
+            print(result.stopped.event.handler)
+
+    (`event_code` is in `applescript_decompiler.extract`.) The symbolic
+    stack that callbacks look at is made of AST nodes, so the tree is built
+    up to the stop either way: `render=False` only skips rendering it into
+    text. For literals and commands alone, without decompiling, see
+    `extract`.
+    """
+
+    def __init__(self, *callbacks):
+        self.callbacks = list(callbacks)
+
+    def register(self, callback):
+        self.callbacks.append(callback)
+        return callback
+
+    def attach(self, tracer):
+        if self not in tracer.wants(INSTRUCTION):
+            tracer.attach(self, INSTRUCTION)
+
+    def __call__(self, event: TraceEvent):
+        for callback in self.callbacks:
+            result = callback(event, event.stack)
+            if result:
+                raise StopDecompile(result, event)
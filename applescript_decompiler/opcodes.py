@@ -0,0 +1,217 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+from jinmo_applescript_disassembler.engine.util import opcodes, comments
+
+# Single declarative description of every opcode, as the decompiler models it.
+#
+# `operands` are the 16-bit big-endian words following the opcode byte:
+#   "literal"  -> index into the handler's literal table
+#   "variable" -> local variable index
+#   "address"  -> relative jump, resolved to `pos + 1 + word`
+#   "word"     -> anything else
+# The short Push*/Pop* forms carry their index in the low nibble instead.
+#
+# `pops`/`pushes` are the effect on the decompiler's symbolic stack, which is
+# not always what the AppleScript VM does (e.g. PopVariable only records the
+# assignment target). `counted` ops first pop a number N and then N items,
+# `maybe_pops` are only popped when the stack is not empty.
+
+
+@dataclass(frozen=True)
+class OpSpec:
+    name: str
+    operands: Tuple[str, ...] = ()
+    pops: int = 0
+    pushes: int = 0
+    counted: bool = False
+    maybe_pops: int = 0
+    inline: bool = False
+    sub_operation: Optional[str] = None
+    implemented: bool = True
+
+    @property
+    def branch(self) -> bool:
+        return "address" in self.operands
+
+    @property
+    def size(self) -> int:
+        return 1 + 2 * len(self.operands)
+
+
+_BINARY = (
+    "Equal NotEqual GreaterThan GreaterThanOrEqual LessThan LessThanOrEqual Contains "
+    "Add Subtract Multiply Divide Remainder Power Concatenate Coerce"
+)
+_PUSH = "Push0 Push1 Push2 Push3 PushMinus1 PushTrue PushFalse PushMe PushIt"
+
+SPECS = {
+    **{name: OpSpec(name, pops=2, pushes=1) for name in _BINARY.split()},
+    **{name: OpSpec(name, pops=1, pushes=1) for name in ("Not", "Negate")},
+    **{name: OpSpec(name, pushes=1) for name in _PUSH.split()},
+    "PushUndefined": OpSpec("PushUndefined"),
+    "PushLiteral": OpSpec("PushLiteral", pushes=1, inline=True),
+    "PushLiteralExtended": OpSpec("PushLiteralExtended", ("literal",), pushes=1),
+    "PushVariable": OpSpec("PushVariable", pushes=1, inline=True),
+    "PushVariableExtended": OpSpec("PushVariableExtended", ("variable",), pushes=1),
+    "PushGlobal": OpSpec("PushGlobal", pushes=1, inline=True),
+    "PushGlobalExtended": OpSpec("PushGlobalExtended", ("literal",), pushes=1),
+    "PushParentVariable": OpSpec("PushParentVariable", ("variable", "word"), pushes=1),
+    "PopVariable": OpSpec("PopVariable", inline=True),
+    "PopVariableExtended": OpSpec("PopVariableExtended", ("variable",)),
+    "PopGlobal": OpSpec("PopGlobal", inline=True),
+    "PopGlobalExtended": OpSpec("PopGlobalExtended", ("literal",)),
+    "PopParentVariable": OpSpec("PopParentVariable", ("variable", "word")),
+    # Dup is skipped inside counted repeat loops, see `verify`
+    "Dup": OpSpec("Dup", pushes=1),
+    "SetData": OpSpec("SetData", pops=1),
+    "GetData": OpSpec("GetData"),
+    "Exit": OpSpec("Exit"),
+    "Tell": OpSpec("Tell", ("word",), pops=1),
+    "EndTell": OpSpec("EndTell"),
+    "And": OpSpec("And", ("address",), pops=1),
+    "Or": OpSpec("Or", ("address",), pops=1),
+    "TestIf": OpSpec("TestIf", ("address",), pops=1),
+    "Jump": OpSpec("Jump", ("address",)),
+    "MessageSend": OpSpec("MessageSend", ("literal",), pops=1, pushes=1, counted=True),
+    "PositionalMessageSend": OpSpec(
+        "PositionalMessageSend", ("literal",), pushes=1, counted=True, maybe_pops=1
+    ),
+    "StoreResult": OpSpec("StoreResult", maybe_pops=1),
+    "Return": OpSpec("Return", maybe_pops=1),
+    "LinkRepeat": OpSpec("LinkRepeat", ("address",)),
+    "RepeatNTimes": OpSpec("RepeatNTimes", pops=2),
+    "RepeatWhile": OpSpec("RepeatWhile", pops=1),
+    "RepeatUntil": OpSpec("RepeatUntil", pops=1),
+    "RepeatInCollection": OpSpec("RepeatInCollection", ("variable",), pops=3),
+    "RepeatInRange": OpSpec("RepeatInRange", ("variable",), pops=3),
+    "MakeVector": OpSpec("MakeVector", pushes=1, counted=True),
+    "MakeRecord": OpSpec("MakeRecord", pushes=1, counted=True),
+    "ErrorHandler": OpSpec("ErrorHandler", ("address",)),
+    "EndErrorHandler": OpSpec("EndErrorHandler", ("address",)),
+    "HandleError": OpSpec("HandleError", ("variable", "variable")),
+    # Error's count may sit below the error message, see `verify`
+    "Error": OpSpec("Error", pops=1, counted=True),
+    "DefineActor": OpSpec("DefineActor", ("word",), implemented=False),
+}
+
+# MakeObjectAlias/MakeComp encode a sub-operation in the opcode byte
+SUB_OPERATIONS = {
+    "GetProperty": dict(pops=2, pushes=1),
+    "GetEvery": dict(pops=2, pushes=1),
+    "GetIndexed (item A of B)": dict(pops=3, pushes=1),
+    # Pops two more when the key is 'kfrmID  ', see `verify`
+    "GetKeyFrom": dict(pops=2, pushes=1),
+    "GetRange": dict(pops=6, pushes=1),
+    "GetPositionEnd": dict(pops=1, pushes=1),
+}
+
+
+def _spec_for_byte(c: int) -> OpSpec:
+    name = opcodes[c]
+    if name in ("MakeObjectAlias", "MakeComp"):
+        sub_operation = comments.get(c - 23, "<Unknown>")
+        if sub_operation in SUB_OPERATIONS:
+            return OpSpec(
+                name, sub_operation=sub_operation, **SUB_OPERATIONS[sub_operation]
+            )
+        # The decompiler warns and drops the operand of anything else
+        return OpSpec(name, pops=1, sub_operation=sub_operation, implemented=False)
+    return SPECS.get(name, OpSpec(name, implemented=False))
+
+
+# opcode byte -> OpSpec
+OPCODE_TABLE = tuple(_spec_for_byte(c) for c in range(256))
+
+# opcode byte -> instruction size
+SIZES = bytes(spec.size for spec in OPCODE_TABLE)
+
+
+def opcode_bytes(*names: str) -> frozenset:
+    """The opcode bytes of the ops called `names`"""
+    return frozenset(c for c, spec in enumerate(OPCODE_TABLE) if spec.name in names)
+
+
+class Instruction:
+    __slots__ = ("pos", "byte", "spec", "operands")
+
+    def __init__(self, pos: int, byte: int, spec: OpSpec, operands: Tuple[int, ...]):
+        self.pos = pos
+        self.byte = byte
+        self.spec = spec
+        self.operands = operands
+
+    @property
+    def op(self) -> str:
+        return self.spec.name
+
+    @property
+    def next_pos(self) -> int:
+        return self.pos + self.spec.size
+
+    @property
+    def target(self) -> Optional[int]:
+        # All branches are relative to the byte after the opcode
+        if not self.spec.branch:
+            return None
+        return self.pos + 1 + self.operands[self.spec.operands.index("address")]
+
+    def __repr__(self):
+        return "<Instruction %05x %s %r>" % (self.pos, self.op, self.operands)
+
+
+class TruncatedInstruction(Exception):
+    def __init__(self, pos: int, op: str):
+        super().__init__(f"{op} at {pos:05x} runs past the end of the code")
+        self.pos = pos
+        self.op = op
+
+
+def _word(code, pos: int) -> int:
+    r = (code[pos] << 8) | code[pos + 1]
+    return r - 0x10000 if r & 0x8000 else r
+
+
+def decode(code) -> Iterator[Instruction]:
+    """Linear decode of a handler's bytecode"""
+    pos = 0
+    end = len(code)
+    while pos < end:
+        c = code[pos]
+        spec = OPCODE_TABLE[c]
+        size = 1 + 2 * len(spec.operands)
+        if pos + size > end:
+            raise TruncatedInstruction(pos, spec.name)
+        if spec.inline:
+            operands = (c & 0xF,)
+        else:
+            operands = tuple(
+                _word(code, pos + 1 + 2 * i) for i in range(len(spec.operands))
+            )
+        yield Instruction(pos, c, spec, operands)
+        pos += size
+
+
+def scan(code, only: frozenset) -> Iterator[Instruction]:
+    """
+    Like `decode`, for the instructions whose opcode byte is in `only`;
+    the others are stepped over without being decoded
+    """
+    pos = 0
+    end = len(code)
+    while pos < end:
+        c = code[pos]
+        size = SIZES[c]
+        if pos + size > end:
+            raise TruncatedInstruction(pos, OPCODE_TABLE[c].name)
+        if c in only:
+            spec = OPCODE_TABLE[c]
+            if spec.inline:
+                operands = (c & 0xF,)
+            else:
+                operands = tuple(
+                    _word(code, pos + 1 + 2 * i) for i in range(len(spec.operands))
+                )
+            yield Instruction(pos, c, spec, operands)
+        pos += size
@@ -0,0 +1,805 @@
+from collections import Counter
+from dataclasses import fields, replace
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from jinmo_applescript_disassembler.engine.budget import BudgetExceeded
+
+from applescript_decompiler.ast import *
+from applescript_decompiler.emulator import Emulator, NotEvaluable, to_literal, to_value
+
+# AST to AST transformations, run once before printing.
+#
+# Walks use an explicit stack: obfuscated samples produce expression chains
+# far deeper than the recursion limit. Transforms never mutate their input;
+# nodes whose children did not change are reused as they are. Expressions
+# may be shared by several parents (see `Interner`), so passes must not key
+# anything on where a node sits by its identity alone.
+
+
+# node class -> field names
+_FIELDS = {}
+
+
+def _field_names(cls):
+    names = _FIELDS.get(cls)
+    if names is None:
+        names = _FIELDS[cls] = tuple(f.name for f in fields(cls))
+    return names
+
+
+# Hold names, numbers and text, never another node: walks skip them
+_LEAVES = frozenset(
+    (
+        Keyword,
+        Comment,
+        StringLiteral,
+        NumberLiteral,
+        BooleanLiteral,
+        DateLiteral,
+        MissingValueLiteral,
+        VariableRef,
+        ExitRepeat,
+    )
+)
+
+# node class -> names of the fields that may hold nodes
+_NODE_FIELDS = {}
+
+
+def _node_fields(cls):
+    names = _NODE_FIELDS.get(cls)
+    if names is None:
+        names = _NODE_FIELDS[cls] = () if cls in _LEAVES else _field_names(cls)
+    return names
+
+
+def _child_nodes(node) -> List[Node]:
+    children = []
+    for name in _node_fields(node.__class__):
+        value = getattr(node, name)
+        if isinstance(value, Node):
+            children.append(value)
+        elif isinstance(value, list):
+            children.extend(item for item in value if isinstance(item, Node))
+    return children
+
+
+def walk(root: Node) -> Iterator[Node]:
+    """Every node under `root` (included), parents before children"""
+    todo = [root]
+    while todo:
+        node = todo.pop()
+        yield node
+        children = _child_nodes(node)
+        children.reverse()
+        todo.extend(children)
+
+
+def _rebuild(node, done):
+    changes = {}
+    for name in _node_fields(node.__class__):
+        value = getattr(node, name)
+        if isinstance(value, Node):
+            new = done.get(id(value), value)
+            if new is not value:
+                changes[name] = new
+        elif isinstance(value, list):
+            if any(done.get(id(v), v) is not v for v in value):
+                changes[name] = [done.get(id(v), v) for v in value]
+    return replace(node, **changes) if changes else node
+
+
+def transform(root: Node, fn: Callable[[Node, Node], Node]) -> Node:
+    """
+    Rebuilds `root` bottom up. `fn(node, original)` is called on every node
+    once its children are done and returns the node to use in its place;
+    `original` is the node as it was in `root`.
+    """
+    done = {}
+    # (node, children already queued?)
+    todo = [(root, False)]
+    while todo:
+        node, expanded = todo.pop()
+        if id(node) in done:
+            continue
+        if not expanded:
+            todo.append((node, True))
+            children = _child_nodes(node)
+            children.reverse()
+            todo.extend((child, False) for child in children)
+            continue
+        done[id(node)] = fn(_rebuild(node, done), node)
+    return done[id(root)]
+
+
+# Never changed once built. Statements are filled in while decompiling, and
+# so are AndOp/OrOp until their right side is reached. Nothing holding a
+# list either (ListLiteral, RecordLiteral, calls): one shared instance would
+# let anything appending to it change every place it is used
+_INTERNED = frozenset(
+    (
+        Keyword,
+        StringLiteral,
+        NumberLiteral,
+        BooleanLiteral,
+        DateLiteral,
+        MissingValueLiteral,
+        VariableRef,
+        LValue,
+        RecordField,
+        BinaryOp,
+        UnaryOp,
+    )
+)
+
+
+def _value_key(value):
+    cls = value.__class__
+    if cls is float:
+        # 0.0 and -0.0 are equal but print differently
+        return (cls, repr(value))
+    if cls is int or cls is bool:
+        # and so are 1, 1.0 and True
+        return (cls, value)
+    return value
+
+
+class Interner:
+    """
+    Hash-conses expressions: structurally identical ones become one shared
+    instance. With `decompile(intern=True)` each expression is interned as
+    it is pushed, after its operands were, so nothing walks the tree
+    afterwards. Use one per file; `clear` lets go of the expressions seen
+    so far.
+    """
+
+    def __init__(self):
+        # key -> the instance everything equal to it is replaced with
+        self.nodes = {}
+        # ids of those instances, which `nodes` keeps alive
+        self.ids = set()
+
+    def clear(self):
+        self.nodes.clear()
+        self.ids.clear()
+
+    def intern(self, node):
+        """The shared instance equal to `node`"""
+        ids = self.ids
+        if node.__class__ not in _INTERNED or id(node) in ids:
+            return node
+        key = self._key(node)
+        if key is not None:
+            return self._canonical(key, node)
+        # Something was built in place around the operands, e.g. an LValue:
+        # intern that first, bottom up
+        done = {}
+        todo = [node]
+        while todo:
+            n = todo[-1]
+            pending = [
+                c
+                for c in _child_nodes(n)
+                if c.__class__ in _INTERNED and id(c) not in ids and id(c) not in done
+            ]
+            if pending:
+                todo.extend(pending)
+                continue
+            todo.pop()
+            if id(n) not in done:
+                new = _rebuild(n, done)
+                done[id(n)] = self._canonical(self._key(new), new)
+        return done[id(node)]
+
+    def _key(self, node):
+        # None when a child that should be interned is not yet
+        ids = self.ids
+        key = [node.__class__]
+        for name in _FIELDS.get(node.__class__) or _field_names(node.__class__):
+            value = getattr(node, name)
+            cls = value.__class__
+            if cls in _INTERNED:
+                if id(value) not in ids:
+                    return None
+                key.append(id(value))
+            elif isinstance(value, Node):
+                key.append(id(value))
+            else:
+                key.append(_value_key(value))
+        return tuple(key)
+
+    def _canonical(self, key, node):
+        try:
+            canonical = self.nodes.get(key)
+        except TypeError:
+            # Something unhashable in a field, keep it to itself
+            return node
+        if canonical is None:
+            # Keys hold children by id, which `node` keeps alive
+            canonical = self.nodes[key] = node
+            self.ids.add(id(node))
+        return canonical
+
+
+class Pass:
+    """
+    An AST to AST rewrite. `rewrite` is called bottom up on every node and
+    returns the node to use in its place; it must not mutate its argument.
+
+    Passes run in the order given, except that a pass runs after any pass
+    named in its `after`. Neighbouring passes share a single traversal, each
+    rewriting the previous one's output for the node. That is only the same
+    as running them one after the other when the earlier pass is `local`:
+    its rewrite looks at the node's own fields and not into its children,
+    which the later passes have already rewritten. Passes following one that
+    is not local, or that are `standalone` because `start` needs the whole
+    tree rewritten by the earlier ones, get a traversal of their own.
+
+    A standalone pass may instead set `run(root)` to do its own traversal
+    and return the rewritten tree, when the generic one is too slow for it.
+    """
+
+    name: str = None
+    after: Tuple[str, ...] = ()
+    local: bool = False
+    standalone: bool = False
+    run: Callable[[Node], Node] = None
+
+    def start(self, root: Node):
+        """Called with the tree about to be traversed"""
+
+    def rewrite(self, node: Node, original: Node) -> Node:
+        return node
+
+
+class Pipeline:
+    def __init__(self, passes=()):
+        # Pass classes are instantiated, like analyzers
+        passes = [p() if isinstance(p, type) else p for p in passes]
+        self.passes = _order(passes)
+
+    def __bool__(self):
+        return bool(self.passes)
+
+    def groups(self) -> List[List[Pass]]:
+        """The passes of each traversal"""
+        groups = []
+        for p in self.passes:
+            if not groups or p.standalone or not groups[-1][-1].local:
+                groups.append([])
+            groups[-1].append(p)
+        return groups
+
+    def run(self, root: Node) -> Node:
+        for group in self.groups():
+            if group[0].run is not None:
+                root = group[0].run(root)
+                continue
+            for p in group:
+                p.start(root)
+
+            def rewrite(node, original, group=group):
+                for p in group:
+                    node = p.rewrite(node, original)
+                return node
+
+            root = transform(root, rewrite)
+        return root
+
+
+def _order(passes: List[Pass]) -> List[Pass]:
+    # Stable topological sort on `after`
+    names = {p.name for p in passes}
+    ordered = []
+    placed = set()
+    remaining = list(passes)
+    while remaining:
+        for i, p in enumerate(remaining):
+            if all(dep in placed or dep not in names for dep in p.after):
+                break
+        else:
+            cycle = ", ".join(str(p.name) for p in remaining)
+            raise ValueError(f"Passes cannot be ordered: {cycle}")
+        ordered.append(remaining.pop(i))
+        placed.add(p.name)
+    return ordered
+
+
+# ---- String folding ------------------------------------------------------
+
+ASCII_CHARACTER = "sysontoc"
+
+
+def _is_concat(node) -> bool:
+    return node.__class__ is BinaryOp and node.op is BinaryOpKind.CONCAT
+
+
+def _ascii_character(node: CommandCall):
+    # (ASCII character 104) -> "h". Above 127 it is MacRoman, leave those be
+    if node.command_name != ASCII_CHARACTER or len(node.arguments) != 1:
+        return None
+    (arg,) = node.arguments
+    if isinstance(arg, NumberLiteral) and isinstance(arg.value, int):
+        if 0 <= arg.value < 128:
+            return StringLiteral(value=chr(arg.value))
+    return None
+
+
+class FoldStrings(Pass):
+    """
+    Folds `ASCII character N` calls, lists of single characters and leading
+    runs of concatenated string literals into StringLiterals.
+    """
+
+    name = "fold-strings"
+    # Decrypted strings can be folded, encrypted ones are left alone, and so
+    # can the values of variables and calls once they are filled in
+    after = ("osaminer-decrypt", "propagate-constants", "evaluate-calls")
+    standalone = True
+
+    def run(self, root):
+        # Its own traversal: leaves are never entered, nodes are only copied
+        # when a child changed, and a `&` tree is folded at its head in one
+        # walk over its operands, whichever way it leans
+        done = {}
+        # id(`&` node) -> what it folds to: a (start, end) span of `pieces`
+        # when it is all strings, else a node
+        self.folded = {}
+        # The strings met in `&` trees, in order: spans next to each other
+        # join without copying. `literals` holds where each piece came from
+        self.pieces, self.literals = [], []
+        # Nodes to visit, and (node, children) once those are done. Leaves
+        # are not queued, nodes with nothing else under them are done on the
+        # spot
+        todo = [root]
+        while todo:
+            node = todo.pop()
+            cls = node.__class__
+            if cls is tuple:
+                node, children = node
+                if node.__class__ is BinaryOp and node.op is BinaryOpKind.CONCAT:
+                    done[id(node)] = self._node(self._fold(node, done))
+                elif any(done[id(c)] is not c for c in children):
+                    done[id(node)] = self._rewrite(_rebuild(node, done))
+                else:
+                    done[id(node)] = self._rewrite(node)
+                continue
+            if id(node) in done:
+                continue
+            if cls is BinaryOp and node.op is BinaryOpKind.CONCAT:
+                if id(node) in self.folded:
+                    # A link of a `&` tree folded already
+                    done[id(node)] = self._node(self.folded[id(node)])
+                    continue
+                children = self._operands(node)
+            else:
+                children = []
+                for name in _NODE_FIELDS.get(cls) or _node_fields(cls):
+                    value = getattr(node, name)
+                    if value.__class__ is list:
+                        children.extend(
+                            v
+                            for v in value
+                            if isinstance(v, Node) and _node_fields(v.__class__)
+                        )
+                    elif isinstance(value, Node) and _node_fields(value.__class__):
+                        children.append(value)
+            if children:
+                todo.append((node, children))
+                todo.extend(children)
+            elif cls is BinaryOp and node.op is BinaryOpKind.CONCAT:
+                done[id(node)] = self._node(self._fold(node, done))
+            else:
+                done[id(node)] = self._rewrite(node)
+        root = done.get(id(root), root)
+        del self.folded, self.pieces, self.literals
+        return root
+
+    def _rewrite(self, node):
+        cls = node.__class__
+        if cls is CommandCall:
+            return _ascii_character(node) or node
+        if cls is ListLiteral:
+            elements = node.elements
+            if len(elements) > 1 and all(
+                e.__class__ is StringLiteral and len(e.value) == 1 for e in elements
+            ):
+                joined = StringLiteral(value="".join(e.value for e in elements))
+                return replace(node, elements=[joined])
+        return node
+
+    def _operands(self, head):
+        # What the `&` tree under `head` joins, to be rewritten before it
+        operands, seen = [], set()
+        todo = [head]
+        while todo:
+            n = todo.pop()
+            if _is_concat(n):
+                if id(n) not in self.folded and id(n) not in seen:
+                    seen.add(id(n))
+                    todo.append(n.left)
+                    todo.append(n.right)
+            elif n is not None and _node_fields(n.__class__):
+                operands.append(n)
+        return operands
+
+    def _fold(self, head, done):
+        # In order over the operands: strings go to `pieces` and each link
+        # joins the values of its two sides, which are on `values`
+        folded, pieces, literals = self.folded, self.pieces, self.literals
+        left, right = head.left, head.right
+        if not (_is_concat(left) or _is_concat(right)):
+            # A single link, as most are
+            left, right = done.get(id(left), left), done.get(id(right), right)
+            if left.__class__ is StringLiteral and right.__class__ is StringLiteral:
+                value = StringLiteral(value=left.value + right.value)
+            else:
+                value = self._join(head, left, right)
+            folded[id(head)] = value
+            return value
+        values = []
+        # Nodes to visit, and (link,) once both its sides are
+        todo = [head]
+        while todo:
+            item = todo.pop()
+            if item.__class__ is tuple:
+                (link,) = item
+                right = values.pop()
+                values.append(
+                    folded.setdefault(id(link), self._join(link, values.pop(), right))
+                )
+                continue
+            if _is_concat(item):
+                value = folded.get(id(item))
+                if value is None:
+                    todo.append((item,))
+                    todo.append(item.right)
+                    todo.append(item.left)
+                    continue
+                if value.__class__ is tuple:
+                    # Shared and folded already: its strings again, at once
+                    item = StringLiteral(value="".join(pieces[value[0] : value[1]]))
+                else:
+                    item = value
+            operand = done.get(id(item), item)
+            if operand.__class__ is StringLiteral:
+                pieces.append(operand.value)
+                literals.append(operand)
+                values.append((len(pieces) - 1, len(pieces)))
+            else:
+                values.append(operand)
+        (value,) = values
+        return value
+
+    def _join(self, link, left, right):
+        if left.__class__ is tuple and right.__class__ is tuple:
+            return (left[0], right[1])
+        left, right = self._node(left), self._node(right)
+        if left is link.left and right is link.right:
+            return link
+        return replace(link, left=left, right=right)
+
+    def _node(self, value):
+        if value.__class__ is not tuple:
+            return value
+        start, end = value
+        if end - start == 1:
+            return self.literals[start]
+        return StringLiteral(value="".join(self.pieces[start:end]))
+
+
+def fold_strings(root: Node) -> Node:
+    return Pipeline([FoldStrings]).run(root)
+
+
+# ---- OSAMiner --------------------------------------------------------------
+
+
+# What decrypted strings are made of
+_TEXT = frozenset(range(0x20, 0x7F)) | {0x09, 0x0A, 0x0D}
+
+# How much each character says "this is text", roughly English letter
+# frequencies in percent: telling shift k from k + 1 takes more than
+# checking that both give printable text
+_FREQUENCIES = (
+    "e 12.7 t 9.1 a 8.2 o 7.5 i 7 n 6.7 s 6.3 h 6.1 r 6 d 4.3 l 4 c 2.8 u 2.8 "
+    "m 2.4 w 2.4 f 2.2 g 2 y 2 p 1.9 b 1.5 v 1 k 0.8 j 0.2 x 0.2 q 0.1 z 0.1"
+).split()
+_LETTERS = dict(zip(_FREQUENCIES[::2], map(float, _FREQUENCIES[1::2])))
+_WEIGHTS = {c: 0.5 for c in _TEXT}
+_WEIGHTS.update((ord(c), w) for c, w in _LETTERS.items())
+_WEIGHTS.update((ord(c.upper()), w / 2) for c, w in _LETTERS.items())
+_WEIGHTS.update((c, 1.0) for c in b"0123456789")
+_WEIGHTS[ord(" ")] = 15.0
+
+# Separates the strings decrypted together, never part of one
+_SEPARATOR = "\x00"
+
+
+def _shift_score(counts: Dict[int, int], total: int, shift: int) -> Optional[float]:
+    """
+    Mean weight of the characters shifted back by `shift`, None when too
+    many of them are not text
+    """
+    text = score = 0
+    for code, count in counts.items():
+        weight = _WEIGHTS.get(code - shift)
+        if weight is not None:
+            text += count
+            score += weight * count
+    if text < 0.98 * total:
+        return None
+    return score / total
+
+
+def is_encrypted(value: str) -> bool:
+    """
+    Whether `value` looks shifted: mostly outside ASCII, not text with a
+    few accents in it
+    """
+    if value.isascii() or _SEPARATOR in value:
+        return False
+    return 2 * len(value.encode("ascii", "ignore")) < len(value)
+
+
+def find_shift(strings, hints=()) -> Optional[int]:
+    """
+    The key OSAMiner-style `strings` were shifted up by, or None if they
+    do not look shifted. `hints` are keys found in the decoder, tried first;
+    otherwise every shift that maps the commonest character to text is
+    scored.
+    """
+    counts = Counter(_SEPARATOR.join(strings))
+    counts.pop(_SEPARATOR, None)
+    if not counts:
+        return None
+    counts = {ord(c): n for c, n in counts.items()}
+    total = sum(counts.values())
+
+    def best(shifts):
+        scored = [
+            (score, shift)
+            for shift in shifts
+            if shift > 0
+            for score in [_shift_score(counts, total, shift)]
+            if score is not None
+        ]
+        return max(scored)[1] if scored else None
+
+    shift = best(set(hints))
+    if shift is not None:
+        return shift
+    if total < 32:
+        # Too little to tell shifted text from a few accented words
+        return None
+    commonest = max(counts, key=counts.get)
+    shift = best({commonest - c for c in _TEXT})
+    # Scoring alone has to find mostly letters and spaces
+    if shift is not None and _shift_score(counts, total, shift) < 3:
+        return None
+    return shift
+
+
+def decrypt_strings(strings, shift: int) -> Dict[str, str]:
+    """
+    {string: decrypted} for those of `strings` that `shift` turns into text,
+    all translated in one go
+    """
+    strings = list(strings)
+    joined = _SEPARATOR.join(strings)
+    # Characters that would not decrypt to text are dropped, which shows in
+    # the length of their string
+    table = {}
+    for c in set(joined):
+        code = ord(c) - shift
+        table[ord(c)] = code if code in _TEXT else None
+    table.pop(ord(_SEPARATOR), None)
+    decrypted = joined.translate(table).split(_SEPARATOR)
+    return {
+        value: plain
+        for value, plain in zip(strings, decrypted)
+        if len(value) == len(plain)
+    }
+
+
+def _is_int(node) -> bool:
+    return node.__class__ is NumberLiteral and node.value.__class__ is int
+
+
+def _decoder_hints(calls, handlers, encrypted) -> List[int]:
+    # Integer keys around the handlers encrypted strings are passed to:
+    # arguments next to the string, `- 100` inside the handler
+    calls = [
+        call
+        for call in calls
+        if any(
+            a.__class__ is StringLiteral and a.value in encrypted
+            for a in call.arguments
+        )
+    ]
+    hints = []
+    for call in calls:
+        hints.extend(a.value for a in call.arguments if _is_int(a))
+    decoders = {c.handler_name for c in calls}
+    for handler in handlers:
+        # Event handlers are named by Objects
+        if handler.name.__class__ is not str or handler.name not in decoders:
+            continue
+        for n in walk(handler):
+            if n.__class__ is not BinaryOp or n.op not in (
+                BinaryOpKind.SUB,
+                BinaryOpKind.ADD,
+            ):
+                continue
+            hints.extend(
+                operand.value for operand in (n.left, n.right) if _is_int(operand)
+            )
+    return hints
+
+
+class OSAMinerDecrypt(Pass):
+    """
+    OSAMiner stores strings shifted up by a key (100 in the samples seen so
+    far) and decrypts them with a handler of its own. Strings that are
+    mostly non-ASCII are gathered from the whole tree, the key is taken from
+    that handler or found by scoring the text each key gives, and all of
+    them are decrypted at once. Scripts that do not look encrypted are left
+    as they are. Pass `shift` to skip the detection.
+    """
+
+    name = "osaminer-decrypt"
+    local = True
+
+    def __init__(self, shift: Optional[int] = None):
+        self.shift = shift
+
+    def start(self, root):
+        encrypted = set()
+        calls, handlers = [], []
+        for n in walk(root):
+            cls = n.__class__
+            if cls is StringLiteral:
+                if is_encrypted(n.value):
+                    encrypted.add(n.value)
+            elif cls is HandlerCall:
+                calls.append(n)
+            elif cls is Handler:
+                handlers.append(n)
+        shift = self.shift
+        if shift is None and encrypted:
+            hints = _decoder_hints(calls, handlers, encrypted)
+            shift = find_shift(encrypted, hints)
+        self.decrypted = decrypt_strings(encrypted, shift) if shift else {}
+
+    def rewrite(self, node, original):
+        if node.__class__ is not StringLiteral:
+            return node
+        plain = self.decrypted.get(node.value)
+        return node if plain is None else StringLiteral(value=plain)
+
+
+# ---- Pure handlers -------------------------------------------------------
+
+
+class EvaluateCalls(Pass):
+    """
+    Replaces calls to the script's own handlers with constant arguments,
+    `my d("...")`, by what they return when the handler is pure: see
+    `emulator`. Each distinct call is evaluated once, within the budgets
+    given. With --stream only the handler being printed is known.
+
+    Each statement with calls replaced gets an `-- evaluated: d` comment
+    before it, naming their handlers, so that what was computed is never
+    taken for what the script says.
+    """
+
+    name = "evaluate-calls"
+    # Arguments held in variables are constants once those are filled in
+    after = ("propagate-constants",)
+    local = True
+
+    def __init__(self, instructions=100_000, memory=1_000_000):
+        self.instructions = instructions
+        self.memory = memory
+
+    def start(self, root):
+        if isinstance(root, Script):
+            handlers = root.handlers
+        elif isinstance(root, Handler):
+            handlers = [root]
+        else:
+            handlers = [n for n in walk(root) if n.__class__ is Handler]
+        self.emulator = Emulator(
+            handlers, instructions=self.instructions, memory=self.memory
+        )
+        # id(original node) -> names of the handlers evaluated under it, up
+        # to the statement they get a comment before. Keyed on the originals
+        # as the passes sharing this traversal may replace the nodes again
+        self.evaluated = {}
+
+    def rewrite(self, node, original):
+        # Names evaluated under this node, and comments for its statements
+        names = {}
+        changes = {}
+        for name in _field_names(original.__class__):
+            value = getattr(original, name)
+            if isinstance(value, Node):
+                names.update(self.evaluated.get(id(value), ()))
+            elif isinstance(value, list):
+                same = node.__class__ is original.__class__
+                items = getattr(node, name) if same else None
+                if items is None or len(items) != len(value):
+                    # Reshaped by an earlier pass: the names go up instead
+                    for item in value:
+                        names.update(self.evaluated.get(id(item), ()))
+                    continue
+                commented = []
+                for item, item_before in zip(items, value):
+                    evaluated = self.evaluated.get(id(item_before))
+                    if evaluated and isinstance(item_before, Statement):
+                        text = "evaluated: " + ", ".join(evaluated)
+                        commented.append(Comment(comment=text))
+                    elif evaluated:
+                        names.update(evaluated)
+                    commented.append(item)
+                if len(commented) != len(items):
+                    changes[name] = commented
+        if changes:
+            node = replace(node, **changes)
+
+        result = self._evaluate(node, original)
+        if result is not node:
+            names[node.handler_name] = None
+        if names:
+            self.evaluated[id(original)] = names
+        return result
+
+    def _evaluate(self, node, original):
+        if node.__class__ is not HandlerCall:
+            return node
+        if node.target is not None and not (
+            node.target.__class__ is VariableRef and node.target.name == "my"
+        ):
+            return node
+        # The arguments as the script has them: another pass may have
+        # rewritten them into what the handler returns, e.g. decrypted them
+        for call in (original, node):
+            try:
+                arguments = [to_value(a) for a in call.arguments]
+            except (NotEvaluable, RecursionError):
+                continue
+            try:
+                return to_literal(self.emulator.call(node.handler_name, arguments))
+            except (NotEvaluable, BudgetExceeded, RecursionError):
+                return node
+        return node
+
+
+# ---- Constant propagation ------------------------------------------------
+
+
+class PropagateConstants(Pass):
+    """
+    Replaces variables by their value where every path to them assigned the
+    same constant, e.g. after `set x to "ht"` and `set y to x & "tp"`, `y`
+    is "ht" & "tp". Works within each handler, see `dataflow`. Each statement
+    changed gets a `-- propagated: y` comment before it, naming the
+    variables replaced.
+    """
+
+    name = "propagate-constants"
+    after = ("osaminer-decrypt",)
+
+    def rewrite(self, node, original):
+        if node.__class__ is not Handler:
+            return node
+        # Imported here, dataflow builds on this module
+        from applescript_decompiler.dataflow import propagate
+
+        return propagate(node)
+
+
+# --pass names
+PASSES = {
+    p.name: p for p in (FoldStrings, OSAMinerDecrypt, PropagateConstants, EvaluateCalls)
+}
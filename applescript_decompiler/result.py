@@ -0,0 +1,124 @@
+from __future__ import annotations
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from applescript_decompiler.ast import Handler, Script
+
+
+@dataclass
+class HandlerReport:
+    """What happened to one entry of the script's root table"""
+
+    offset: int
+    # The "-- ..." header lines, e.g. the handler name and arguments
+    notes: List[str] = field(default_factory=list)
+    handler: Optional[Handler] = None
+    warnings: List[str] = field(default_factory=list)
+    error: Optional[BaseException] = None
+    # Script blocks decompiled on their own (`force`)
+    nested: Optional[DecompileResult] = None
+    # The header and notes were already printed by a DebugSink (`-d`) as
+    # the handler started, so `lines` leaves them out
+    traced: bool = False
+
+    def header(self) -> str:
+        return "-- === data offset %d ===" % self.offset
+
+    def lines(self) -> Iterator[str]:
+        if not self.traced:
+            yield self.header()
+            yield from self.notes
+        if self.nested is not None:
+            yield from self.nested.lines()
+        yield from self.warnings
+        if self.error is not None:
+            yield "-- Failed to decompile"
+
+
+@dataclass
+class DecompileResult:
+    """
+    What `decompile` made of a file. A streamed result (`stream=...`) keeps
+    only the reports, with their handlers already released: `script` is
+    empty and `text` None, and `lines`, `render` and `rewritten` raise
+    ValueError rather than return a partial script.
+    """
+
+    script: Script = field(default_factory=Script)
+    reports: List[HandlerReport] = field(default_factory=list)
+    # Warnings raised while loading, before any handler was looked at
+    load_warnings: List[str] = field(default_factory=list)
+    # Rendered source, None when rendering was skipped or decompiling aborted
+    text: Optional[str] = None
+    analyzer: Any = None
+    # Pipeline applied to `script` before rendering
+    passes: Any = None
+    exceeded: Optional[BaseException] = None
+    stopped: Optional[BaseException] = None
+    # Reports were handed to a `stream` callback as they were finished
+    streamed: bool = False
+    force: bool = False
+
+    @property
+    def handlers(self) -> List[Handler]:
+        return self.script.handlers
+
+    @property
+    def errors(self) -> List[HandlerReport]:
+        return [report for report in self.reports if report.error is not None]
+
+    @property
+    def aborted(self) -> bool:
+        """Stopped by a hook, or by a failed handler without `force`"""
+        return self.stopped is not None or bool(self.errors and not self.force)
+
+    @property
+    def warnings(self) -> List[str]:
+        warnings = list(self.load_warnings)
+        for report in self.reports:
+            warnings.extend(report.warnings)
+            if report.nested is not None:
+                warnings.extend(report.nested.warnings)
+        return warnings
+
+    def _not_streamed(self, what: str):
+        if self.streamed:
+            raise ValueError(
+                f"{what}: the handlers were passed to the stream callback, "
+                "and not kept"
+            )
+
+    def rewritten(self) -> Script:
+        """`script` after the passes"""
+        self._not_streamed("rewritten")
+        return self.passes.run(self.script) if self.passes else self.script
+
+    def render(self, analyzer=None) -> str:
+        self._not_streamed("render")
+        return self.rewritten().to_source(analyzer=analyzer or self.analyzer)
+
+    def variants(
+        self, analyzers: Dict[str, Any]
+    ) -> Iterator[Tuple[str, DecompileResult]]:
+        """
+        (label, result) for each label in `analyzers`, rendered with that
+        analyzer class (None for plain output). The passes run once and every
+        variant is printed from the same tree, so nothing is loaded or
+        decompiled again. Each is rendered when it is reached.
+        """
+        script = None
+        if not self.aborted and not self.streamed:
+            script = self.rewritten()
+        for label, analyzer in analyzers.items():
+            text = None if script is None else script.to_source(analyzer=analyzer)
+            yield label, replace(self, analyzer=analyzer, text=text)
+
+    def lines(self) -> Iterator[str]:
+        """The command line output, one line (or the whole script) at a time"""
+        self._not_streamed("lines")
+        yield from self.load_warnings
+        for report in self.reports:
+            yield from report.lines()
+        if self.text is not None:
+            yield "-----"
+            yield self.text
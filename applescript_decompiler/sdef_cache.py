@@ -0,0 +1,93 @@
+import io
+import os
+import json
+import hashlib
+import tempfile
+
+from applescript_decompiler.utils import parse_sdef_terms
+
+# Parsed .sdef files kept on disk between runs, one JSON file per .sdef,
+# named after a hash of its path. A file is parsed again only when it
+# changed: same mtime and size is taken as unchanged without reading it,
+# and otherwise its contents are hashed and compared.
+
+# Bump when `parse_sdef_terms` returns something different
+CACHE_VERSION = 1
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "applescript_decompiler", "sdef")
+
+
+class SdefCache:
+    def __init__(self, directory=None):
+        self.directory = directory or default_cache_dir()
+        # Files parsed, and files answered from the cache
+        self.parsed = 0
+        self.hits = 0
+
+    def load(self, path: str) -> dict:
+        """`parse_sdef_terms(path)`, parsed again only if the file changed"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry_path = self._entry_path(path)
+        cached = self._read(entry_path, path)
+        if (
+            cached is not None
+            and cached["mtime_ns"] == stat.st_mtime_ns
+            and cached["size"] == stat.st_size
+        ):
+            self.hits += 1
+            return cached["terms"]
+
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if cached is not None and cached["sha256"] == digest:
+            # Touched or copied over with the same contents
+            self.hits += 1
+            terms = cached["terms"]
+        else:
+            self.parsed += 1
+            terms = parse_sdef_terms(io.BytesIO(data))
+        self._write(
+            entry_path,
+            {
+                "version": CACHE_VERSION,
+                "path": path,
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "sha256": digest,
+                "terms": terms,
+            },
+        )
+        return terms
+
+    def _entry_path(self, path: str) -> str:
+        key = hashlib.sha256(path.encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(self.directory, key[:32] + ".json")
+
+    def _read(self, entry_path: str, path: str):
+        try:
+            with open(entry_path, encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get("version") != CACHE_VERSION or cached.get("path") != path:
+            return None
+        return cached
+
+    def _write(self, entry_path: str, cached: dict):
+        # Atomically, other processes may be reading it. A cache that cannot
+        # be written only costs parsing again next time
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(cached, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, entry_path)
+        except OSError:
+            pass
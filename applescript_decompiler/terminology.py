@@ -0,0 +1,286 @@
+import os
+import json
+import warnings
+from functools import lru_cache
+
+# Application terminology, four-char code -> name, read from files built
+# ahead of time by `applescript_decompiler.build_terminology`: one per
+# application or suite, loaded the first time the printer looks it up.
+# Building them means reading the event code table in utils.py and parsing
+# the bundled .sdef files, which took longer than decompiling a small sample.
+#
+# `add_sdef_dir` adds applications from more .sdef files, parsed through a
+# cache on disk (see `sdef_cache`) when they are first looked up.
+#
+# Only names that are bundled or added are ever kept: tell targets are
+# whatever a script says, and a long-running process sees no end of them.
+
+INDEX_DIR = os.path.join(os.path.dirname(__file__), "data", "terminology")
+
+# Bump when the layout changes, see `build_terminology.build_index`
+INDEX_VERSION = 3
+
+DEFAULT_TARGET = "AppleScript Language"
+STANDARD_ADDITIONS = "StandardAdditions"
+
+# "StandardAdditions" is the sdef's name for the "Standard Additions" suite
+_EVENT_CODE_ALIASES = {STANDARD_ADDITIONS: "Standard Additions"}
+
+
+@lru_cache(maxsize=None)
+def bundled_names() -> frozenset:
+    index = _fallback_index()
+    if index is not None:
+        return frozenset(index)
+    return frozenset(
+        name[: -len(".json")]
+        for name in os.listdir(INDEX_DIR)
+        if name.endswith(".json")
+    )
+
+
+# application -> .sdef files from `add_sdef_dir`, in the order added
+_EXTRA = {}
+_sdef_cache = None
+
+# application -> its entry, bundled and added merged
+_loaded = {}
+
+
+def known(name: str) -> bool:
+    return name in bundled_names() or name in _EXTRA
+
+
+def load_application(name: str) -> dict:
+    """
+    {"event_codes": {code: name}, "sdef": {command code: {"name": ...,
+    "parameters": {code: name}}}} for `name`, either part may be missing.
+    Read once per process.
+    """
+    entry = _loaded.get(name)
+    if entry is None:
+        if not known(name):
+            return {}
+        entry = _loaded[name] = _merge(name)
+    return entry
+
+
+def sdef_entry(terms: dict) -> dict:
+    """An entry from what `utils.parse_sdef_terms` returns"""
+    codes = {}
+    codes.update(terms["enumerators"])
+    codes.update(terms["properties"])
+    codes.update(terms["classes"])
+    return {"event_codes": codes, "sdef": terms["commands"]}
+
+
+def _merge(name: str) -> dict:
+    entry = _load_bundled(name) if name in bundled_names() else {}
+    if name not in _EXTRA:
+        return entry
+    event_codes = dict(entry.get("event_codes", {}))
+    sdef = dict(entry.get("sdef", {}))
+    for path in _EXTRA[name]:
+        try:
+            added = sdef_entry(_sdef_cache.load(path))
+        except (OSError, SyntaxError) as e:
+            # SyntaxError: ElementTree's ParseError
+            warnings.warn(f"Skipping {path}: {e}")
+            continue
+        # Added files win over what is bundled, and later ones over earlier
+        event_codes.update(added["event_codes"])
+        sdef.update(added["sdef"])
+    return {"event_codes": event_codes, "sdef": sdef}
+
+
+def add_sdef_dir(directory: str, cache_dir=None):
+    """
+    Adds the terminology of every .sdef file in `directory`, named after
+    the file like the bundled ones ("Finder.sdef" is "Finder"). Files are
+    only listed here; each is parsed, or read from the cache in `cache_dir`,
+    the first time its application is looked up.
+    """
+    global _sdef_cache
+    from applescript_decompiler.sdef_cache import SdefCache
+
+    if _sdef_cache is None or (
+        cache_dir is not None and cache_dir != _sdef_cache.directory
+    ):
+        _sdef_cache = SdefCache(cache_dir)
+
+    added = False
+    for filename in sorted(os.listdir(directory)):
+        if not filename.lower().endswith(".sdef"):
+            continue
+        path = os.path.abspath(os.path.join(directory, filename))
+        paths = _EXTRA.setdefault(os.path.splitext(filename)[0], [])
+        if path not in paths:
+            paths.append(path)
+            added = True
+    if added:
+        # Whatever was looked up so far may have changed
+        _loaded.clear()
+        EVENT_CODES.clear()
+        SDEFS.clear()
+        CODE_INDEX.clear()
+
+
+@lru_cache(maxsize=None)
+def _load_bundled(name: str) -> dict:
+    index = _fallback_index()
+    if index is not None:
+        return index[name]
+    with open(os.path.join(INDEX_DIR, name + ".json"), encoding="utf-8") as f:
+        entry = json.load(f)
+    if entry.get("version") != INDEX_VERSION:
+        return _build_index().get(name, {})
+    return entry
+
+
+@lru_cache(maxsize=None)
+def _build_index() -> dict:
+    # Slow, but right: a checkout where the files were not generated yet,
+    # or generated by another version
+    from applescript_decompiler.build_terminology import build_index
+
+    return build_index()
+
+
+def _fallback_index():
+    if os.path.isdir(INDEX_DIR):
+        return None
+    return _build_index()
+
+
+class Terminology(dict):
+    """
+    application -> one part of its terminology, loaded on first lookup.
+    Like the defaultdict it replaces, unknown applications get an empty
+    table, but are not kept.
+    """
+
+    def __init__(self, part: str, aliases=None):
+        super().__init__()
+        self.part = part
+        # name looked up -> name of the file
+        self.aliases = aliases or {}
+
+    def __missing__(self, name):
+        file_name = self.aliases.get(name, name)
+        table = load_application(file_name).get(self.part, {})
+        if known(file_name):
+            self[name] = table
+        return table
+
+
+EVENT_CODES = Terminology("event_codes", aliases=_EVENT_CODE_ALIASES)
+SDEFS = Terminology("sdef")
+
+
+class CodeIndex:
+    """
+    Names of four-char codes as the printer resolves them under a tell
+    target and command, in one lookup. Each target's fallbacks (Standard Additions, the
+    target's event codes, AppleScript's, and AppleScript's under a `core` or
+    `misc` prefix) are merged into a table the first time it is told. Tables
+    are only kept for bundled and added applications, so there are at most that many;
+    any other target shares the table of AppleScript itself.
+    """
+
+    def __init__(self):
+        # target -> {code: name}
+        self._keywords = {}
+        # target -> {command code: (name, command, target)}
+        self._commands = {}
+        # (target, command code) -> {parameter code: name}
+        self._parameters = {}
+
+    def clear(self):
+        self._keywords.clear()
+        self._commands.clear()
+        self._parameters.clear()
+
+    def _key(self, target):
+        name = _EVENT_CODE_ALIASES.get(target, target)
+        return target if known(name) else None
+
+    def keyword(self, target: str, code: str, command: str = None) -> str:
+        """
+        The name of `code` under `target`, as a parameter of `command` when
+        it is one
+        """
+        if command is not None:
+            table = self._parameters.get((target, command))
+            if table is None:
+                key = (self._key(target), command)
+                table = self._parameters.get(key)
+                if table is None:
+                    table = self._parameters[key] = self._parameter_table(*key)
+            name = table.get(code)
+            if name is not None:
+                return name
+        try:
+            return self._keywords[target].get(code, code)
+        except KeyError:
+            pass
+        key = self._key(target)
+        table = self._keywords.get(key)
+        if table is None:
+            table = self._keywords[key] = self._keyword_table(key)
+        return table.get(code, code)
+
+    def command(self, target: str, code: str):
+        """
+        (name, command, target): the name of command `code` told to
+        `target`, and the command and target its arguments are printed
+        under, None where they stay as they were
+        """
+        table = self._commands.get(target)
+        if table is None:
+            key = self._key(target)
+            table = self._commands.get(key)
+            if table is None:
+                table = self._commands[key] = self._command_table(key)
+        found = table.get(code)
+        if found is not None:
+            return found
+        # Any suite prefix, too many to merge in
+        name = EVENT_CODES[DEFAULT_TARGET].get(code[4:])
+        if name is not None:
+            return name, None, None
+        return code, None, None
+
+    def _keyword_table(self, target) -> dict:
+        # Lowest priority first
+        default = EVENT_CODES[DEFAULT_TARGET]
+        table = {}
+        for prefix in ("core", "misc"):
+            table.update((prefix + code, name) for code, name in default.items())
+        table.update(default)
+        if target is not None:
+            table.update(EVENT_CODES[target])
+        table.update(
+            (code, command["name"])
+            for code, command in SDEFS[STANDARD_ADDITIONS].items()
+        )
+        return table
+
+    def _parameter_table(self, target, command) -> dict:
+        if target is None:
+            return {}
+        return SDEFS[target].get(command, {}).get("parameters", {})
+
+    def _command_table(self, target) -> dict:
+        table = {
+            code: (command["name"], code, STANDARD_ADDITIONS)
+            for code, command in SDEFS[STANDARD_ADDITIONS].items()
+        }
+        if target is not None:
+            table.update(
+                (code, (command["name"], code, target))
+                for code, command in SDEFS[target].items()
+            )
+        return table
+
+
+CODE_INDEX = CodeIndex()
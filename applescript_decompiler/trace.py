@@ -0,0 +1,64 @@
+from jinmo_applescript_disassembler.engine.trace import (
+    Tracer,
+    TraceEvent,
+    INSTRUCTION,
+    OBJECT_LOADED,
+    BLOCK_OPENED,
+    BLOCK_CLOSED,
+    WARNING,
+)
+
+from applescript_decompiler.ast import Comment
+from applescript_decompiler.diagnostics import bounded_repr
+
+
+# Instruction events carry `detail` as a (format, *args) tuple so that the
+# decoder never formats anything itself. Sinks call this when they need text.
+def format_instruction(event: TraceEvent) -> str:
+    fmt, *args = event.detail
+    return " %05x %s " % (event.pos, event.op) + (fmt % tuple(args))
+
+
+class CommentSink:
+    """Collects instruction comments so they can be put into the AST (`-c`)"""
+
+    def __init__(self):
+        self.pending = []
+
+    def __call__(self, event: TraceEvent):
+        self.pending.append(Comment(comment=format_instruction(event)))
+
+    def take(self):
+        pending, self.pending = self.pending, []
+        return pending
+
+
+class WarningSink:
+    """Collects warnings so they end up in the result instead of on stdout"""
+
+    def __init__(self):
+        self.pending = []
+
+    def __call__(self, event: TraceEvent):
+        self.pending.append(event.message)
+
+    def take(self):
+        pending, self.pending = self.pending, []
+        return pending
+
+
+class DebugSink:
+    """Prints the disassembly and the symbolic stack while decompiling (`-d`)"""
+
+    def note(self, line: str):
+        # Report headers, printed as each handler starts
+        print(line)
+
+    def __call__(self, event: TraceEvent):
+        if event.kind == INSTRUCTION:
+            print(bounded_repr(event.stack_before))
+            print(format_instruction(event))
+        else:
+            print(
+                f"-- {event.kind} {event.block.__class__.__name__} at {event.pos:05x}"
+            )
@@ -1,22 +1,46 @@
 #!/usr/bin/env python3
 
-import xml.etree.ElementTree as ET
 import sys
 import os
 from pprint import pprint
 from collections import defaultdict
-from importlib import resources
 import importlib
 import importlib.util
 from pathlib import Path
 
 
 def parse_sdef(path):
-    # Note: We should be able to parse more, like classes. TODO?
+    return parse_sdef_terms(path)["commands"]
+
+
+def parse_sdef_terms(path):
+    # Imported here: sdefs are only parsed to build the terminology index,
+    # or when a --sdef-dir file is not cached yet
+    import xml.etree.ElementTree as ET
+
     tree = ET.parse(path)
     root = tree.getroot()
 
     commands = {}
+    # code -> name, for the other four-char codes scripts use
+    classes = {}
+    properties = {}
+    enumerators = {}
+
+    # Records and value types are used like classes
+    for tag in ("class", "record-type", "value-type"):
+        for cls in root.iter(tag):
+            if cls.get("code") and cls.get("name"):
+                classes[cls.get("code")] = cls.get("name")
+
+    # Including those of class extensions
+    for prop in root.iter("property"):
+        if prop.get("code") and prop.get("name"):
+            properties[prop.get("code")] = prop.get("name")
+
+    for enumerator in root.iter("enumerator"):
+        if enumerator.get("code") and enumerator.get("name"):
+            enumerators[enumerator.get("code")] = enumerator.get("name")
 
     # Find all <command> elements anywhere in the document
     for cmd in root.findall(".//command"):
@@ -40,10 +64,15 @@ def parse_sdef(path):
             "parameters": params,
         }
 
-    return commands
+    return {
+        "commands": commands,
+        "classes": classes,
+        "properties": properties,
+        "enumerators": enumerators,
+    }
 
 
-def load_sdefs_from_folder(folder_path):
+def load_sdefs_from_folder(folder_path, parse=parse_sdef):
     result = defaultdict(dict)
 
     for filename in os.listdir(folder_path):
@@ -54,14 +83,16 @@ def load_sdefs_from_folder(folder_path):
         app_name = os.path.splitext(filename)[0]  # "Finder.sdef" -> "Finder"
 
         # Parse the file
-        commands = parse_sdef(full_path)
+        commands = parse(full_path)
 
         result[app_name] = commands
 
     return result
 
 
-def load_sdefs_from_package():
+def load_sdefs_from_package(parse=parse_sdef):
+    from importlib import resources
+
     data_dir = resources.files("applescript_decompiler.data")
     result = defaultdict(dict)
 
@@ -72,7 +103,7 @@ def load_sdefs_from_package():
         app_name = entry.stem  # "Finder.sdef" -> "Finder"
 
         with entry.open("rb") as f:
-            commands = parse_sdef(f)
+            commands = parse(f)
 
         result[app_name] = commands
 
@@ -0,0 +1,125 @@
+from typing import List
+
+import jinmo_applescript_disassembler.engine.runtimeobjects as rto
+
+from applescript_decompiler.opcodes import Instruction, TruncatedInstruction, decode
+
+
+class VerifyError(Exception):
+    """Bytecode that the decompiler would choke on"""
+
+    def __init__(self, pos: int, message: str):
+        super().__init__(f"{pos:05x}: {message}")
+        self.pos = pos
+
+
+# Stands for any value we cannot know statically
+UNKNOWN = object()
+
+
+def _literal_value(literals, index):
+    # Mirrors convert_literal for the two kinds of values the stack rules use
+    if index >= len(literals):
+        return UNKNOWN
+    lit = literals[index]
+    if isinstance(lit, list):
+        lit = lit[1]
+    if isinstance(lit, rto.Object):
+        lit = lit.value
+    if isinstance(lit, rto.Constant):
+        return lit.value
+    if isinstance(lit, rto.Fixnum):
+        return int(lit.value)
+    return UNKNOWN
+
+
+def verify(code, literals=()) -> List[Instruction]:
+    """
+    One pass over a handler's bytecode that checks, before decompiling:
+
+    - every instruction's operands fit in the code
+    - every branch lands on an instruction boundary or the end of the code
+    - the symbolic stack never underflows and counts are constants
+
+    The stack is simulated as an over-approximation: pops that depend on block
+    state are assumed not to happen, so anything rejected here would have
+    failed in `run_decompiler` too. Returns the decoded instructions.
+    """
+    try:
+        instructions = list(decode(code))
+    except TruncatedInstruction as e:
+        raise VerifyError(e.pos, f"{e.op} runs past the end of the code")
+
+    boundaries = {insn.pos for insn in instructions}
+    boundaries.add(len(code))
+
+    stack = []
+    # [end_pos, counted] for open LinkRepeat loops, innermost last
+    repeats = []
+
+    def pop(insn, n=1):
+        if n == 0:
+            return []
+        if len(stack) < n:
+            raise VerifyError(
+                insn.pos, f"{insn.op} needs {n} stack item(s), {len(stack)} available"
+            )
+        popped = stack[-n:]
+        del stack[-n:]
+        return popped
+
+    def pop_count(insn):
+        (count,) = pop(insn)
+        if count is UNKNOWN or not isinstance(count, int) or count < 0:
+            raise VerifyError(insn.pos, f"{insn.op} count is not a constant")
+        return count
+
+    for insn in instructions:
+        spec = insn.spec
+        op = spec.name
+
+        while repeats and repeats[-1][0] < insn.pos:
+            repeats.pop()
+
+        target = insn.target
+        if target is not None and target not in boundaries:
+            raise VerifyError(insn.pos, f"{op} branches to {target:#x}")
+
+        if op in ("PushLiteral", "PushLiteralExtended"):
+            stack.append(_literal_value(literals, insn.operands[0]))
+            continue
+        if op in ("Push0", "Push1", "Push2", "Push3", "PushMinus1"):
+            stack.append(-1 if op == "PushMinus1" else int(op[-1]))
+            continue
+        if op == "Dup":
+            if stack and not (repeats and repeats[-1][1]):
+                stack.append(stack[-1])
+            continue
+        if op == "LinkRepeat":
+            repeats.append([target, False])
+        elif op.startswith("Repeat") and repeats:
+            repeats[-1][1] = True
+
+        if op == "Error":
+            # The count is either on top or just below the message
+            (count,) = pop(insn)
+            if count is UNKNOWN or not isinstance(count, int):
+                count = pop_count(insn)
+            pop(insn, count)
+        elif spec.counted:
+            count = pop_count(insn)
+            pop(insn, count)
+        elif spec.sub_operation == "GetKeyFrom":
+            (key,) = pop(insn)
+            if key == int.from_bytes(b"kfrmID  ", "big"):
+                pop(insn, 2)
+            pop(insn, spec.pops - 1)
+            stack.append(UNKNOWN)
+            continue
+
+        pop(insn, spec.pops)
+        if spec.maybe_pops and stack:
+            del stack[-min(spec.maybe_pops, len(stack)) :]
+        stack.extend([UNKNOWN] * spec.pushes)
+
+    return instructions
@@ -0,0 +1,68 @@
+"""
+Operations on one deep `&` chain, like the ones obfuscated strings decompile
+to: printing, repr, ==, structural hashing and NaiveStringAnalyzer folding.
+None of them may recurse once per term. Best of N runs.
+
+    python benchmarks/deep_chains.py [-n RUNS] [--terms N]
+"""
+
+import time
+import argparse
+
+from applescript_decompiler.ast import (
+    BinaryOp,
+    BinaryOpKind,
+    ExprStatement,
+    StringLiteral,
+)
+from applescript_decompiler.analyzer import NaiveStringAnalyzer
+from applescript_decompiler.diff import StructuralHasher
+
+
+def chain(terms):
+    # "h" & "a" & "b" & ..., which the decompiler builds left-leaning
+    expr = StringLiteral(value="h")
+    for i in range(terms):
+        expr = BinaryOp(
+            op=BinaryOpKind.CONCAT,
+            left=expr,
+            right=StringLiteral(value=chr(ord("a") + i % 26)),
+        )
+    return expr
+
+
+def best_of(runs, fn):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=3)
+    parser.add_argument("--terms", type=int, default=100_000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    expr, other = chain(args.terms), chain(args.terms)
+    print(f"{'build':24} {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    statement = ExprStatement(expr=expr)
+    cases = [
+        ("print", lambda: statement.to_source()),
+        ("repr", lambda: repr(expr)),
+        ("==", lambda: expr == other),
+        # A fresh hasher each run, or the cache answers
+        ("hash", lambda: StructuralHasher()(expr)),
+        ("naive folding", lambda: statement.to_source(analyzer=NaiveStringAnalyzer)),
+    ]
+    for label, fn in cases:
+        print(f"{label:24} {best_of(args.runs, fn) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Files per second for the bytecode-only commands (`extract`, `callgraph`)
+against a full decompile, and for loading alone, which all of them pay.
+Best of N runs of REPEAT files each.
+
+    python benchmarks/extract_throughput.py [-n RUNS] [--repeat N] [SCPT]
+"""
+
+import io
+import os
+import time
+import argparse
+
+from jinmo_applescript_disassembler.engine.fasparser import Loader
+from jinmo_applescript_disassembler.engine.budget import Budget
+
+from applescript_decompiler.callgraph import call_graph
+from applescript_decompiler.decompiler import decompile
+from applescript_decompiler.extract import ROOT_OFFSET, extract
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEMO = os.path.join(ROOT, "demo", "demo_runonly.scpt")
+
+
+def load(data):
+    return Loader(budget=Budget()).load(io.BytesIO(data))
+
+
+def best_of(runs, repeat, fn):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("scpt", nargs="?", default=DEMO)
+    args = parser.parse_args()
+
+    with open(args.scpt, "rb") as f:
+        data = f.read()
+    cases = [
+        ("load", lambda: load(data)),
+        ("extract", lambda: extract(data)),
+        ("extract --no-decrypt", lambda: extract(data, decrypt=False)),
+        ("callgraph", lambda: call_graph(load(data)[ROOT_OFFSET])),
+        ("decompile", lambda: decompile(data)),
+        ("decompile render=False", lambda: decompile(data, render=False)),
+    ]
+    for label, fn in cases:
+        elapsed = best_of(args.runs, args.repeat, fn)
+        print(
+            f"{label:24} {args.repeat / elapsed:8.1f} files/s"
+            f" {elapsed / args.repeat * 1000:8.2f} ms/file"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Memory held by decompiled trees, measured with tracemalloc: a synthetic
+obfuscated script built plain and hash-consed, and repeated decompiles of
+a file, plain and with `intern=True`.
+
+    python benchmarks/memory.py [--statements N] [--repeat N] [SCPT]
+"""
+
+import os
+import gc
+import time
+import argparse
+import tracemalloc
+
+from applescript_decompiler.ast import (
+    BinaryOp,
+    BinaryOpKind,
+    CommandCall,
+    ExprStatement,
+    Handler,
+    Keyword,
+    LValue,
+    NumberLiteral,
+    Script,
+    SetStatement,
+    VariableRef,
+)
+from applescript_decompiler.decompiler import decompile
+from applescript_decompiler.passes import Interner
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEMO = os.path.join(ROOT, "demo", "demo_runonly.scpt")
+
+
+def obfuscated(statements, push=lambda node: node):
+    # What droppers look like: commands spelled out one `ASCII character`
+    # at a time, with the same few strings and variables over and over.
+    # `push` sees each expression as the decompiler would push it
+    body = []
+    for i in range(statements // 2):
+        chars = [
+            push(
+                CommandCall(
+                    command_name="sysontoc",
+                    arguments=[push(NumberLiteral(value=ord(c)))],
+                )
+            )
+            for c in f"curl -s http://x/{i % 7}"
+        ]
+        expr = chars[0]
+        for c in chars[1:]:
+            expr = push(BinaryOp(op=BinaryOpKind.CONCAT, left=expr, right=c))
+        name = f"v{i % 5}"
+        body.append(SetStatement(target=LValue(obj=VariableRef(name=name)), value=expr))
+        body.append(
+            ExprStatement(
+                expr=CommandCall(
+                    command_name="sysoexec",
+                    arguments=[VariableRef(name=name), Keyword(value="rtyp")],
+                )
+            )
+        )
+    return Script(handlers=[Handler(name="run", parameters=[], body=body)])
+
+
+def measure(label, build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:32} retained {retained / 2**20:7.1f} MB"
+        f"  peak {peak / 2**20:7.1f} MB  {elapsed:6.2f} s"
+    )
+    return kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--statements", type=int, default=40_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("scpt", nargs="?", default=DEMO)
+    args = parser.parse_args()
+
+    measure(
+        f"synthetic, {args.statements} statements", lambda: obfuscated(args.statements)
+    )
+    measure("  interned", lambda: obfuscated(args.statements, Interner().intern))
+    measure(
+        f"{os.path.basename(args.scpt)} x{args.repeat}",
+        lambda: [decompile(args.scpt, render=False) for _ in range(args.repeat)],
+    )
+    measure(
+        "  interned",
+        lambda: [
+            decompile(args.scpt, render=False, intern=True) for _ in range(args.repeat)
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
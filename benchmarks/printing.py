@@ -0,0 +1,110 @@
+"""
+Printing a large synthetic handler, plain and through NaiveStringAnalyzer:
+mostly the cost of visit dispatch and operator rendering. Best of N runs.
+With --against, the same is timed on another checkout of the repository
+(e.g. `git worktree add /tmp/base <rev>`) and printed alongside.
+
+    python benchmarks/printing.py [-n RUNS] [--statements N] [--against CHECKOUT]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+from applescript_decompiler.ast import (
+    BinaryOp,
+    BinaryOpKind,
+    Handler,
+    ListLiteral,
+    NumberLiteral,
+    ReturnStatement,
+    Script,
+    SetStatement,
+    StringLiteral,
+    VariableRef,
+)
+from applescript_decompiler.analyzer import NaiveStringAnalyzer
+
+
+def script(statements):
+    body = []
+    for i in range(statements // 2):
+        value = BinaryOp(
+            op=BinaryOpKind.ADD,
+            left=NumberLiteral(value=i),
+            right=BinaryOp(
+                op=BinaryOpKind.CONCAT,
+                left=StringLiteral(value=f"s{i}"),
+                right=NumberLiteral(value=7),
+            ),
+        )
+        body.append(SetStatement(target=VariableRef(name=f"v{i}"), value=value))
+        body.append(
+            ReturnStatement(
+                value=ListLiteral(elements=[NumberLiteral(value=j) for j in range(5)])
+            )
+        )
+    return Script(handlers=[Handler(name="h", parameters=[], body=body)])
+
+
+def best_of(runs, fn):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def timings(runs, statements):
+    tree = script(statements)
+    return {
+        label: best_of(runs, lambda: tree.to_source(analyzer=analyzer))
+        for label, analyzer in [
+            ("plain", None),
+            ("NaiveStringAnalyzer", NaiveStringAnalyzer),
+        ]
+    }
+
+
+def timings_of(checkout, runs, statements):
+    # This script, importing the package from `checkout` instead
+    path = [checkout, os.path.join(checkout, "jinmo_applescript_disassembler")]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path))
+    argv = [sys.executable, os.path.abspath(__file__), "--json"]
+    argv += ["--runs", str(runs), "--statements", str(statements)]
+    out = subprocess.run(argv, env=env, check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--statements", type=int, default=40_000)
+    parser.add_argument("--against", metavar="CHECKOUT", default=None)
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    ours = timings(args.runs, args.statements)
+    if args.json:
+        print(json.dumps(ours))
+        return
+    if args.against is None:
+        for label, elapsed in ours.items():
+            print(f"{label:24} {elapsed * 1000:8.1f} ms")
+        return
+    theirs = timings_of(args.against, args.runs, args.statements)
+    print(f"{'':24} {'this':>11} {'against':>11}  speedup")
+    for label, elapsed in ours.items():
+        print(
+            f"{label:24} {elapsed * 1000:8.1f} ms"
+            f" {theirs[label] * 1000:8.1f} ms  x{theirs[label] / elapsed:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
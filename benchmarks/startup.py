@@ -0,0 +1,46 @@
+"""
+Startup latency of the command line: `--help`, which only pays for imports,
+and one small file end to end. Best of N runs, each in a fresh interpreter.
+
+    python benchmarks/startup.py [-n RUNS] [SCPT]
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEMO = os.path.join(ROOT, "demo", "demo_runonly.scpt")
+
+
+def best_of(runs, argv):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, check=True, stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=10)
+    parser.add_argument("scpt", nargs="?", default=DEMO)
+    args = parser.parse_args()
+
+    cli = [sys.executable, "-m", "applescript_decompiler.decompiler"]
+    cases = [
+        ("python", [sys.executable, "-c", "pass"]),
+        ("import", [sys.executable, "-c", "import applescript_decompiler.decompiler"]),
+        ("--help", cli + ["--help"]),
+        (os.path.basename(args.scpt), cli + [args.scpt]),
+    ]
+    for label, argv in cases:
+        print(f"{label:24} {best_of(args.runs, argv) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
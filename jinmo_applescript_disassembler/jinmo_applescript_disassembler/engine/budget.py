@@ -0,0 +1,113 @@
+"""
+Work budgets for loading and decompiling untrusted files.
+
+Every limit defaults to unlimited; the command line tools start from
+CLI_LIMITS instead. The counters are plain attributes so the hot paths only
+pay for an addition and a comparison.
+
+The wall clock is read about every CLOCK_PERIOD seconds rather than on every
+charge: the number of charges between two reads follows how fast charges
+came in since the last read, starting from one. A deadline is overrun by
+about CLOCK_PERIOD, or by one charge that takes longer on its own. Without
+a deadline the clock is never read.
+"""
+import time
+
+INF = float('inf')
+CLOCK_PERIOD = 0.01
+# Most charges between two reads of the clock
+MAX_CLOCK_INTERVAL = 1 << 16
+
+# What the command line tools allow when not told otherwise, until lifted
+# with --no-limits. Scripts are small: the demo loads about 500 objects from
+# 13 KB, and decodes 1100 instructions into 900 nodes
+CLI_LIMITS = dict(objects=2000000, bytes=64 << 20, depth=256,
+                  instructions=2000000, nodes=20000000, seconds=120)
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, resource, limit):
+        super(BudgetExceeded, self).__init__('%s budget of %s exceeded' % (resource, limit))
+        self.resource = resource
+        self.limit = limit
+        # Filled in by whoever can salvage something (e.g. the decompiler's handlers)
+        self.partial = None
+
+
+class Budget(object):
+    def __init__(self, objects=None, bytes=None, depth=None, instructions=None,
+                 nodes=None, seconds=None):
+        self.max_objects = INF if objects is None else objects
+        self.max_bytes = INF if bytes is None else bytes
+        self.max_depth = INF if depth is None else depth
+        self.max_instructions = INF if instructions is None else instructions
+        self.max_nodes = INF if nodes is None else nodes
+        self.seconds = seconds
+
+        self.objects = 0
+        self.bytes = 0
+        self.instructions = 0
+        self.nodes = 0
+        self.deadline = None
+        self._ticks = 0
+        self._interval = INF
+        self.restart_clock()
+
+    def restart_clock(self):
+        if self.seconds is not None:
+            self._last_read = time.monotonic()
+            self.deadline = self._last_read + self.seconds
+            self._ticks = 0
+            self._interval = 1
+
+    def _tick(self):
+        self._ticks += 1
+        if self._ticks >= self._interval:
+            self._read_clock()
+
+    def _read_clock(self):
+        self._ticks = 0
+        now = time.monotonic()
+        if now > self.deadline:
+            raise BudgetExceeded('seconds', self.seconds)
+        elapsed = now - self._last_read
+        self._last_read = now
+        # At most doubling, as the first reads come too quickly to time
+        interval = self._interval * 2
+        if elapsed > 0:
+            interval = min(interval, int(self._interval * CLOCK_PERIOD / elapsed))
+        self._interval = max(1, min(interval, MAX_CLOCK_INTERVAL))
+
+    def charge_bytes(self, n):
+        self.bytes += n
+        if self.bytes > self.max_bytes:
+            raise BudgetExceeded('bytes', self.max_bytes)
+
+    def charge_object(self, depth=0):
+        self.objects += 1
+        if self.objects > self.max_objects:
+            raise BudgetExceeded('objects', self.max_objects)
+        if depth > self.max_depth:
+            raise BudgetExceeded('depth', self.max_depth)
+        self._tick()
+
+    def charge_instruction(self, nodes=0):
+        self.instructions += 1
+        self.nodes += nodes
+        if self.instructions > self.max_instructions:
+            raise BudgetExceeded('instructions', self.max_instructions)
+        if self.nodes > self.max_nodes:
+            raise BudgetExceeded('nodes', self.max_nodes)
+        self._tick()
+
+
+def cli_budget(no_limits=False, **limits):
+    """
+    A Budget for the command line: CLI_LIMITS (nothing with `no_limits`),
+    overridden by the `limits` that are not None
+    """
+    merged = {} if no_limits else dict(CLI_LIMITS)
+    for name, value in limits.items():
+        if value is not None:
+            merged[name] = value
+    return Budget(**merged)
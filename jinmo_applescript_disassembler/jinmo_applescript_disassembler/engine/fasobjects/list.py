@@ -7,6 +7,8 @@ def loadList(table, id, size):
     if size == 2:
         r = cur = Pair(NIL, EmptyPair())
         while True:
+            # Each link is attacker controlled, so count it like an object
+            table.loader.budget.charge_object(table.depth)
             a = table.loader.read_s16()
             b = table.loader.read_s16()
             table.findObject(a)
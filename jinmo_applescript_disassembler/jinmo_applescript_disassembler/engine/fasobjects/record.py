@@ -13,6 +13,7 @@ def load(table, id, size):
         record = table.loader.stack[-1]
         table.registerObject(id, record)
         while size == 3:
+            table.loader.budget.charge_object(table.depth)
             A = table.loader.read_s16()
             B = table.loader.read_s16()
             C = table.loader.read_s16()
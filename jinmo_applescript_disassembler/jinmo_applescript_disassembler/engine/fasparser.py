@@ -6,6 +6,8 @@ from pprint import pprint
 from .fasobjects import fastypes
 from .runtimeobjects import *
 from .util import getSizeByIndex
+from .trace import Tracer, OBJECT_LOADED
+from .budget import Budget
 
 
 # magic!
@@ -123,14 +125,17 @@ class FasLoadTable(TRefTable):
                 context.index, context.ref, context.inlined = self.readFasHeader()
 
             self.depth += 1
-            out = ' '.join(repr(x) for x in (hex(pos) + ' idx:%d' % context.index, context.ref, context.inlined))
+            loader.budget.charge_object(self.depth)
+            if loader.tracer.wants(OBJECT_LOADED):
+                loader.tracer.emit(OBJECT_LOADED, pos=pos, index=context.index, ref=context.ref,
+                                   inlined=context.inlined, depth=self.depth)
             if context.ref == num:
                 self.loadObjectBody(num, context.index, context.inlined)
             else:
                 err = "%08x: AppleScript: Error while loading script, RefID doesn't match. Expected %d, found %d." % (
                     pos, num, context.ref)
                 context.reuseHeader = True
-                print(err, file=sys.stdout)
+                loader.tracer.warn(err, pos=pos)
                 context.refErrors.append(err)
                 if len(context.refErrors) >= 6:
                     raise Exception("AppleScript: Too many RefID errors.")
@@ -218,14 +223,19 @@ class Loader:
     Original version of AppleScript uses global variable for it, and I use class for separating file contexts.
     """
 
-    def __init__(self):
+    def __init__(self, tracer=None, budget=None):
         """
         You can just call Loader() without any arguments.
         loader = Loader()
         loader.load(file)
+
+        Pass a `trace.Tracer` to receive object_loaded/warning events, and a
+        `budget.Budget` to bound the work spent on a hostile file.
         """
         self.stack = None
         self.bigEndian = None
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.budget = budget if budget is not None else Budget()
 
         # Some internal stuffs
         self.__context = {}
@@ -260,16 +270,31 @@ class Loader:
         return (reader, signed_reader)
 
     def load(self, path):
-        self.f = f = open(path, 'rb')
+        # Also takes an open binary file, e.g. io.BytesIO for in-memory samples
+        owned = not hasattr(path, 'read')
+        if owned:
+            self.f = f = open(path, 'rb')
+        else:
+            self.f = f = path
 
         self.bigEndian = True
         self.stack = Stack()
         self.loadTable = FasLoadTable(self)
 
         self.loadTable.loadObject(0)
-        return self.stack.pop()
+        root = self.stack.pop()
+
+        # The object graph is complete, so the tables that built it can go.
+        # Otherwise whoever holds the loader keeps every loaded object alive.
+        self.loadTable = None
+        self.stack = None
+        self.f = None
+        if owned:
+            f.close()
+        return root
 
     def read(self, size):
+        self.budget.charge_bytes(size)
         return self.f.read(size)
 
     def seek(self, pos, set=1):
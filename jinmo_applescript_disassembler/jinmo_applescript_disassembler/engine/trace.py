@@ -0,0 +1,70 @@
+"""
+Structured trace events for the loader and the decompiler.
+
+Nothing is formatted unless a sink is attached for that kind of event, so the
+hot paths only pay for a truthiness check:
+
+    tracer = Tracer()
+    tracer.attach(print, OBJECT_LOADED)
+    if tracer.wants(OBJECT_LOADED):
+        tracer.emit(OBJECT_LOADED, pos=pos, index=index)
+"""
+from __future__ import print_function
+import sys
+
+INSTRUCTION = 'instruction'
+OBJECT_LOADED = 'object_loaded'
+BLOCK_OPENED = 'block_opened'
+BLOCK_CLOSED = 'block_closed'
+WARNING = 'warning'
+
+KINDS = (INSTRUCTION, OBJECT_LOADED, BLOCK_OPENED, BLOCK_CLOSED, WARNING)
+
+
+class TraceEvent(object):
+    __slots__ = ('kind', 'fields')
+
+    def __init__(self, kind, fields):
+        self.kind = kind
+        self.fields = fields
+
+    def __getattr__(self, name):
+        try:
+            return self.fields[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __repr__(self):
+        return '<TraceEvent %s %r>' % (self.kind, self.fields)
+
+
+class Tracer(object):
+    def __init__(self):
+        self.sinks = {kind: [] for kind in KINDS}
+
+    def attach(self, sink, *kinds):
+        """Subscribe `sink(event)` to the given kinds (all kinds if none given)."""
+        for kind in kinds or KINDS:
+            self.sinks[kind].append(sink)
+        return sink
+
+    def detach(self, sink):
+        for sinks in self.sinks.values():
+            while sink in sinks:
+                sinks.remove(sink)
+
+    def wants(self, kind):
+        return self.sinks[kind]
+
+    def emit(self, kind, **fields):
+        event = TraceEvent(kind, fields)
+        for sink in self.sinks[kind]:
+            sink(event)
+
+    def warn(self, message, **fields):
+        # Warnings always reach someone: if nobody subscribed, print them like before
+        if self.sinks[WARNING]:
+            self.emit(WARNING, message=message, **fields)
+        else:
+            print(message, file=sys.stdout)
+
@@ -259,124 +259,26 @@ PushLiteral'''.split('\n')
 opcodes_map = {x: i for i, x in enumerate(opcodes)}
 
 
+# value block index -> allocation size (the binary checks these with a long if-chain)
+_SIZES = (
+    (3, (4, 14, 18, 21, 22, 23, 26, 28, 29, 32, 33, 34, 35, 36, 37, 38, 39,
+         40, 41, 42, 43, 45, 58, 59, 83, 102, 103, 122)),
+    (6, (15, 53, 55, 73, 80, 81, 82, 88, 108, 120, 124)),
+    (8, (16, 17, 89)),
+    (1, (19,)),
+    (2, (20, 30, 31, 44, 177)),
+    (4, (24, 49, 50, 51, 56, 57, 60, 72, 74, 75, 76, 77, 78, 84, 100, 101,
+         107, 109, 111, 112, 113, 118, 123)),
+    (5, (25, 27, 52, 54, 61, 62, 63, 64, 65, 66, 67, 68, 69, 70, 71, 79, 85,
+         86, 87, 91, 92, 93, 94, 95, 96, 97, 98, 99, 104, 105, 106, 110, 114,
+         115, 116, 117, 119)),
+    (7, (90,)),
+)
+_SIZE_BY_INDEX = {index: size for size, indexes in _SIZES for index in indexes}
+
+
 def getSizeByIndex(x):
-    if x in [4,
-             14,
-             18,
-             21,
-             22,
-             23,
-             26,
-             28,
-             29,
-             32,
-             33,
-             34,
-             35,
-             36,
-             37,
-             38,
-             39,
-             40,
-             41,
-             42,
-             43,
-             45,
-             58,
-             59,
-             83,
-             102,
-             103,
-             122]:
-        return 3
-    if x in [15,
-             53,
-             55,
-             73,
-             80,
-             81,
-             82,
-             88,
-             108,
-             120,
-             124]:
-        return 6
-    if x in [16,
-             17,
-             89]:
-        return 8
-    if x in [19]:
-        return 1
-    if x in [20,
-             30,
-             31,
-             44,
-             177]:
-        return 2
-    if x in [24,
-             49,
-             50,
-             51,
-             56,
-             57,
-             60,
-             72,
-             74,
-             75,
-             76,
-             77,
-             78,
-             84,
-             100,
-             101,
-             107,
-             109,
-             111,
-             112,
-             113,
-             118,
-             123]:
-        return 4
-    if x in [25,
-             27,
-             52,
-             54,
-             61,
-             62,
-             63,
-             64,
-             65,
-             66,
-             67,
-             68,
-             69,
-             70,
-             71,
-             79,
-             85,
-             86,
-             87,
-             91,
-             92,
-             93,
-             94,
-             95,
-             96,
-             97,
-             98,
-             99,
-             104,
-             105,
-             106,
-             110,
-             114,
-             115,
-             116,
-             117,
-             119]:
-        return 5
-    if x in [90]:
-        return 7
+    return _SIZE_BY_INDEX.get(x)
 
 
 ConstMap = {
@@ -0,0 +1,103 @@
+import pytest
+
+from jinmo_applescript_disassembler.engine import budget as budget_module
+from jinmo_applescript_disassembler.engine.budget import (
+    CLI_LIMITS,
+    INF,
+    MAX_CLOCK_INTERVAL,
+    Budget,
+    BudgetExceeded,
+    cli_budget,
+)
+
+from applescript_decompiler.decompiler import decompile
+
+DEMO = "demo/demo_runonly.scpt"
+
+
+def _exceeded(charge, *args) -> BudgetExceeded:
+    with pytest.raises(BudgetExceeded) as info:
+        charge(*args)
+    return info.value
+
+
+def test_unlimited_by_default():
+    budget = Budget()
+    for _ in range(1000):
+        budget.charge_object(depth=1000)
+        budget.charge_instruction(nodes=1000)
+    budget.charge_bytes(1 << 40)
+    assert budget.deadline is None
+
+
+def test_limits_are_inclusive():
+    budget = Budget(bytes=10, objects=2, depth=3, instructions=2, nodes=5)
+    budget.charge_bytes(10)
+    budget.charge_object(depth=3)
+    budget.charge_object()
+    budget.charge_instruction(nodes=5)
+    budget.charge_instruction()
+
+    error = _exceeded(budget.charge_bytes, 1)
+    assert (error.resource, error.limit) == ("bytes", 10)
+    assert str(error) == "bytes budget of 10 exceeded"
+    assert error.partial is None
+    assert _exceeded(budget.charge_object).resource == "objects"
+    assert _exceeded(budget.charge_instruction).resource == "instructions"
+
+
+def test_depth_and_nodes():
+    budget = Budget(depth=3, nodes=5)
+    assert _exceeded(budget.charge_object, 4).resource == "depth"
+    assert _exceeded(budget.charge_instruction, 6).resource == "nodes"
+
+
+def test_deadline(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(budget_module.time, "monotonic", lambda: now[0])
+    budget = Budget(seconds=5)
+    assert budget.deadline == 105
+    # The clock is read less often while charges come in quickly
+    for _ in range(100):
+        budget.charge_object()
+    interval = budget._interval
+    assert interval > 1
+    now[0] = 105.5
+    charges = 0
+    with pytest.raises(BudgetExceeded) as info:
+        while charges <= MAX_CLOCK_INTERVAL:
+            budget.charge_object()
+            charges += 1
+    assert (info.value.resource, info.value.limit) == ("seconds", 5)
+    assert charges < interval
+
+
+def test_cli_budget():
+    budget = cli_budget()
+    assert budget.max_objects == CLI_LIMITS["objects"]
+    assert budget.seconds == CLI_LIMITS["seconds"]
+    # None leaves the default alone
+    budget = cli_budget(objects=10, depth=None)
+    assert (budget.max_objects, budget.max_depth) == (10, CLI_LIMITS["depth"])
+    # --no-limits: only what is given
+    budget = cli_budget(True, nodes=7)
+    assert budget.max_nodes == 7
+    assert budget.max_instructions == INF
+    assert budget.seconds is None
+
+
+def test_blown_while_loading():
+    result = decompile(DEMO, budget=Budget(objects=10))
+    assert result.exceeded.resource == "objects"
+    assert result.reports == []
+    assert result.text is None
+
+
+def test_blown_while_decompiling():
+    result = decompile(DEMO, budget=Budget(instructions=300))
+    assert result.exceeded.resource == "instructions"
+    # What was decompiled before the budget ran out is kept, and rendered
+    assert result.handlers
+    assert result.exceeded.partial == result.handlers
+    assert result.text.startswith("on run\n")
+    assert decompile(DEMO).exceeded is None
@@ -0,0 +1,70 @@
+import json
+
+from jinmo_applescript_disassembler.engine.fasparser import Loader
+
+from applescript_decompiler.callgraph import CallGraph, call_graph
+from applescript_decompiler.decompiler import decompile
+
+DEMO = "demo/demo_runonly.scpt"
+
+# Never called from `run`
+DEAD = ["demoRepeats", "demoIfStatements", "decodeWithOffset", "get_url", "rangeDemo"]
+
+
+def _graph():
+    with open(DEMO, "rb") as f:
+        return call_graph(Loader().load(f)[-1])
+
+
+def test_call_graph():
+    graph = _graph()
+    assert graph.names[3] == "run" and graph.entries == [3]
+    assert [graph.names[c] for c in graph.calls[3]] == [
+        "logMessage",
+        "collectEnvironmentInfo",
+        "deobfuscateStringList",
+        "finderDemo",
+        "systemEventsDemo",
+    ]
+    # logMessage calls escapeQuotes, which only run reaches through it
+    assert [graph.names[c] for c in graph.calls[13]] == ["escapeQuotes"]
+    assert graph.errors == {}
+    dead = [graph.names[o] for o in sorted(set(graph.names) - graph.reachable())]
+    assert dead == DEAD
+
+
+def test_reachable():
+    # Cycles end, and a script without entries is a library
+    graph = CallGraph(
+        names={2: "run", 3: "a", 4: "b", 5: "c"},
+        calls={2: [3], 3: [4], 4: [3], 5: []},
+        entries=[2],
+    )
+    assert graph.reachable() == {2, 3, 4}
+    graph.entries = []
+    assert graph.reachable() == {2, 3, 4, 5}
+
+
+def test_to_dict_and_dot():
+    graph = _graph()
+    data = json.loads(json.dumps(graph.to_dict()))
+    handlers = {h["name"]: h for h in data["handlers"]}
+    assert handlers["run"]["entry"] and handlers["run"]["reachable"]
+    assert handlers["logMessage"]["calls"] == ["escapeQuotes"]
+    assert not handlers["rangeDemo"]["reachable"]
+
+    dot = list(graph.dot())
+    assert dot[0] == "digraph calls {" and dot[-1] == "}"
+    assert '    h3 [label="run" shape=box];' in dot
+    assert '    h15 [label="rangeDemo" color=grey fontcolor=grey];' in dot
+    assert "    h13 -> h14;" in dot
+
+
+def test_reachable_only():
+    result = decompile(DEMO, reachable_only=True)
+    notes = [note for report in result.reports for note in report.notes]
+    skipped = [note for note in notes if note.endswith(" is never called, skipped")]
+    assert skipped == [f"-- {name} is never called, skipped" for name in DEAD]
+    names = [h.name for h in result.handlers]
+    assert "logMessage" in names
+    assert not set(DEAD) & set(names)
@@ -0,0 +1,80 @@
+from applescript_decompiler.ast import *
+from applescript_decompiler.dataflow import propagate
+
+
+def _set(name, value):
+    return SetStatement(target=LValue(obj=VariableRef(name)), value=value)
+
+
+def _add_item(argument):
+    return ExprStatement(
+        expr=HandlerCall("addItem", [argument], target=VariableRef("my"))
+    )
+
+
+def test_lists_are_not_inlined_across_calls():
+    # set x to {1} / my addItem(x) / return x: addItem may change x's list
+    handler = Handler(
+        name="h",
+        body=[
+            _set("[var_0]", ListLiteral([NumberLiteral(1)])),
+            _set("[var_1]", StringLiteral("a")),
+            _add_item(VariableRef("[var_0]")),
+            ReturnStatement(
+                value=ListLiteral([VariableRef("[var_0]"), VariableRef("[var_1]")])
+            ),
+        ],
+    )
+    source = Script(handlers=[propagate(handler)]).to_source()
+    assert "my addItem([var_0])" in source
+    # Text is copied, and survives the call
+    assert 'return {[var_0], "a"}' in source
+
+
+def test_lists_are_not_inlined_into_call_arguments():
+    handler = Handler(
+        name="h",
+        body=[
+            _set("[var_0]", ListLiteral([NumberLiteral(1)])),
+            _set("[var_1]", StringLiteral("a")),
+            _set(
+                "[var_2]",
+                HandlerCall(
+                    "f",
+                    [VariableRef("[var_0]"), VariableRef("[var_1]")],
+                    target=VariableRef("my"),
+                ),
+            ),
+        ],
+    )
+    source = Script(handlers=[propagate(handler)]).to_source()
+    assert 'my f([var_0], "a")' in source
+
+
+def test_statements_changed_get_a_comment():
+    handler = Handler(
+        name="h",
+        body=[
+            _set("[var_0]", StringLiteral("ht")),
+            _set("[var_1]", StringLiteral("tp")),
+            ReturnStatement(
+                value=BinaryOp(
+                    op=BinaryOpKind.CONCAT,
+                    left=VariableRef("[var_0]"),
+                    right=VariableRef("[var_1]"),
+                )
+            ),
+        ],
+    )
+    body = propagate(handler).body
+    assert body[:2] == handler.body[:2]
+    assert body[2:] == [
+        Comment("propagated: [var_0], [var_1]"),
+        ReturnStatement(
+            value=BinaryOp(
+                op=BinaryOpKind.CONCAT,
+                left=StringLiteral("ht"),
+                right=StringLiteral("tp"),
+            )
+        ),
+    ]
@@ -0,0 +1,123 @@
+import pytest
+
+from jinmo_applescript_disassembler.engine.fasparser import Loader
+
+from applescript_decompiler.analyzer import NaiveStringAnalyzer
+from applescript_decompiler.decompiler import (
+    CODE_OFFSET,
+    ROOT_OFFSET,
+    decompile,
+    decompile_loaded,
+)
+from applescript_decompiler.opcodes import opcode_bytes
+from applescript_decompiler.verifier import VerifyError
+
+DEMO = "demo/demo_runonly.scpt"
+
+HANDLERS = [
+    "collectEnvironmentInfo",
+    "deobfuscateStringList",
+    "demoRepeats",
+    "demoIfStatements",
+    "decodeWithOffset",
+    "get_url",
+    "finderDemo",
+    "systemEventsDemo",
+    "logMessage",
+    "escapeQuotes",
+    "rangeDemo",
+]
+
+
+def _loaded():
+    with open(DEMO, "rb") as f:
+        return Loader().load(f)
+
+
+def test_result():
+    result = decompile(DEMO)
+    # The first handler is `run`, named by its event code
+    assert [h.name for h in result.handlers[1:]] == HANDLERS
+    assert [r.offset for r in result.reports] == list(range(2, 16))
+    assert result.errors == [] and not result.aborted
+    assert result.exceeded is None and result.stopped is None
+    assert result.text == result.render()
+    assert result.text.startswith("on run\n")
+    assert "\non rangeDemo\n" in result.text
+
+    lines = list(result.lines())
+    assert lines[0] == "-- === data offset 2 ==="
+    assert lines[-2:] == ["-----", result.text]
+
+
+def test_sources():
+    text = decompile(DEMO).text
+    with open(DEMO, "rb") as f:
+        assert decompile(f).text == text
+    with open(DEMO, "rb") as f:
+        assert decompile(f.read()).text == text
+
+
+def test_without_rendering():
+    result = decompile(DEMO, render=False, analyzer=NaiveStringAnalyzer)
+    assert result.text is None
+    assert len(result.handlers) == len(HANDLERS) + 1
+    # Rendering later gives what decompiling with the analyzer would have
+    assert result.render() == decompile(DEMO, analyzer=NaiveStringAnalyzer).text
+    assert "-----" not in list(result.lines())
+
+
+def _broken():
+    # decodeWithOffset's code replaced by an Add with nothing to add
+    f = _loaded()
+    f[ROOT_OFFSET][9][CODE_OFFSET + 1].value = bytes(opcode_bytes("Add"))
+    return f
+
+
+def test_failed_handler_is_verified():
+    result = decompile_loaded(_broken())
+    (report,) = result.errors
+    assert report.offset == 9
+    assert isinstance(report.error, VerifyError)
+    assert str(report.error) == "00000: Add needs 2 stack item(s), 0 available"
+    assert isinstance(report.error.__cause__, IndexError)
+    # Stopped at the failure: nothing is rendered
+    assert result.aborted
+    assert result.text is None
+    assert result.reports[-1] is report
+
+
+def test_failed_handler_without_verifying():
+    result = decompile_loaded(_broken(), force=True, verify=False)
+    (report,) = result.errors
+    assert isinstance(report.error, IndexError)
+    # With force, the handlers after it are still decompiled
+    assert result.reports[-1].offset == 15
+    assert "\non rangeDemo\n" in result.text
+    assert "\non decodeWithOffset" not in result.text
+
+
+def test_streaming():
+    reports = []
+
+    def stream(report):
+        # The handler is still there while the callback has it
+        reports.append((report, report.handler))
+
+    result = decompile(DEMO, stream=stream)
+    assert result.streamed
+    assert [r for r, _ in reports] == result.reports
+    assert [h.name for _, h in reports if h is not None][1:] == HANDLERS
+    # ... and released afterwards, along with the rendered text
+    assert all(r.handler is None for r in result.reports)
+    assert result.handlers == [] and result.text is None
+
+
+def test_streamed_result_is_not_rendered():
+    result = decompile(DEMO, stream=lambda report: None)
+    with pytest.raises(ValueError, match="stream callback"):
+        result.render()
+    with pytest.raises(ValueError, match="stream callback"):
+        result.rewritten()
+    with pytest.raises(ValueError, match="stream callback"):
+        list(result.lines())
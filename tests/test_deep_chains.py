@@ -0,0 +1,85 @@
+from applescript_decompiler.ast import *
+from applescript_decompiler.analyzer import NaiveStringAnalyzer
+from applescript_decompiler.diff import StructuralHasher
+
+# Obfuscated strings decompile to `&` chains far deeper than the recursion
+# limit: everything done to a tree has to work on them
+TERMS = 100_000
+
+CONCAT = repr(BinaryOpKind.CONCAT)
+
+
+def _letter(i):
+    return chr(ord("a") + i % 26)
+
+
+def _left_chain(last=None):
+    # (("h" & "a") & "b") & ..., as the decompiler builds them
+    expr = StringLiteral(value="h")
+    for i in range(TERMS):
+        letter = last if last is not None and i == TERMS - 1 else _letter(i)
+        expr = BinaryOp(op=BinaryOpKind.CONCAT, left=expr, right=StringLiteral(letter))
+    return expr
+
+
+def _right_chain():
+    # "a" & ("b" & (... & "z"))
+    expr = StringLiteral(value="z")
+    for i in range(TERMS):
+        expr = BinaryOp(
+            op=BinaryOpKind.CONCAT, left=StringLiteral(_letter(i)), right=expr
+        )
+    return expr
+
+
+def _letters():
+    return [_letter(i) for i in range(TERMS)]
+
+
+def test_left_chain():
+    chain = _left_chain()
+    statement = ExprStatement(expr=chain)
+    letters = _letters()
+
+    assert statement.to_source() == '"h"' + "".join(f' & "{c}"' for c in letters)
+    assert statement.to_source(analyzer=NaiveStringAnalyzer) == (
+        '"h' + "".join(letters) + '"'
+    )
+    assert repr(chain) == (
+        f"BinaryOp(op={CONCAT}, left=" * TERMS
+        + "StringLiteral(value='h')"
+        + "".join(f", right=StringLiteral(value='{c}'))" for c in letters)
+    )
+
+
+def test_right_chain():
+    chain = _right_chain()
+    statement = ExprStatement(expr=chain)
+    letters = _letters()[::-1]
+
+    assert statement.to_source() == "".join(f'"{c}" & ' for c in letters) + '"z"'
+    assert statement.to_source(analyzer=NaiveStringAnalyzer) == (
+        '"' + "".join(letters) + 'z"'
+    )
+    assert repr(chain) == (
+        "".join(
+            f"BinaryOp(op={CONCAT}, left=StringLiteral(value='{c}'), right="
+            for c in letters
+        )
+        + "StringLiteral(value='z')"
+        + ")" * TERMS
+    )
+
+
+def test_equality_and_hashes():
+    chain, same, other = _left_chain(), _left_chain(), _left_chain(last="!")
+    assert chain == same
+    assert chain != other
+    right, right_again = _right_chain(), _right_chain()
+    assert right == right_again
+
+    hasher = StructuralHasher()
+    assert hasher(chain) == hasher(same)
+    assert hasher(chain) != hasher(other)
+    # A fresh hasher, so nothing comes from the cache
+    assert hasher(right) == StructuralHasher()(right_again)
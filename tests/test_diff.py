@@ -0,0 +1,85 @@
+from applescript_decompiler.ast import *
+from applescript_decompiler.diff import StructuralHasher, diff_scripts, format_diff
+
+
+def _set(var, value):
+    return SetStatement(target=VariableRef(var), value=NumberLiteral(value))
+
+
+def _if(else_pos, var, *then_block):
+    condition = BinaryOp(
+        op=BinaryOpKind.LT,
+        left=VariableRef(var),
+        right=NumberLiteral(1),
+    )
+    return IfStatement(
+        condition=condition, else_pos=else_pos, then_block=list(then_block)
+    )
+
+
+def _handler(name, *body):
+    return Handler(name=name, body=list(body))
+
+
+def _script(*handlers):
+    return Script(handlers=list(handlers))
+
+
+def test_hashes_ignore_offsets_and_slot_numbers():
+    a = _handler("h", _set("[var_0]", 1), _if(10, "[var_0]", _set("[var_1]", 2)))
+    b = _handler("h", _set("[var_3]", 1), _if(40, "[var_3]", _set("[var_7]", 2)))
+    assert StructuralHasher()(a) == StructuralHasher()(b)
+    # Which local is read where still counts, and so do values
+    c = _handler("h", _set("[var_0]", 1), _if(10, "[var_1]", _set("[var_1]", 2)))
+    assert StructuralHasher()(a) != StructuralHasher()(c)
+    d = _handler("h", _set("[var_0]", 1), _if(10, "[var_0]", _set("[var_1]", 3)))
+    assert StructuralHasher()(a) != StructuralHasher()(d)
+
+
+def test_unchanged():
+    old = _script(_handler("h", _set("x", 1)), _handler("g"))
+    new = _script(_handler("h", _set("x", 1)), _handler("g"))
+    diff = diff_scripts(old, new)
+    assert not diff
+    assert diff.unchanged == 2
+
+
+def test_changed_statement_is_found_in_its_block():
+    old = _script(_handler("h", _set("x", 1), _if(10, "x", _set("y", 2), _set("z", 3))))
+    new = _script(_handler("h", _set("x", 1), _if(12, "x", _set("y", 2), _set("z", 4))))
+    (change,) = diff_scripts(old, new).changes
+    assert change.kind == "changed"
+    (hunk,) = change.hunks
+    assert hunk.path == "h > body[1] > then_block[1]"
+    assert (hunk.old, hunk.new) == ([_set("z", 3)], [_set("z", 4)])
+
+
+def test_added_removed_and_renamed():
+    body = [_set("x", 1), _set("y", 2)]
+    old = _script(_handler("kept"), _handler("old_name", *body), _handler("gone"))
+    new = _script(
+        _handler("kept"), _handler("new_name", *body), _handler("fresh", _set("x", 3))
+    )
+    diff = diff_scripts(old, new)
+    assert diff.unchanged == 1
+    assert [
+        (c.kind, c.old and c.old.name, c.new and c.new.name) for c in diff.changes
+    ] == [
+        ("renamed", "old_name", "new_name"),
+        ("removed", "gone", None),
+        ("added", None, "fresh"),
+    ]
+
+
+def test_format_diff():
+    old = _script(_handler("h", _set("x", 1), _set("y", 2)), _handler("g"))
+    new = _script(_handler("h", _set("x", 1), _set("y", 3)), _handler("g"))
+    assert list(format_diff(diff_scripts(old, new), "old.scpt", "new.scpt")) == [
+        "--- old.scpt",
+        "+++ new.scpt",
+        "-- 1 handler(s) unchanged",
+        "-- changed: h",
+        "@@ h > body[1]",
+        "-    set y to 2",
+        "+    set y to 3",
+    ]
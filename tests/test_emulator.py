@@ -0,0 +1,108 @@
+import pytest
+
+from jinmo_applescript_disassembler.engine.budget import BudgetExceeded
+
+from applescript_decompiler.ast import *
+from applescript_decompiler.emulator import Emulator, NotEvaluable
+from applescript_decompiler.passes import EvaluateCalls, Pipeline
+
+# Far deeper than the recursion limit, like what obfuscators emit
+DEPTH = 5000
+
+
+def _script(value):
+    # on d() / return <value> / end, and a run handler calling my d()
+    call = HandlerCall("d", [], target=VariableRef("my"))
+    return Script(
+        handlers=[
+            Handler(name="d", body=[ReturnStatement(value=value)]),
+            Handler(name="run", body=[ExprStatement(expr=call)]),
+        ]
+    )
+
+
+def _evaluated(script, **budget):
+    run = Pipeline([EvaluateCalls(**budget)]).run(script).handlers[1]
+    comment, statement = run.body
+    assert comment == Comment("evaluated: d")
+    return statement.expr
+
+
+def test_right_nested_chain():
+    # "a" & ("a" & (... & "a"))
+    value = StringLiteral("a")
+    for _ in range(DEPTH):
+        value = BinaryOp(op=BinaryOpKind.CONCAT, left=StringLiteral("a"), right=value)
+    # Each link builds its string anew, 12.5M characters in all
+    evaluated = _evaluated(_script(value), memory=20_000_000)
+    assert evaluated == StringLiteral("a" * (DEPTH + 1))
+
+
+def test_nesting_too_deep_is_left_as_written():
+    # {{{... {1} ...}}}: nested lists are evaluated recursively
+    value = NumberLiteral(1)
+    for _ in range(DEPTH):
+        value = ListLiteral([value])
+    script = _script(value)
+    run = Pipeline([EvaluateCalls()]).run(script).handlers[1]
+    assert run.body == script.handlers[1].body
+
+
+def _var(slot):
+    return VariableRef(f"[var_{slot}]")
+
+
+def _set(slot, value):
+    return SetStatement(target=LValue(_var(slot)), value=value)
+
+
+def _decoder():
+    # on decode(codes, off)
+    #     set s to ""
+    #     repeat with c in codes
+    #         set s to s & (ASCII character (c - off))
+    #     return s
+    character = CommandCall(
+        "sysontoc",
+        arguments=[BinaryOp(op=BinaryOpKind.SUB, left=_var(3), right=_var(1))],
+    )
+    append = BinaryOp(op=BinaryOpKind.CONCAT, left=_var(2), right=character)
+    loop = RepeatStatement(
+        kind=RepeatKind.WITH_IN,
+        end_repeat_pos=0,
+        counter_var=_var(3),
+        in_expr=_var(0),
+        body=[_set(2, append)],
+    )
+    body = [_set(2, StringLiteral("")), loop, ReturnStatement(value=_var(2))]
+    return Handler(name="decode", parameters=["codes", "off"], body=body)
+
+
+def test_call():
+    emulator = Emulator([_decoder()])
+    # Handler names ignore case
+    assert emulator.call("Decode", [[105, 106], 1]) == "hi"
+    assert len(emulator.results) == 1
+
+
+def test_not_evaluable():
+    shell = CommandCall("sysoexec", arguments=[StringLiteral("ls")])
+    handler = Handler(name="d", body=[ReturnStatement(value=shell)])
+    emulator = Emulator([handler, _decoder()])
+    with pytest.raises(NotEvaluable, match="sysoexec is not supported"):
+        emulator.call("d", [])
+    with pytest.raises(NotEvaluable, match="decode takes 2 arguments"):
+        emulator.call("decode", [[105]])
+    with pytest.raises(NotEvaluable, match="no handler missing"):
+        emulator.call("missing", [])
+
+
+def test_budget():
+    forever = RepeatStatement(kind=RepeatKind.FOREVER, end_repeat_pos=0)
+    handler = Handler(name="spin", body=[forever])
+    emulator = Emulator([handler], instructions=1000)
+    with pytest.raises(BudgetExceeded):
+        emulator.call("spin", [])
+    # Remembered as a failure, not run again
+    with pytest.raises(NotEvaluable, match="instructions budget of 1000 exceeded"):
+        emulator.call("spin", [])
@@ -0,0 +1,57 @@
+import json
+
+from jinmo_applescript_disassembler.engine.budget import Budget
+
+from applescript_decompiler.extract import extract
+from applescript_decompiler.passes import decrypt_strings, find_shift, is_encrypted
+
+DEMO = "demo/demo_runonly.scpt"
+
+
+def test_extract():
+    extracted = extract(DEMO)
+    assert extracted.strings[:3] == ["LOG: ", "/path/to/Logger.scpt", "Hello"]
+    assert "scutil --get LocalHostName || hostname" in extracted.strings
+    # Each string once, in the order first seen
+    assert len(set(extracted.strings)) == len(extracted.strings)
+    assert extracted.applications == ["Terminal", "Finder", "System Events"]
+    assert extracted.commands["sysoexec"] == 5
+    assert extracted.commands["sysontoc"] == 7
+    assert extracted.errors == [] and extracted.exceeded is None
+    # Nothing in the demo is encrypted
+    assert extracted.shift is None and extracted.decrypted == []
+
+
+def test_to_dict():
+    extracted = extract(DEMO)
+    data = json.loads(json.dumps(extracted.to_dict()))
+    assert data["strings"] == extracted.strings
+    assert {"code": "sysoexec", "name": "do shell script", "count": 5} in (
+        data["commands"]
+    )
+    assert data["exceeded"] is None
+
+
+def test_sources():
+    with open(DEMO, "rb") as f:
+        data = f.read()
+    assert extract(data) == extract(DEMO)
+
+
+def test_budget():
+    extracted = extract(DEMO, budget=Budget(objects=10))
+    assert extracted.exceeded.resource == "objects"
+    assert extracted.strings == []
+    assert extracted.to_dict()["exceeded"] == "objects budget of 10 exceeded"
+
+
+def test_decryption():
+    plain = ["do shell script", "curl -s http://example.com"]
+    encrypted = ["".join(chr(ord(c) + 0x2000) for c in s) for s in plain]
+    assert all(is_encrypted(s) for s in encrypted)
+    # Text with a few accents in it is not
+    assert not is_encrypted("café")
+    assert not is_encrypted("plain")
+    shift = find_shift(encrypted)
+    assert shift == 0x2000
+    assert decrypt_strings(encrypted, shift) == dict(zip(encrypted, plain))
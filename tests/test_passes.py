@@ -0,0 +1,140 @@
+import pytest
+
+from applescript_decompiler.ast import *
+from applescript_decompiler.passes import FoldStrings, Pass, Pipeline, walk
+
+
+class Upper(Pass):
+    name = "upper"
+    local = True
+
+    def rewrite(self, node, original):
+        if isinstance(node, StringLiteral):
+            return StringLiteral(node.value.upper())
+        return node
+
+
+class Exclaim(Pass):
+    name = "exclaim"
+    after = ("upper",)
+
+    def rewrite(self, node, original):
+        if isinstance(node, StringLiteral):
+            return StringLiteral(node.value + "!")
+        return node
+
+
+class Counted(Pass):
+    # Records the trees it is started on
+    name = "counted"
+
+    def __init__(self):
+        self.started = []
+
+    def start(self, root):
+        self.started.append(root)
+
+
+class Whole(Pass):
+    name = "whole"
+    standalone = True
+
+    def run(self, root):
+        return ExprStatement(expr=StringLiteral("replaced"))
+
+
+def _names(pipeline):
+    return [[p.name for p in group] for group in pipeline.groups()]
+
+
+def _statement(*values):
+    return ExprStatement(expr=ListLiteral([StringLiteral(v) for v in values]))
+
+
+def test_order():
+    pipeline = Pipeline([Exclaim, Upper, Counted])
+    assert [p.name for p in pipeline.passes] == ["upper", "exclaim", "counted"]
+    # Passes named in `after` that are not in the pipeline are ignored
+    assert [p.name for p in Pipeline([Exclaim]).passes] == ["exclaim"]
+    assert not Pipeline()
+
+
+def test_cycle():
+    class First(Pass):
+        name = "first"
+        after = ("second",)
+
+    class Second(Pass):
+        name = "second"
+        after = ("first",)
+
+    with pytest.raises(ValueError, match="Passes cannot be ordered: first, second"):
+        Pipeline([First, Second, Upper])
+
+
+def test_groups():
+    # Only a local pass shares its traversal with the next one
+    assert _names(Pipeline([Upper, Exclaim, Counted])) == [
+        ["upper", "exclaim"],
+        ["counted"],
+    ]
+    assert _names(Pipeline([Upper, Whole, Upper])) == [
+        ["upper"],
+        ["whole"],
+        ["upper"],
+    ]
+
+
+def test_run():
+    statement = _statement("a", "b")
+    counted = Counted()
+    rewritten = Pipeline([Exclaim, Upper, counted]).run(statement)
+    assert rewritten == _statement("A!", "B!")
+    # Started on what the passes before it made of the tree
+    assert counted.started == [rewritten]
+    # Not changed in place
+    assert statement == _statement("a", "b")
+
+
+def test_unchanged_nodes_are_reused():
+    statement = ExprStatement(
+        expr=ListLiteral([ListLiteral([NumberLiteral(1)]), StringLiteral("a")])
+    )
+    rewritten = Pipeline([Upper]).run(statement)
+    assert rewritten.expr.elements[0] is statement.expr.elements[0]
+    assert rewritten.expr.elements[1] == StringLiteral("A")
+
+
+def test_standalone_run():
+    assert Pipeline([Upper, Whole]).run(_statement("a")) == ExprStatement(
+        expr=StringLiteral("replaced")
+    )
+
+
+def test_walk():
+    statement = _statement("a", "b")
+    assert [node.__class__ for node in walk(statement)] == [
+        ExprStatement,
+        ListLiteral,
+        StringLiteral,
+        StringLiteral,
+    ]
+
+
+def _concat(*operands):
+    expr = operands[0]
+    for operand in operands[1:]:
+        expr = BinaryOp(op=BinaryOpKind.CONCAT, left=expr, right=operand)
+    return ExprStatement(expr=expr)
+
+
+def test_fold_strings():
+    h = CommandCall("sysontoc", arguments=[NumberLiteral(104)])
+    x = VariableRef("x")
+    statement = _concat(StringLiteral("a"), h, x, StringLiteral("c"))
+    assert Pipeline([FoldStrings]).run(statement) == _concat(
+        StringLiteral("ah"), x, StringLiteral("c")
+    )
+    # Above 127 the character depends on the encoding
+    high = CommandCall("sysontoc", arguments=[NumberLiteral(200)])
+    assert Pipeline([FoldStrings]).run(_concat(high)) == _concat(high)
@@ -0,0 +1,67 @@
+import pytest
+
+from applescript_decompiler.opcodes import opcode_bytes
+from applescript_decompiler.verifier import VerifyError, verify
+
+
+def _code(*parts):
+    # Op names and raw bytes, e.g. _code("Jump", 0, 1)
+    code = bytearray()
+    for part in parts:
+        if isinstance(part, str):
+            (part,) = opcode_bytes(part)
+        code.append(part)
+    return bytes(code)
+
+
+def _error(code) -> VerifyError:
+    with pytest.raises(VerifyError) as info:
+        verify(code)
+    return info.value
+
+
+def test_valid_code():
+    code = _code(
+        "Push1", "Push2", "Add", "Push2", "Push0", "Push1", "MakeVector", "Return"
+    )
+    assert [i.op for i in verify(code)] == [
+        "Push1",
+        "Push2",
+        "Add",
+        "Push2",
+        "Push0",
+        "Push1",
+        "MakeVector",
+        "Return",
+    ]
+
+
+def test_truncated_operand():
+    error = _error(_code("Push1", "Jump", 0))
+    assert error.pos == 1
+    assert "runs past the end of the code" in str(error)
+
+
+def test_branch_into_an_instruction():
+    # The target is relative to the byte after the opcode: 1 + 1 + 1, the
+    # second byte of the Jump's own operand
+    error = _error(_code("Push1", "Jump", 0, 1))
+    assert error.pos == 1
+    assert str(error) == "00001: Jump branches to 0x3"
+
+
+def test_branch_to_the_end():
+    assert len(verify(_code("Jump", 0, 2))) == 1
+
+
+def test_stack_underflow():
+    error = _error(_code("Push1", "Add"))
+    assert error.pos == 1
+    assert str(error) == "00001: Add needs 2 stack item(s), 1 available"
+
+
+def test_count_is_not_a_constant():
+    # The count MakeVector pops was computed
+    error = _error(_code("Push1", "Push1", "Add", "MakeVector"))
+    assert error.pos == 3
+    assert "count is not a constant" in str(error)